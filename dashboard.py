@@ -1,9 +1,13 @@
 import streamlit as st
 import numpy as np
-import pandas as pd
-from pathlib import Path
-from src.inference import make_prediction
+from src.inference import predict_with_interval, input_hash
+from src.sensitivity import valuation_grid, slice_grid, lookup, nearest_value
+from src.explain import explain_prediction
 from src.chat import get_chat_completion
+from src.tools import AdvisorTools
+from src.query import median_price_history, market_snapshot
+from src.price_index import index_overlay
+from src.background import TaskBoard
 import altair as alt
 from datetime import date
 
@@ -14,15 +18,6 @@ st.set_page_config(
     layout="wide"
 )
 
-DATA_PATH = Path(__file__).resolve().parent / "data" / "tokyo-clean.parquet"
-
-@st.cache_data
-def load_transaction_data() -> pd.DataFrame:
-    return pd.read_parquet(
-        DATA_PATH,
-        columns=["Municipality", "FloorPlan", "TransactionYear", "TradePriceYen"]
-    )
-
 MUNICIPALITIES = [
     '千代田区 (Chiyoda Ward)', '中央区 (Chuo Ward)', '港区 (Minato Ward)', '新宿区 (Shinjuku Ward)', '文京区 (Bunkyo Ward)',
     '台東区 (Taito Ward)', '墨田区 (Sumida Ward)', '江東区 (Koto Ward)', '品川区 (Shinagawa Ward)', '目黒区 (Meguro Ward)',
@@ -68,8 +63,12 @@ def main():
     # --- 2. INITIALIZE SESSION STATE ---
     if "messages" not in st.session_state:
         st.session_state.messages = [{"role": "assistant", "content": "Ready when you are. What's on your radar?"}]
-    if "prediction" not in st.session_state:
-        st.session_state.prediction = None
+    if "tasks" not in st.session_state:
+        st.session_state.tasks = TaskBoard()
+        st.session_state.grid_input = None
+    if "advisor_tools" not in st.session_state:
+        # Tool results are cached for the whole conversation
+        st.session_state.advisor_tools = AdvisorTools()
 
     st.title("Tokyo Real Estate Smart Advisor")
 
@@ -95,10 +94,7 @@ def main():
     #st.divider()
     form_container = st.container()
 
-    # --- 4. LOAD DATA ---
-    transactions = load_transaction_data()
-
-    # --- 5. FILL FORM SECTION ---
+    # --- 4. FILL FORM SECTION ---
     with form_container:
         with st.form("valuation_form"):
             tab1, tab2 = st.tabs(["Basic Info", "Advanced Specs"])
@@ -138,38 +134,37 @@ def main():
         'FloorAreaRatio': floor_area_ratio, 'TransactionYear': date.today().year
     }
 
-    # Logic for Prediction
+    # --- 5. SCHEDULE BACKGROUND WORK ---
+    # Valuation, chart queries and the LLM call run concurrently on the shared executor.
+    # Each task is keyed by its inputs, so a changed form cancels the stale task.
+    tasks = st.session_state.tasks
     if submit:
-        try:
-            st.session_state.prediction = make_prediction(user_input)
-        except Exception as e:
-            st.error(f"Prediction Error: {e}")
+        key = input_hash(user_input)
+        tasks.ensure("valuation", key, lambda u: predict_with_interval(u).iloc[0].to_dict(), dict(user_input))
+        tasks.ensure("explanation", key, explain_prediction, dict(user_input))
+        # One batched call prices every what-if variation; sliders below only read from it
+        tasks.ensure("grid", key, valuation_grid, dict(user_input), ORDERED_FLOOR_PLANS)
+        st.session_state.grid_input = dict(user_input)
+
+    history_key = f"{municipality}|{floor_plan}"
+    tasks.ensure(
+        "history", f"{history_key}|{prop_type}",
+        lambda m, fp, t: index_overlay(median_price_history(m, fp), m, t), municipality, floor_plan, prop_type
+    )
+    tasks.ensure("snapshot", history_key, market_snapshot, municipality, floor_plan)
 
     # --- 6. FILL CONTENT INTO CONTAINERS ---
-    
+
     # 1. Prediction Result (Now below chart/chat due to container definition order)
-    if st.session_state.prediction:
-        result_area.success(f"Estimated Market Value: ¥{st.session_state.prediction:,.0f}")
+    valuation_slot = result_area.empty()
+    drivers_slot = result_area.empty()
+    whatif_slot = result_area.container()
 
     # 2. Chart Section
     with col_chart:
         st.subheader(f"Median Transaction Price\n {municipality}, {floor_plan}")
-        subset = transactions[(transactions["Municipality"] == municipality) & (transactions["FloorPlan"] == floor_plan)]
-        median_price = subset.groupby("TransactionYear", as_index=False)["TradePriceYen"].median().sort_values("TransactionYear")
-        
-        if not median_price.empty:
-            hover = alt.selection_point(fields=["TransactionYear"], nearest=True, on="mouseover", empty=False)
-            chart = alt.Chart(median_price).mark_line(color='#1E90FF').encode(
-                x=alt.X("TransactionYear:Q", axis=alt.Axis(format="d"), title=None),
-                y=alt.Y("TradePriceYen:Q", axis=alt.Axis(labelExpr="'¥' + format(datum.value, ',')"), title=None)
-            )
-            points = chart.mark_point(filled=True, size=100).encode(
-                opacity=alt.condition(hover, alt.value(1), alt.value(0)),
-                tooltip=[alt.Tooltip("TransactionYear:Q", title="Year"), alt.Tooltip("TradePriceYen:Q", title="Price", format=",")]
-            ).add_params(hover)
-            st.altair_chart(chart + points, width="stretch")
-        else:
-            st.info("No transaction data available for this selection.")
+        chart_slot = st.empty()
+        st.caption("Dashed: price index for the municipality and type, scaled to the latest median.")
 
     # 3. Chat Section
     with col_chat:
@@ -183,12 +178,126 @@ def main():
             st.session_state.messages.append({"role": "user", "content": prompt})
             with chat_box:
                 st.chat_message("user").write(prompt)
-                with st.chat_message("assistant"):
-                    p = st.empty()
-                    p.markdown("Thinking...")
-                    ans = get_chat_completion(st.session_state.messages, user_input)
-                    p.markdown(ans)
-                    st.session_state.messages.append({"role": "assistant", "content": ans})
+
+            # Use whatever valuation results are already available; do not wait for them
+            context = {**user_input, **tasks.value("snapshot", {})}
+            valuation = tasks.value("valuation")
+            if valuation:
+                context["Estimated Market Value"] = f"¥{valuation['Prediction']:,.0f}"
+                if not np.isnan(valuation['Lower']):
+                    context["Estimated Range (P10-P90)"] = f"¥{valuation['Lower']:,.0f} - ¥{valuation['Upper']:,.0f}"
+            tasks.ensure(
+                "chat", str(len(st.session_state.messages)), get_chat_completion,
+                list(st.session_state.messages), context, attributions=tasks.value("explanation"),
+                tools=st.session_state.advisor_tools.bound_to(user_input)
+            )
+
+        chat_slot = None
+        if tasks.get("chat") is not None:
+            with chat_box:
+                chat_slot = st.chat_message("assistant").empty()
+                chat_slot.markdown("Thinking...")
+
+    if tasks.get("valuation") is not None and not tasks.get("valuation").done():
+        valuation_slot.info("Estimating market value...")
+    chart_slot.caption("Loading transactions...")
+
+    # --- 7. RENDER EACH COMPONENT AS SOON AS IT FINISHES ---
+    def render_valuation(future):
+        if future.exception() is not None:
+            valuation_slot.error(f"Prediction Error: {future.exception()}")
+            return
+        valuation = future.result()
+        with valuation_slot.container():
+            st.success(f"Estimated Market Value: ¥{valuation['Prediction']:,.0f}")
+            if not np.isnan(valuation['Lower']):
+                st.caption(f"Likely range (P10–P90): ¥{valuation['Lower']:,.0f} – ¥{valuation['Upper']:,.0f}")
+
+    def render_explanation(future):
+        if future.exception() is None and future.result():
+            drivers = ", ".join(f"{name} {effect:+.0f}%" for name, effect in list(future.result().items())[:3])
+            drivers_slot.caption(f"Main price drivers: {drivers}")
+
+    def render_grid(future):
+        if future.exception() is not None:
+            return
+        surface = future.result()
+        base = st.session_state.grid_input
+        key = input_hash(base)
+        options = {
+            'Area': sorted(surface['Area'].unique()),
+            'BuildingYear': sorted(surface['BuildingYear'].unique()),
+            'FloorPlan': list(dict.fromkeys(surface['FloorPlan'])),
+            'TransactionYear': sorted(surface['TransactionYear'].unique()),
+        }
+        # Typed values may fall between grid points (area rounding, years clipped to the sale year)
+        start = {axis: nearest_value(values, base[axis]) for axis, values in options.items()}
+        with whatif_slot.expander("What-if: adjust area, age, layout and sale year"):
+            w1, w2 = st.columns(2)
+            with w1:
+                wi_area = st.select_slider("Area (m²)", options=options['Area'], value=start['Area'], key=f"wi_area_{key}")
+                wi_year = st.select_slider("Building Construction Year", options=options['BuildingYear'], value=start['BuildingYear'], key=f"wi_by_{key}")
+            with w2:
+                wi_plan = st.select_slider("Floor Plan", options=options['FloorPlan'], value=start['FloorPlan'], key=f"wi_plan_{key}")
+                wi_sale = st.select_slider("Sale Year", options=options['TransactionYear'], value=start['TransactionYear'], key=f"wi_sale_{key}")
+
+            selection = {'Area': wi_area, 'BuildingYear': wi_year, 'FloorPlan': wi_plan, 'TransactionYear': wi_sale}
+            point = lookup(surface, **selection)
+            base_point = lookup(surface, **start)
+            if point is not None and base_point is not None:
+                st.metric("What-if Value", f"¥{point['Prediction']:,.0f}", delta=f"¥{point['Prediction'] - base_point['Prediction']:,.0f}")
+
+            curve = slice_grid(surface, 'Area', **selection)
+            area_chart = alt.Chart(curve).mark_line(color='#1E90FF', point=True).encode(
+                x=alt.X("Area:Q", title="Area (m²)"),
+                y=alt.Y("Prediction:Q", axis=alt.Axis(labelExpr="'¥' + format(datum.value, ',')"), title=None),
+                tooltip=[alt.Tooltip("Area:Q"), alt.Tooltip("Prediction:Q", title="Price", format=",.0f")]
+            )
+            st.altair_chart(area_chart, width="stretch")
+
+    def render_history(future):
+        if future.exception() is not None:
+            chart_slot.error(f"Query Error: {future.exception()}")
+            return
+        median_price = future.result()
+        if not median_price.empty:
+            hover = alt.selection_point(fields=["TransactionYear"], nearest=True, on="mouseover", empty=False)
+            chart = alt.Chart(median_price).mark_line(color='#1E90FF').encode(
+                x=alt.X("TransactionYear:Q", axis=alt.Axis(format="d"), title=None),
+                y=alt.Y("TradePriceYen:Q", axis=alt.Axis(labelExpr="'¥' + format(datum.value, ',')"), title=None)
+            )
+            points = chart.mark_point(filled=True, size=100).encode(
+                opacity=alt.condition(hover, alt.value(1), alt.value(0)),
+                tooltip=[
+                    alt.Tooltip("TransactionYear:Q", title="Year"), alt.Tooltip("TradePriceYen:Q", title="Price", format=","),
+                    alt.Tooltip("IndexPriceYen:Q", title="Price index (latest median)", format=",.0f")
+                ]
+            ).add_params(hover)
+            # Market index scaled to the latest median: how today's typical price moved through time
+            index_line = alt.Chart(median_price).mark_line(color='#FF8C00', strokeDash=[4, 4]).encode(
+                x="TransactionYear:Q", y="IndexPriceYen:Q"
+            )
+            chart_slot.altair_chart(chart + index_line + points, width="stretch")
+        else:
+            chart_slot.info("No transaction data available for this selection.")
+
+    def render_chat(future):
+        tasks.pop("chat")
+        if future.exception() is not None:
+            chat_slot.error(f"Advisor Error: {future.exception()}")
+            return
+        ans = future.result()
+        chat_slot.markdown(ans)
+        st.session_state.messages.append({"role": "assistant", "content": ans})
+
+    renderers = {
+        "valuation": render_valuation, "explanation": render_explanation, "grid": render_grid,
+        "history": render_history, "chat": render_chat,
+    }
+    status_slot = st.empty()
+    for name, future in tasks.completed(renderers, heartbeat=lambda: status_slot.empty()):
+        if not future.cancelled():
+            renderers[name](future)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,93 @@
+import sys
+import json
+import time
+import logging
+import argparse
+from pathlib import Path
+import pandas as pd
+
+# --- Path Setup ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+# --- Logging Setup ---
+log_dir = project_root / "logs"
+log_dir.mkdir(exist_ok=True)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler(log_dir / "backtest.log"),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+from src.config import (
+    PROCESSED_DATA_PATH, XGB_PARAMS_PATH, BACKTEST_FOLDS, BACKTEST_CACHE_DIR, BACKTEST_REPORT_PATH
+)
+from src.backtest import compact_report, prune_fold_cache, run_backtest, sliced_metrics
+from src.registry import file_fingerprint
+from src.training import ENGINES, pinned_params
+
+# Example: python scripts/backtest.py --folds 8
+#          python scripts/backtest.py --variants variants.json
+#
+# variants.json maps a name to overrides of best_hyperparameters_xgb.json, e.g.
+#   {"baseline": {}, "native": {"engine": "native"}, "deeper": {"max_depth": 8}}
+
+def load_variants(path, engine: str, base_params: dict) -> dict:
+    if path is None:
+        return {engine: {**base_params, 'engine': engine}}
+    with open(path, 'r') as f:
+        overrides = json.load(f)
+    return {name: {**base_params, **spec} for name, spec in overrides.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description="Rolling-origin quarterly backtest of one or more model variants.")
+    parser.add_argument("--folds", type=int, default=BACKTEST_FOLDS, help="Most recent quarters to use as origins.")
+    parser.add_argument("--engine", choices=ENGINES, default='target', help="Engine when no --variants file is given.")
+    parser.add_argument("--variants", type=Path, default=None, help="JSON of named hyperparameter overrides.")
+    parser.add_argument("--no-cache", action="store_true", help="Re-encode every fold instead of reusing cached folds.")
+    parser.add_argument("--min-rows", type=int, default=30, help="Smallest slice listed among the worst slices.")
+    parser.add_argument("--output", type=Path, default=project_root / BACKTEST_REPORT_PATH)
+    args = parser.parse_args()
+
+    # 1. Load Data
+    data_path = project_root / PROCESSED_DATA_PATH
+    if not data_path.exists():
+        logger.error(f"Data not found at {data_path}. Run preprocessing first.")
+        return 1
+    df = pd.read_parquet(data_path)
+    logger.info(f"Loaded {len(df)} rows from {data_path}")
+
+    # 2. Variants
+    with open(project_root / XGB_PARAMS_PATH, 'r') as f:
+        params = pinned_params(json.load(f))
+    params.pop('early_stopping_rounds', None)
+    variants = load_variants(args.variants, args.engine, params)
+    logger.info(f"Variants: {', '.join(variants)} | {args.folds} folds | {params['n_jobs']} threads")
+
+    # 3. Backtest (encoded folds are cached per data version)
+    fingerprint = None if args.no_cache else file_fingerprint(str(data_path))
+    cache_dir = str(project_root / BACKTEST_CACHE_DIR)
+    if fingerprint:
+        prune_fold_cache(cache_dir, fingerprint)
+
+    start = time.perf_counter()
+    predictions = run_backtest(df, variants, args.folds, params['n_jobs'], fingerprint, cache_dir)
+    logger.info(f"Scored {len(predictions)} holdout predictions in {time.perf_counter() - start:.1f}s")
+
+    # 4. Metrics & Report
+    metrics = sliced_metrics(predictions)
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    metrics.to_csv(args.output, index=False)
+
+    for line in compact_report(metrics, min_rows=args.min_rows):
+        logger.info(line)
+    logger.info(f"✅ Wrote {len(metrics)} metric rows to {args.output}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+import sys
+import time
+import logging
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# --- Path Setup ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.config import CLEAN_DATA_PATH
+from src.inference import load_artifacts, predict_batch, predict_with_interval
+from src.explain import explain_batch
+
+# --- Logging Setup ---
+log_dir = project_root / "logs"
+log_dir.mkdir(exist_ok=True)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler(log_dir / "benchmark_inference.log"),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# Columns that are not available at request time
+TARGET_COLS = ['TradePriceYen', 'TransactionQuarterEndDate', 'TransactionQuarter']
+
+# Each mode is a callable taking a DataFrame of raw inputs.
+# Caches are disabled except in 'cached', so every other call pays for the model.
+MODES = {
+    'point': lambda records, path: predict_batch(records, path, use_cache=False),
+    'point+interval': lambda records, path: predict_with_interval(records, path, use_cache=False),
+    # Distilled low-latency tier
+    'point (fast)': lambda records, path: predict_batch(records, path, use_cache=False, tier='fast'),
+    'point+interval (fast)': lambda records, path: predict_with_interval(records, path, use_cache=False, tier='fast'),
+    'point+explain': lambda records, path: (
+        predict_batch(records, path, use_cache=False), explain_batch(records, path, use_cache=False)
+    ),
+    # Resubmitted inputs: after the warm-up every row is a prediction cache hit
+    'point+interval (cached)': lambda records, path: predict_with_interval(records, path),
+}
+
+def load_sample(n_rows: int, seed: int = 42):
+    """Samples raw-looking inputs from the cleaned data; returns (inputs, sale prices)."""
+    df = pd.read_parquet(project_root / CLEAN_DATA_PATH)
+    df = df.sample(n=min(n_rows, len(df)), random_state=seed, replace=len(df) < n_rows).reset_index(drop=True)
+    return df.drop(columns=[c for c in TARGET_COLS if c in df.columns]), df['TradePriceYen'].to_numpy()
+
+def tier_accuracy(rows: pd.DataFrame, prices: np.ndarray, path) -> pd.DataFrame:
+    """
+    MAPE of each latency tier on the sample and how far the fast tier strays from
+    the accurate one. The sample is mostly training data, so read the gap rather
+    than the level (train_xgb.py logs the holdout figures).
+    """
+    accurate = predict_batch(rows, path, use_cache=False)
+    fast = predict_batch(rows, path, use_cache=False, tier='fast')
+    deviation = np.abs(fast / accurate - 1) * 100
+    return pd.DataFrame({
+        'mape': [np.mean(np.abs(accurate / prices - 1)) * 100, np.mean(np.abs(fast / prices - 1)) * 100],
+        'median_dev_from_accurate_pct': [0.0, np.median(deviation)],
+        'p95_dev_from_accurate_pct': [0.0, np.percentile(deviation, 95)],
+    }, index=pd.Index(['accurate', 'fast'], name='tier'))
+
+def time_single_rows(fn, rows: pd.DataFrame, path, n_calls: int) -> np.ndarray:
+    """Latency (ms) of one-row calls, as the dashboard makes them."""
+    timings = []
+    for i in range(n_calls):
+        record = rows.iloc[[i % len(rows)]]
+        start = time.perf_counter()
+        fn(record, path)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.array(timings)
+
+def time_batch(fn, rows: pd.DataFrame, path, repeats: int) -> float:
+    """Best-of-N throughput (rows/s) for one vectorized call over the whole batch."""
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(rows, path)
+        best = min(best, time.perf_counter() - start)
+    return len(rows) / best
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark single-row latency and batch throughput of inference modes.")
+    parser.add_argument("--artifacts", default=None, help="Artifact file (defaults to the served model).")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--single-calls", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    # Warm the artifact cache so loading time is not counted
+    load_artifacts(args.artifacts)
+    rows, prices = load_sample(args.batch_size)
+    logger.info(f"Benchmarking {args.modes} on {len(rows)} rows...")
+
+    results = []
+    for mode in args.modes:
+        fn = MODES[mode]
+        fn(rows, args.artifacts)  # warm-up (fills the cache for the cached mode)
+
+        latency = time_single_rows(fn, rows, args.artifacts, args.single_calls)
+        throughput = time_batch(fn, rows, args.artifacts, args.repeats)
+        results.append({
+            'mode': mode,
+            'single_p50_ms': np.percentile(latency, 50),
+            'single_p95_ms': np.percentile(latency, 95),
+            'batch_rows_per_s': throughput,
+        })
+
+    report = pd.DataFrame(results).set_index('mode')
+    baseline = report.iloc[0]
+    report['p50_vs_first'] = report['single_p50_ms'] / baseline['single_p50_ms']
+    report['throughput_vs_first'] = report['batch_rows_per_s'] / baseline['batch_rows_per_s']
+
+    with pd.option_context("display.float_format", "{:,.2f}".format, "display.width", 200):
+        logger.info("\n" + report.to_string())
+
+    if any(mode.endswith('(fast)') for mode in args.modes):
+        with pd.option_context("display.float_format", "{:,.2f}".format):
+            logger.info("Accuracy by tier:\n" + tier_accuracy(rows, prices, args.artifacts).to_string())
+
+if __name__ == "__main__":
+    main()
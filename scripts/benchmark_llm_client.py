@@ -0,0 +1,169 @@
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import threading
+from pathlib import Path
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+import pandas as pd
+
+# --- Path Setup ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.config import LLM_MAX_CONCURRENCY, LLM_RATE_PER_SECOND, LLM_BURST
+from src.llm_client import LLMClient
+
+# --- Logging Setup ---
+log_dir = project_root / "logs"
+log_dir.mkdir(exist_ok=True)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler(log_dir / "benchmark_llm_client.log"),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per request otherwise
+
+# Example: python scripts/benchmark_llm_client.py
+#          python scripts/benchmark_llm_client.py --scenarios outage --requests 50
+#
+# Runs the shared LLM client against a local stub of the chat completions endpoint
+# that injects latency and failures per model; nothing is sent to OpenRouter.
+
+PRIMARY, SECONDARY = 'stub/primary', 'stub/secondary'
+
+# Per scenario: stub behaviour per model (latency in s, failure rate), whether all
+# requests share one payload, and the hedge deadline
+SCENARIOS = {
+    'concurrency': {'models': {PRIMARY: (0.3, 0.0)}, 'identical': False, 'hedge_after': None},
+    'coalescing': {'models': {PRIMARY: (0.3, 0.0)}, 'identical': True, 'hedge_after': None},
+    'slow primary': {'models': {PRIMARY: (3.0, 0.0), SECONDARY: (0.1, 0.0)}, 'identical': False, 'hedge_after': 0.5},
+    'outage': {'models': {PRIMARY: (0.05, 1.0), SECONDARY: (0.1, 0.0)}, 'identical': False, 'hedge_after': None},
+}
+
+
+class StubState:
+    def __init__(self, models):
+        self.models = models
+        self.requests = Counter()
+        self.in_flight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+
+def stub_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            model = payload['model']
+            latency, failure_rate = state.models.get(model, (0.0, 1.0))
+            with state.lock:
+                state.requests[model] += 1
+                state.in_flight += 1
+                state.peak = max(state.peak, state.in_flight)
+            try:
+                time.sleep(latency)
+                if random.random() < failure_rate:
+                    self._send(503, {'error': {'message': f'{model} is overloaded'}})
+                else:
+                    self._send(200, {'choices': [{'message': {'role': 'assistant', 'content': f'answer from {model}'}}]})
+            finally:
+                with state.lock:
+                    state.in_flight -= 1
+
+        def _send(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            try:
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client cancelled it (a lost hedge race)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def run_scenario(name: str, spec: dict, n_requests: int, max_concurrency: int, rate: float) -> dict:
+    state = StubState(spec['models'])
+    server = ThreadingHTTPServer(('127.0.0.1', 0), stub_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        client = LLMClient(
+            f"http://127.0.0.1:{server.server_port}/chat/completions", 'stub-key',
+            fallback_models=[m for m in spec['models'] if m != PRIMARY],
+            max_concurrency=max_concurrency, rate=rate, burst=max(LLM_BURST, max_concurrency),
+            timeout=10, hedge_after=spec['hedge_after'],
+        )
+        payloads = [
+            {'model': PRIMARY, 'messages': [{'role': 'user', 'content': 'price?' if spec['identical'] else f'price {i}?'}]}
+            for i in range(n_requests)
+        ]
+
+        # Each request from its own thread, as dashboard sessions call it
+        latencies, answers = [], Counter()
+
+        def call(payload):
+            start = time.perf_counter()
+            try:
+                answers[client.complete(payload)['content'].split()[-1]] += 1
+            except RuntimeError:
+                answers['failed'] += 1
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        threads = [threading.Thread(target=call, args=(p,)) for p in payloads]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    return {
+        'scenario': name,
+        'wall_s': wall,
+        'p50_s': np.percentile(latencies, 50),
+        'p95_s': np.percentile(latencies, 95),
+        'upstream': sum(state.requests.values()),
+        'peak_in_flight': state.peak,
+        **{k: client.stats[k] for k in ('coalesced', 'hedged', 'fallback', 'skipped_open')},
+        'primary_circuit': client.breaker(PRIMARY).state,
+        'answers': ', '.join(f"{k.split('/')[-1]}={v}" for k, v in sorted(answers.items())),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exercise the shared LLM client against a local fault-injecting stub.")
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=40, help="Concurrent callers per scenario.")
+    parser.add_argument("--max-concurrency", type=int, default=LLM_MAX_CONCURRENCY)
+    parser.add_argument("--rate", type=float, default=max(LLM_RATE_PER_SECOND, 20.0), help="Requests per second.")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.scenarios:
+        logger.info(f"Running '{name}' with {args.requests} callers...")
+        results.append(run_scenario(name, SCENARIOS[name], args.requests, args.max_concurrency, args.rate))
+
+    report = pd.DataFrame(results).set_index('scenario')
+    with pd.option_context("display.float_format", "{:,.2f}".format, "display.width", 250):
+        logger.info("\n" + report.to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import sys
+import logging
+import argparse
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+# --- Path Setup ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.config import MUNICIPALITY_CENTROIDS_PATH, GEO_INDEX_PATH, GEO_CENTRE
+from src.cleaning_utils import TOKYO_PREFECTURE, map_municipalities
+
+# --- Logging Setup ---
+log_dir = project_root / "logs"
+log_dir.mkdir(exist_ok=True)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler(log_dir / "build_geo_index.log"),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# Example: python scripts/build_geo_index.py
+#          python scripts/build_geo_index.py --stations data/stations.csv --districts data/districts.csv
+#
+# Optional inputs are local static files (e.g. exported from MLIT National Land Numerical
+# Information), never fetched at build, training or inference time:
+#   stations.csv:  name, latitude, longitude[, passengers]
+#   districts.csv: municipality, district, latitude, longitude[, prefecture]
+#
+# Places are keyed 'Prefecture|Municipality[|District]'; inputs without a prefecture
+# column (like the bundled centroids) are Tokyo.
+
+EARTH_RADIUS_KM = 6371.0
+STATION_RADIUS_KM = 1.0  # stations within this radius count towards accessibility
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Vectorized great-circle distance in km."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+def distance_to_centre(df: pd.DataFrame) -> np.ndarray:
+    return haversine_km(df['latitude'].to_numpy(), df['longitude'].to_numpy(), *GEO_CENTRE)
+
+def place_keys(names: pd.Series, prefectures: pd.Series) -> pd.Series:
+    """'Prefecture|Municipality', named as src.cleaning_utils.map_municipalities names the cleaned data."""
+    places = map_municipalities(pd.DataFrame({'Prefecture': prefectures, 'Municipality': names}))
+    return places['Prefecture'] + '|' + places['Municipality']
+
+def prefectures_of(df: pd.DataFrame, column: str) -> pd.Series:
+    return df[column] if column in df.columns else pd.Series(TOKYO_PREFECTURE, index=df.index)
+
+def municipality_rows() -> pd.DataFrame:
+    centroids = pd.read_csv(project_root / MUNICIPALITY_CENTROIDS_PATH)
+    rows = pd.DataFrame({
+        'key': place_keys(centroids['Municipality'], prefectures_of(centroids, 'Prefecture')),
+        'latitude': centroids['Latitude'],
+        'longitude': centroids['Longitude'],
+    })
+    rows['distance_km'] = distance_to_centre(rows)
+    rows['accessibility'] = np.nan
+    return rows.assign(level='municipality')
+
+def district_rows(path: Path) -> pd.DataFrame:
+    districts = pd.read_csv(path)
+    rows = pd.DataFrame({
+        'key': place_keys(districts['municipality'], prefectures_of(districts, 'prefecture')) + '|' + districts['district'],
+        'latitude': districts['latitude'],
+        'longitude': districts['longitude'],
+    })
+    rows['distance_km'] = distance_to_centre(rows)
+    rows['accessibility'] = np.nan
+    return rows.drop_duplicates('key').assign(level='district')
+
+def station_rows(path: Path) -> pd.DataFrame:
+    """
+    Accessibility is the percentile rank (0-1) of ridership when the file has a
+    `passengers` column, else of how many stations lie within STATION_RADIUS_KM
+    (a proxy for interchanges and network density).
+    """
+    stations = pd.read_csv(path)
+    # Same-name entries (one per line) collapse to one point; line count adds to density
+    grouped = stations.groupby('name').agg(
+        latitude=('latitude', 'mean'), longitude=('longitude', 'mean'), lines=('name', 'size'),
+        **({'passengers': ('passengers', 'sum')} if 'passengers' in stations.columns else {})
+    ).reset_index()
+
+    lat = grouped['latitude'].to_numpy()
+    lon = grouped['longitude'].to_numpy()
+    # Pairwise distances in row blocks keep memory bounded for national station lists
+    nearby = np.empty(len(grouped))
+    for start in range(0, len(grouped), 1000):
+        block = haversine_km(lat[start:start + 1000, None], lon[start:start + 1000, None], lat[None, :], lon[None, :])
+        nearby[start:start + 1000] = (block <= STATION_RADIUS_KM).sum(axis=1) - 1
+
+    score = grouped['passengers'] if 'passengers' in grouped.columns else pd.Series(nearby + grouped['lines'])
+    rows = pd.DataFrame({
+        'key': grouped['name'],
+        'latitude': lat,
+        'longitude': lon,
+    })
+    rows['distance_km'] = distance_to_centre(rows)
+    rows['accessibility'] = score.rank(pct=True).to_numpy()
+    return rows.assign(level='station')
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the bundled geo lookup index used by src/features.py.")
+    parser.add_argument("--stations", type=Path, default=None, help="Local CSV: name, latitude, longitude[, passengers].")
+    parser.add_argument("--districts", type=Path, default=None, help="Local CSV: municipality, district, latitude, longitude[, prefecture].")
+    parser.add_argument("--output", type=Path, default=project_root / GEO_INDEX_PATH)
+    args = parser.parse_args()
+
+    # 1. Municipality centroids (bundled)
+    parts = [municipality_rows()]
+
+    # 2. Optional finer levels
+    if args.districts:
+        parts.append(district_rows(args.districts))
+    if args.stations:
+        parts.append(station_rows(args.stations))
+
+    # 3. Save
+    index = pd.concat(parts, ignore_index=True)[['level', 'key', 'latitude', 'longitude', 'distance_km', 'accessibility']]
+    index = index.round({'latitude': 5, 'longitude': 5, 'distance_km': 3, 'accessibility': 4})
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    index.to_csv(args.output, index=False)
+
+    for level, count in index['level'].value_counts().items():
+        logger.info(f"  {level}: {count} entries")
+    logger.info(f"✅ Wrote geo index to {args.output}")
+
+if __name__ == "__main__":
+    main()
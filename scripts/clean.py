@@ -1,7 +1,12 @@
 import sys
+import shutil
 import logging
+import argparse
 from pathlib import Path
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 
 # --- Path Setup ---
 project_root = Path(__file__).resolve().parent.parent
@@ -17,6 +22,9 @@ from src.cleaning_utils import (
     handle_special_flags,
     parse_periods
 )
+from src.config import CLEAN_DATASET_DIR, PROFILE_DIR, PREF_CODES, RAW_DATASET_DIR
+from src.price_index import period_label, update_price_index
+from src.quality import DataProfile
 
 # --- Logging Setup ---
 log_dir = project_root / "logs"
@@ -32,12 +40,61 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Partition keys of the raw store written by scripts/ingest.py
+RAW_PARTITIONING = ds.partitioning(pa.schema([('prefecture', pa.string()), ('year', pa.int32())]), flavor='hive')
+
+def load_raw(dataset_dir: Path, pref_codes) -> pd.DataFrame:
+    """
+    Reads the raw prefecture/year store, pruned to the requested prefectures
+    so only their partitions are opened.
+    """
+    dataset = ds.dataset(dataset_dir, format='parquet', partitioning=RAW_PARTITIONING)
+    table = dataset.to_table(filter=ds.field('prefecture').isin(list(pref_codes)))
+    return table.drop_columns(['prefecture', 'year']).to_pandas()
+
+def write_partitioned(df: pd.DataFrame, dataset_dir: Path):
+    """
+    Writes the cleaned data as a TransactionYear-partitioned Parquet store for src/query.py.
+    Rows are sorted by Municipality inside each partition so row-group statistics
+    let DuckDB skip most of the file on ward filters.
+    """
+    tmp_dir = dataset_dir.with_name(dataset_dir.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    df = df.sort_values(['TransactionYear', 'Municipality'], kind='stable')
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    pq.write_to_dataset(table, tmp_dir, partition_cols=['TransactionYear'])
+
+    # Swap in the new store only once it is fully written
+    shutil.rmtree(dataset_dir, ignore_errors=True)
+    tmp_dir.rename(dataset_dir)
+
+def profile_partitions(df: pd.DataFrame) -> DataProfile:
+    """
+    Data-quality profile of the cleaned data, accumulated one TransactionYear
+    partition at a time. scripts/train_xgb.py checks it for drift before fitting.
+    """
+    profile = DataProfile("clean", price_col="TradePriceYen")
+    for year, part in df.groupby('TransactionYear', sort=True):
+        profile.update(part, partition=year)
+    return profile
+
 def main():
-    input_file = project_root / "data" / "tokyo.parquet"
+    parser = argparse.ArgumentParser(description="Clean raw MLIT data into the model-ready store.")
+    parser.add_argument("--prefectures", nargs="+", default=PREF_CODES,
+                        help="Prefecture codes to keep from the raw store (e.g. 13 14).")
+    parser.add_argument("--rebuild-index", action="store_true",
+                        help="Recompute the price index from the first quarter instead of extending it.")
+    args = parser.parse_args()
+    pref_codes = [f"{int(c):02d}" for c in args.prefectures]
+
+    raw_dir = project_root / RAW_DATASET_DIR
+    input_file = project_root / "data" / "tokyo.parquet"  # single-file pull from older ingest runs
     output_file = project_root / "data" / "tokyo-clean.parquet"
+    dataset_dir = project_root / CLEAN_DATASET_DIR
     
-    if not input_file.exists():
-        logger.error(f"Input file not found at: {input_file}")
+    if not raw_dir.exists() and not input_file.exists():
+        logger.error(f"No raw data found at {raw_dir} or {input_file}")
         logger.error("Please run scripts/ingest.py first.")
         return
 
@@ -45,7 +102,11 @@ def main():
     
     try:
         # 1. Load Data
-        df = pd.read_parquet(input_file)
+        if raw_dir.exists():
+            df = load_raw(raw_dir, pref_codes)
+            logger.info(f"Prefectures: {', '.join(pref_codes)}")
+        else:
+            df = pd.read_parquet(input_file)
         logger.info(f"Loaded raw data: {df.shape[0]} rows, {df.shape[1]} columns")
 
         # 2. Initial Setup
@@ -70,6 +131,23 @@ def main():
         logger.info(f"Successfully wrote cleaned data to {output_file}")
         logger.info(f"Final shape: {df.shape[0]} rows, {df.shape[1]} columns")
 
+        # 7. Save Partitioned Store (query layer)
+        write_partitioned(df, dataset_dir)
+        logger.info(f"Wrote partitioned store to {dataset_dir}")
+
+        # 8. Save Data-Quality Profile
+        profile = profile_partitions(df)
+        profile.save(str(project_root / PROFILE_DIR / "clean.json"))
+        logger.info(f"Data profile: {profile.summary()}")
+
+        # 9. Extend Price Index (new quarters only)
+        index, periods = update_price_index(source=str(dataset_dir), rebuild=args.rebuild_index)
+        if periods:
+            logger.info(f"Price index: wrote {period_label(periods[0])}-{period_label(periods[-1])} "
+                        f"({len(index)} rows in total)")
+        else:
+            logger.info("Price index: no new quarters")
+
     except Exception as e:
         logger.exception(f"Data cleaning failed: {e}")
         sys.exit(1)
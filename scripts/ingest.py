@@ -1,18 +1,21 @@
+import os
 import sys
 import time
 import logging
+import argparse
 from datetime import date
 from pathlib import Path
-import pyarrow as pa
 import pyarrow.parquet as pq
+import requests
 
 # --- Path Setup ---
 # Add the project root to sys.path so we can import from 'src'
 project_root = Path(__file__).resolve().parent.parent
 sys.path.append(str(project_root))
 
-from src.config import START_YEAR
-from src.api import get_api_key, fetch_year_data
+from src.config import START_YEAR, PREF_CODES, ALL_PREF_CODES, RAW_DATASET_DIR, PROFILE_DIR
+from src.api import RAW_SCHEMA, get_api_key, stream_year_data
+from src.quality import DataProfile, compare_profiles
 
 # --- Logging Setup ---
 # Create a 'logs' directory in the project root if it doesn't exist
@@ -21,7 +24,7 @@ log_dir.mkdir(exist_ok=True)
 
 # Configure logging to write to BOTH a file and the console
 logging.basicConfig(
-    level=logging.INFO, 
+    level=logging.INFO,
     format="%(asctime)s - %(levelname)s - %(message)s",
     handlers=[
         logging.FileHandler(log_dir / "ingest.log"),  # Write to disk
@@ -30,54 +33,89 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+def ingest_partition(api_key: str, pref_code: str, year: int, dataset_dir: Path) -> DataProfile:
+    """
+    Streams one prefecture-year from the API straight into
+    <dataset_dir>/prefecture=XX/year=YYYY/part-0.parquet, one record batch at a time.
+    The previous file is only replaced once the new one is complete.
+    """
+    part_dir = dataset_dir / f"prefecture={pref_code}" / f"year={year}"
+    part_dir.mkdir(parents=True, exist_ok=True)
+    tmp_file = part_dir / "part-0.parquet.tmp"
+
+    profile = DataProfile("ingest", price_col="TradePrice")
+    try:
+        with pq.ParquetWriter(tmp_file, RAW_SCHEMA) as writer:
+            for batch in stream_year_data(api_key, year, pref_code):
+                writer.write_batch(batch)
+                profile.update(batch, partition=f"{pref_code}/{year}")
+    except BaseException:
+        tmp_file.unlink(missing_ok=True)
+        raise
+
+    if profile.rows:
+        os.replace(tmp_file, part_dir / "part-0.parquet")
+    else:
+        tmp_file.unlink(missing_ok=True)
+    return profile
+
 def main():
+    parser = argparse.ArgumentParser(description="Stream MLIT transactions into a prefecture/year partitioned Parquet store.")
+    parser.add_argument("--prefectures", nargs="+", default=PREF_CODES,
+                        help="Prefecture codes to ingest (e.g. 13 14), or 'all' for all 47.")
+    parser.add_argument("--start-year", type=int, default=START_YEAR)
+    args = parser.parse_args()
+
+    pref_codes = ALL_PREF_CODES if args.prefectures == ["all"] else [f"{int(c):02d}" for c in args.prefectures]
+
     # Setup output path relative to project root
-    output_file = project_root / "data" / "tokyo.parquet"
-    output_file.parent.mkdir(parents=True, exist_ok=True)
-    
+    dataset_dir = project_root / RAW_DATASET_DIR
+    dataset_dir.mkdir(parents=True, exist_ok=True)
+
     api_key = get_api_key()
     current_year = date.today().year
-    
-    # Writer initialized lazily (needs first batch to determine schema)
-    writer = None
     total_rows = 0
+    failed = []
 
-    logger.info(f"Starting streamed ingestion to {output_file}...")
+    # Data-quality profile built batch by batch as partitions are written
+    profile_path = project_root / PROFILE_DIR / "ingest.json"
+    profile = DataProfile("ingest", price_col="TradePrice")
 
-    try:
-        # Query data one year at a time
-        for year in range(START_YEAR, current_year + 1):
-            
-            # Fetch one year of data from MLIT api endpoint
-            records = fetch_year_data(api_key, year)
-            
-            if not records:
-                logger.warning(f"No records found for {year}, skipping...")
-                continue
+    logger.info(f"Starting streamed ingestion of {len(pref_codes)} prefecture(s) to {dataset_dir}...")
 
-            # Convert to Arrow Table (efficient in-memory format)
-            batch_table = pa.Table.from_pylist(records)
-            
-            # Initialize writer using schema from the first valid batch
-            if writer is None:
-                writer = pq.ParquetWriter(output_file, batch_table.schema)
-            
+    # Query data one prefecture-year at a time
+    for pref_code in pref_codes:
+        for year in range(args.start_year, current_year + 1):
             try:
-                writer.write_table(batch_table)
-                total_rows += batch_table.num_rows
-                logger.info(f"Wrote {year}: {batch_table.num_rows} rows. (Total: {total_rows})")
-            except ValueError as e:
-                 # Catches API schema changes between years
-                 logger.error(f"Schema mismatch error for year {year}: {e}")
-            
-            del records, batch_table
+                part_profile = ingest_partition(api_key, pref_code, year, dataset_dir)
+            except (requests.exceptions.RequestException, ValueError) as e:
+                # Keeps the previously ingested partition, if any
+                logger.error(f"Failed to ingest prefecture {pref_code}, year {year}: {e}")
+                failed.append(f"{pref_code}/{year}")
+                continue
+
+            if not part_profile.rows:
+                logger.warning(f"No records found for prefecture {pref_code}, year {year}, skipping...")
+                continue
+
+            profile.merge(part_profile)
+            total_rows += part_profile.rows
+            logger.info(f"Wrote {pref_code}/{year}: {part_profile.rows} rows. (Total: {total_rows})")
             time.sleep(1) # Rate limiting
 
-    finally:
-        # Ensure file is properly closed/finalized, even on error
-        if writer:
-            writer.close()
-            logger.info("Writer closed.")
+    # A partial pull must not reach clean/train as if it were current, nor replace the baseline profile
+    if failed:
+        logger.error(f"{len(failed)} partition(s) failed ({', '.join(failed)}); their previous data, if any, is kept.")
+        return 1
+
+    # Compare against the previous pull before it is overwritten
+    previous = DataProfile.load(str(profile_path))
+    profile.save(str(profile_path))
+    logger.info(f"Data profile: {profile.summary()}")
+    if previous is not None:
+        for issue in compare_profiles(profile, previous):
+            logger.warning(f"Drift vs previous ingest: {issue}")
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import os
+import sys
+import json
+import time
+import shlex
+import hashlib
+import logging
+import argparse
+import subprocess
+from datetime import date, datetime
+from graphlib import TopologicalSorter
+from pathlib import Path
+
+# --- Path Setup ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.config import (
+    CLEAN_DATA_PATH, CLEAN_DATASET_DIR, PROCESSED_DATA_PATH, XGB_PARAMS_PATH,
+    PROFILE_DIR, PIPELINE_STATE_PATH, RAW_DATASET_DIR, GEO_INDEX_PATH, PRICE_INDEX_PATH
+)
+from src.registry import champion_version, file_fingerprint
+
+# --- Logging Setup ---
+log_dir = project_root / "logs"
+log_dir.mkdir(exist_ok=True)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler(log_dir / "pipeline.log"),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+
+LOCK_PATH = project_root / "data" / ".pipeline.lock"
+
+# Each stage re-runs only when the fingerprint of its inputs (data + code) changed. The code
+# is the script and the src modules it imports, src/config.py included, since settings like
+# TRAIN_SEED or the drift limits change a stage's output as much as its code does.
+# A stage that re-runs but writes byte-identical output leaves downstream stages skipped.
+STAGES = {
+    'ingest': {
+        'script': 'scripts/ingest.py',
+        'deps': [],
+        'inputs': ['scripts/ingest.py', 'src/api.py', 'src/quality.py', 'src/config.py'],
+        'outputs': [RAW_DATASET_DIR],
+    },
+    'clean': {
+        'script': 'scripts/clean.py',
+        'deps': ['ingest'],
+        'inputs': [RAW_DATASET_DIR, 'scripts/clean.py', 'src/cleaning_utils.py', 'src/quality.py',
+                   'src/price_index.py', 'src/query.py', 'src/config.py'],
+        'outputs': [CLEAN_DATA_PATH, CLEAN_DATASET_DIR, f"{PROFILE_DIR}/clean.json", PRICE_INDEX_PATH],
+    },
+    'preprocess': {
+        'script': 'scripts/preprocessing_xgb.py',
+        'deps': ['clean'],
+        'inputs': [CLEAN_DATA_PATH, 'scripts/preprocessing_xgb.py', 'src/features.py', 'src/cleaning_utils.py',
+                   'src/price_index.py', 'src/config.py', GEO_INDEX_PATH, PRICE_INDEX_PATH],
+        'outputs': [PROCESSED_DATA_PATH],
+    },
+    'train': {
+        'script': 'scripts/train_xgb.py',
+        'deps': ['preprocess'],
+        'inputs': [
+            PROCESSED_DATA_PATH, XGB_PARAMS_PATH, f"{PROFILE_DIR}/clean.json",
+            'scripts/train_xgb.py', 'src/routing.py', 'src/inference.py', 'src/training.py', 'src/encoding.py',
+            'src/registry.py', 'src/quality.py', 'src/config.py'
+        ],
+        'outputs': [],
+    },
+}
+
+def ingest_period() -> str:
+    """MLIT publishes quarterly, so a pull is considered fresh for the current quarter."""
+    today = date.today()
+    return f"{today.year}Q{(today.month - 1) // 3 + 1}"
+
+def stage_fingerprint(name: str, extra_args) -> str:
+    stage = STAGES[name]
+    digest = hashlib.sha1()
+    for path in stage['inputs']:
+        digest.update(f"{path}={file_fingerprint(str(project_root / path))};".encode())
+    digest.update(" ".join(extra_args).encode())
+    if name == 'ingest':
+        digest.update(ingest_period().encode())
+    return digest.hexdigest()
+
+def load_state() -> dict:
+    path = project_root / PIPELINE_STATE_PATH
+    if not path.exists():
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_state(state: dict):
+    path = project_root / PIPELINE_STATE_PATH
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+def acquire_lock() -> bool:
+    """Single-run lock so a scheduled run never overlaps a manual one."""
+    LOCK_PATH.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        fd = os.open(LOCK_PATH, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        pid = LOCK_PATH.read_text().strip()
+        if pid.isdigit() and not _pid_alive(int(pid)):
+            logger.warning(f"Removing stale lock from process {pid}.")
+            LOCK_PATH.unlink(missing_ok=True)
+            return acquire_lock()
+        return False
+    with os.fdopen(fd, 'w') as f:
+        f.write(str(os.getpid()))
+    return True
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def run_pipeline(force=(), train_args=(), dry_run=False) -> bool:
+    """
+    Runs the stages in dependency order. Returns False if any stage failed;
+    stages downstream of a failure are not run.
+    """
+    state = load_state()
+    order = TopologicalSorter({name: stage['deps'] for name, stage in STAGES.items()}).static_order()
+    failed = set()
+
+    for name in order:
+        stage = STAGES[name]
+        if any(dep in failed for dep in stage['deps']):
+            logger.warning(f"[{name}] skipped: upstream stage failed.")
+            failed.add(name)
+            continue
+
+        extra_args = list(train_args) if name == 'train' else []
+        fingerprint = stage_fingerprint(name, extra_args)
+        outputs_exist = all((project_root / p).exists() for p in stage['outputs'])
+        previous = state.get(name, {}).get('fingerprint')
+
+        if name not in force and 'all' not in force and fingerprint == previous and outputs_exist:
+            logger.info(f"[{name}] up to date, skipping.")
+            continue
+
+        if dry_run:
+            logger.info(f"[{name}] would run.")
+            continue
+
+        logger.info(f"[{name}] running {stage['script']} {' '.join(extra_args)}".rstrip())
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, stage['script'], *extra_args], cwd=project_root)
+        elapsed = time.perf_counter() - start
+
+        if result.returncode != 0:
+            logger.error(f"[{name}] failed with exit code {result.returncode} after {elapsed:.1f}s.")
+            failed.add(name)
+            continue
+
+        state[name] = {
+            'fingerprint': fingerprint,
+            'finished_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'seconds': round(elapsed, 1),
+        }
+        save_state(state)
+        logger.info(f"[{name}] done in {elapsed:.1f}s.")
+
+    logger.info(f"Serving champion: {champion_version() or 'none (legacy model file)'}")
+    return not failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental ingest -> clean -> preprocess -> train pipeline.")
+    parser.add_argument("--force", nargs="+", default=[], choices=list(STAGES) + ['all'],
+                        help="Re-run these stages even if their inputs are unchanged.")
+    parser.add_argument("--train-args", default="",
+                        help="Extra arguments for train_xgb.py, e.g. --train-args=\"--segments price\".")
+    parser.add_argument("--dry-run", action="store_true", help="Only report which stages would run.")
+    parser.add_argument("--every", type=float, default=None,
+                        help="Keep running, refreshing every N hours (simple local scheduler).")
+    args = parser.parse_args()
+
+    train_args = shlex.split(args.train_args)
+    force = set(args.force)
+    while True:
+        if not acquire_lock():
+            logger.error(f"Another pipeline run holds {LOCK_PATH}; exiting.")
+            sys.exit(1)
+        try:
+            ok = run_pipeline(force, train_args, args.dry_run)
+        finally:
+            LOCK_PATH.unlink(missing_ok=True)
+        force = set()  # --force applies to the first run only
+
+        if args.every is None:
+            sys.exit(0 if ok else 1)
+        logger.info(f"Next run in {args.every:g}h.")
+        time.sleep(args.every * 3600)
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,9 @@ import logging
 # --- SETUP PATHS ---
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.features import add_basic_features, parse_floor_plan, impute_missing_categoricals
+from src.features import (
+    add_basic_features, add_geo_features, add_price_index_feature, parse_floor_plan, impute_missing_categoricals
+)
 
 # Constants
 INPUT_PATH = 'data/tokyo-clean.parquet'
@@ -62,6 +64,12 @@ def main():
     logger.info("Adding basic features (Ward Flag, Building Age)...")
     data = add_basic_features(data)
 
+    logger.info("Joining geo features (coordinates, distance to centre, station accessibility)...")
+    data = add_geo_features(data)
+
+    logger.info("Joining price index level (municipality x type, previous quarter)...")
+    data = add_price_index_feature(data)
+
     logger.info("Parsing Floor Plans (LDK)...")
     data = parse_floor_plan(data, col_name='FloorPlan')
     
@@ -0,0 +1,37 @@
+import sys
+import time
+import argparse
+from pathlib import Path
+import pandas as pd
+
+# --- Path Setup ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+from src.query import query, price_stats
+
+# Example: python scripts/query.py --group-by Municipality TransactionYear TransactionQuarter
+#          python scripts/query.py --sql "SELECT Type, count(*) FROM transactions GROUP BY 1"
+
+def main():
+    parser = argparse.ArgumentParser(description="Ad-hoc analytics over the cleaned transaction store.")
+    parser.add_argument("--sql", help="SQL to run against the `transactions` view.")
+    parser.add_argument("--group-by", nargs="+", default=["Municipality", "TransactionYear", "TransactionQuarter"],
+                        help="Columns for the default price-per-m² aggregation.")
+    parser.add_argument("--min-year", type=int, default=None)
+    parser.add_argument("--source", default=None, help="Parquet file or partitioned directory (defaults to the cleaned store).")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.sql:
+        result = query(args.sql, source=args.source)
+    else:
+        result = price_stats(args.group_by, min_year=args.min_year, source=args.source)
+    elapsed = time.perf_counter() - start
+
+    with pd.option_context("display.max_rows", 200, "display.width", 200):
+        print(result)
+    print(f"\n{len(result)} rows in {elapsed * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import sys
+import time
+import logging
+import argparse
+from pathlib import Path
+import pandas as pd
+
+# --- Path Setup ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+# --- Logging Setup ---
+log_dir = project_root / "logs"
+log_dir.mkdir(exist_ok=True)
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s",
+    handlers=[
+        logging.FileHandler(log_dir / "report.log"),
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger(__name__)
+logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per request otherwise
+
+from src.config import (
+    DEFAULT_MODEL, LLM_FALLBACK_MODELS, LLM_MAX_CONCURRENCY, LLM_RATE_PER_SECOND,
+    REPORT_CACHE_PATH, REPORT_CHUNK_SIZE, REPORT_COMPARABLES, REPORT_MARKET_YEARS
+)
+from src.chat import OPENROUTER_API_KEY, OPENROUTER_URL
+from src.inference import TIERS
+from src.llm_client import LLMClient
+from src.report import (
+    ERROR_COLUMN, ReportWriter, SummaryCache, load_listings, market_context, score_listings, summarize
+)
+
+# Example: python scripts/report.py --listings listings.csv --output reports/listings.md
+#          python scripts/report.py --listings listings.parquet --output reports/listings.parquet --no-llm
+#
+# Listings carry the dashboard's inputs (Municipality required; Type, FloorPlan, Area,
+# BuildingYear, ... optional) and an optional ListingId. Summaries are cached in
+# REPORT_CACHE_PATH, so an interrupted run picks up where it stopped.
+
+def log_throughput(stage: str, n: int, seconds: float, unit: str = "listings"):
+    rate = n / seconds if seconds > 0 else float('inf')
+    logger.info(f"{stage}: {n} {unit} in {seconds:.2f}s ({rate:,.1f} {unit}/s)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Valuation notes for a file of listings: batch scores, comparables, LLM summaries.")
+    parser.add_argument("--listings", type=Path, required=True, help="Listings as .parquet or .csv.")
+    parser.add_argument("--output", type=Path, required=True, help="Report as .parquet or .md.")
+    parser.add_argument("--tier", choices=TIERS, default='accurate', help="Inference tier used for the estimates.")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help="LLM for the summaries.")
+    parser.add_argument("--no-llm", action="store_true", help="Numbers only, no summaries.")
+    parser.add_argument("--chunk-size", type=int, default=REPORT_CHUNK_SIZE, help="Listings summarized and written per chunk.")
+    parser.add_argument("--max-concurrency", type=int, default=LLM_MAX_CONCURRENCY, help="LLM requests in flight.")
+    parser.add_argument("--rate", type=float, default=LLM_RATE_PER_SECOND, help="LLM requests per second.")
+    parser.add_argument("--cache", type=Path, default=project_root / REPORT_CACHE_PATH, help="Summary cache (JSONL).")
+    args = parser.parse_args()
+
+    # 1. Load Listings
+    start = time.perf_counter()
+    listings = load_listings(args.listings)
+    log_throughput("Load", len(listings), time.perf_counter() - start)
+    if listings.empty:
+        logger.error(f"No listings in {args.listings}.")
+        return 1
+    for error, count in listings[ERROR_COLUMN].value_counts().items():
+        logger.warning(f"{count} listings not scored: {error}")
+
+    # 2. Score (one vectorized call for the whole file)
+    start = time.perf_counter()
+    scores = score_listings(listings, tier=args.tier)
+    log_throughput(f"Score ({args.tier} tier)", len(listings), time.perf_counter() - start)
+
+    # 3. Comparables and Market Statistics (batched queries)
+    start = time.perf_counter()
+    context = market_context(listings, comparables=REPORT_COMPARABLES, years=REPORT_MARKET_YEARS)
+    log_throughput("Comparables + market stats", len(listings), time.perf_counter() - start)
+    report = pd.concat([listings, scores, context], axis=1)
+
+    # 4. Summaries + Streamed Output (chunk by chunk, so finished work survives an interruption)
+    cache = SummaryCache(None if args.no_llm else str(args.cache))
+    client = None
+    if not args.no_llm:
+        client = LLMClient(
+            OPENROUTER_URL, OPENROUTER_API_KEY, fallback_models=LLM_FALLBACK_MODELS,
+            max_concurrency=args.max_concurrency, rate=args.rate,
+        )
+        logger.info(f"Summaries with {args.model}: {len(cache)} cached, {args.max_concurrency} in flight, {args.rate:g}/s")
+
+    llm_seconds = write_seconds = 0.0
+    calls = failed = 0
+    with ReportWriter(args.output, report, title=f"Valuation report: {args.listings.name}") as writer:
+        for offset in range(0, len(report), args.chunk_size):
+            chunk = report.iloc[offset:offset + args.chunk_size]
+            if client is not None:
+                start = time.perf_counter()
+                chunk, n_calls = summarize(chunk, client, cache, args.model)
+                llm_seconds += time.perf_counter() - start
+                calls += n_calls
+                failed += int(chunk['SummaryError'].notna().sum())
+            else:
+                chunk = chunk.assign(Summary=None, SummaryError=None)
+
+            start = time.perf_counter()
+            writer.write(chunk)
+            write_seconds += time.perf_counter() - start
+            logger.info(f"Wrote {min(offset + args.chunk_size, len(report))}/{len(report)} listings")
+
+    if client is not None:
+        log_throughput("Summaries", len(report), llm_seconds)
+        logger.info(
+            f"LLM calls: {calls} ({len(report) - calls} from cache or duplicates), {failed} failed | "
+            f"upstream {client.stats['upstream']}, fallback {client.stats['fallback']}, hedged {client.stats['hedged']}"
+        )
+        if failed:
+            logger.warning(f"{failed} listings have no summary; rerun to retry them (finished ones come from the cache).")
+    log_throughput("Write", len(report), write_seconds)
+    logger.info(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
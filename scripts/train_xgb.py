@@ -1,16 +1,17 @@
 import pandas as pd
 import numpy as np
 import xgboost as xgb
-import category_encoders as ce
-import joblib
 import json
 import os
+import copy
 import sys
+import time
 import logging
-import csv
+import shutil
+import argparse
 from pathlib import Path
 from datetime import datetime
-from sklearn.metrics import mean_absolute_error
+from joblib import Parallel, delayed
 
 # --- Path Setup ---
 # Add the project root to sys.path so we can import from 'src'
@@ -34,52 +35,456 @@ logger = logging.getLogger(__name__)
 
 # --- IMPORTS FROM CONFIG ---
 # Assuming these exist in src/config.py. If not, replace with raw strings.
-from src.config import PROCESSED_DATA_PATH, XGB_PARAMS_PATH, MODEL_OUTPUT_PATH
+from src.config import (
+    PROCESSED_DATA_PATH, XGB_PARAMS_PATH, PROFILE_DIR, TRAINING_PROFILE_PATH, PROMOTION_MIN_GAIN,
+    INCREMENTAL_ROUNDS, INCREMENTAL_WINDOW_QUARTERS, INCREMENTAL_MAX_UPDATES, INCREMENTAL_MAX_DEGRADATION
+)
+from src.routing import (
+    LUXURY_THRESHOLD, SEGMENT_SCHEMES, TYPE_ROUTES,
+    assign_segments, build_column_gate, build_classifier_gate
+)
+from src.encoding import MergeableTargetEncoder
+from src.inference import encode_features, load_artifacts, resolve_artifacts_path, score_interval
+from src.registry import champion_version, file_fingerprint, new_version, promote, prune_versions, publish, record_run
+from src.quality import DataProfile, compare_profiles
+from src.training import (
+    DROP_COLS, ENGINES, encode_for_training, engine_params, error_metrics, fit_fast_tier, pinned_params
+)
 
 # CONSTANTS
-HISTORY_PATH = os.path.join(project_root, 'models', 'model_history.csv')
+CLEAN_PROFILE_PATH = os.path.join(PROFILE_DIR, 'clean.json')
 VALIDATION_SIZE = 3000  # Number of recent rows to hold out for health check
+MIN_SEGMENT_ROWS = 500  # Segments smaller than this fall back to the default route
+MIN_COMPARISON_ROWS = 500  # Holdout rows newer than the champion's data needed for an unbiased comparison
+ENGINE_REPORT_PATH = 'models/engine_comparison.json'  # written by --compare-engines
+
+# Quantiles for the prediction interval, fit as one multi-quantile booster
+INTERVAL_ALPHAS = [0.1, 0.9]
+
+# Small, fast classifier used to route rows between price segments
+GATE_PARAMS = {
+    'n_estimators': 100,
+    'max_depth': 4,
+    'learning_rate': 0.1,
+    'tree_method': 'hist',
+    'random_state': 42
+}
+
+def fit_model(X, y, params, intervals=True, engine='target', fast_tier=True):
+    """
+    Fits an encoder + XGBoost regressor pair on one slice of data, plus a
+    P10/P90 quantile booster sharing the same encoding, and optionally the
+    distilled fast tier of both.
+    """
+    X_enc, encoder, categories = encode_for_training(X, y, engine)
+    params = engine_params(params, engine)
+
+    model = xgb.XGBRegressor(**params)
+    model.fit(X_enc, y)
+
+    artifacts = {
+        'model': model,
+        'encoder': encoder,
+        'engine': engine,
+        'features': X.columns.tolist(),
+        'hyperparameters': params,
+        'rows': len(X)
+    }
+    if categories is not None:
+        artifacts['categories'] = categories
+
+    if intervals:
+        # One booster with a multi-quantile objective returns both bounds in a single pass
+        interval_model = xgb.XGBRegressor(
+            **{**params, 'objective': 'reg:quantileerror', 'quantile_alpha': np.array(INTERVAL_ALPHAS)}
+        )
+        interval_model.fit(X_enc, y)
+        artifacts['interval_model'] = interval_model
+        artifacts['interval_alphas'] = INTERVAL_ALPHAS
+
+    if fast_tier:
+        artifacts['fast_model'] = fit_fast_tier(X_enc, model.predict(X_enc), params)
+        if intervals:
+            bounds = artifacts['interval_model'].predict(X_enc).reshape(len(X_enc), -1)
+            artifacts['fast_interval_model'] = fit_fast_tier(X_enc, bounds, params)
+
+    return artifacts
+
+def update_model(artifacts, X_new, y_new, X_recent, y_recent, n_jobs, rounds=INCREMENTAL_ROUNDS):
+    """
+    Incremental counterpart of fit_model: merges the new rows into the encoder's
+    statistics, then continues every booster for `rounds` rounds on the recent rows
+    (the fast tier on the updated full model's outputs). The input artifacts are
+    left untouched.
+    """
+    updated = dict(artifacts)
+    if artifacts.get('encoder') is not None:
+        updated['encoder'] = copy.deepcopy(artifacts['encoder']).partial_fit(X_new, y_new)
+    X_enc = encode_features(X_recent, updated)
+
+    def extend(model, target):
+        # A plain DMatrix: the sklearn wrapper's QuantileDMatrix re-bins the new rows,
+        # so the existing trees would start from shifted margins
+        dtrain = xgb.DMatrix(X_enc, label=target, enable_categorical=True)
+        booster = xgb.train(
+            {**model.get_xgb_params(), 'n_jobs': n_jobs}, dtrain, rounds, xgb_model=model.get_booster()
+        )
+        grown = xgb.XGBRegressor(**{**model.get_params(), 'n_estimators': booster.num_boosted_rounds()})
+        grown.load_model(bytearray(booster.save_raw()))
+        return grown
+
+    updated['model'] = extend(artifacts['model'], y_recent)
+    if 'interval_model' in artifacts:
+        updated['interval_model'] = extend(artifacts['interval_model'], y_recent)
+    if 'fast_model' in artifacts:
+        updated['fast_model'] = extend(artifacts['fast_model'], updated['model'].predict(X_enc))
+    if 'fast_interval_model' in artifacts:
+        bounds = updated['interval_model'].predict(X_enc).reshape(len(X_enc), -1)
+        updated['fast_interval_model'] = extend(artifacts['fast_interval_model'], bounds)
+
+    updated['rows'] = artifacts['rows'] + len(X_new)
+    updated['incremental_updates'] = artifacts.get('incremental_updates', 0) + 1
+    return updated
+
+def fit_gate(X, y, is_positive, labels, n_jobs, engine='target'):
+    """Fits the routing classifier on features encoded the same way as the segment models."""
+    X_enc, encoder, categories = encode_for_training(X, y, engine)
+
+    params = engine_params({**GATE_PARAMS, 'n_jobs': n_jobs}, engine)
+    model = xgb.XGBClassifier(**params)
+    model.fit(X_enc, is_positive.astype(int))
+
+    return build_classifier_gate(model, encoder, X.columns.tolist(), labels, categories=categories)
+
+def train_segments(
+    df, scheme, params, target_col='LogTradePriceYen', intervals=True, engine='target', fast_tier=True
+):
+    """
+    Trains every segment model (and the gate, if learned) in one parallel run.
+    Returns a routed artifact bundle readable by src.inference.
+    """
+    names = SEGMENT_SCHEMES[scheme]
+    labels = assign_segments(df, scheme)
+    X = df.drop(columns=DROP_COLS, errors='ignore')
+    y = df[target_col]
+
+    jobs = []
+    for name in names:
+        mask = (labels == name).to_numpy()
+        if mask.sum() < MIN_SEGMENT_ROWS:
+            if name == names[0]:
+                # Skipped segments and unroutable rows are served by the default model, so it must exist
+                raise ValueError(
+                    f"Default segment '{name}' has only {mask.sum()} rows (< {MIN_SEGMENT_ROWS}), so the bundle "
+                    f"would have no fallback model; train without --segments or with another scheme."
+                )
+            logger.warning(f"Segment '{name}' has only {mask.sum()} rows; routing it to '{names[0]}'.")
+            continue
+        jobs.append((name, X[mask], y[mask]))
+
+    # Split the cores between concurrent fits instead of oversubscribing them
+    n_tasks = len(jobs) + (1 if scheme == 'price' else 0)
+    threads = max(1, params['n_jobs'] // n_tasks)
+    seg_params = {**params, 'n_jobs': threads}
+
+    tasks = [delayed(fit_model)(X_s, y_s, seg_params, intervals, engine, fast_tier) for _, X_s, y_s in jobs]
+    if scheme == 'price':
+        is_luxury = labels == 'luxury'
+        tasks.append(delayed(fit_gate)(X, y, is_luxury, tuple(names), threads, engine))
+
+    logger.info(f"Fitting {len(tasks)} models in parallel ({threads} threads each)...")
+    # XGBoost releases the GIL, so threads avoid copying the data into worker processes
+    results = Parallel(n_jobs=len(tasks), prefer='threads')(tasks)
+
+    segments = {name: res for (name, _, _), res in zip(jobs, results)}
+    if scheme == 'price':
+        gate = results[-1]
+    else:
+        gate = build_column_gate('Type', TYPE_ROUTES, default=names[0])
+
+    for name, seg in segments.items():
+        logger.info(f"  Segment '{name}': {seg['rows']} rows")
+
+    return {
+        'scheme': scheme,
+        'engine': engine,
+        'segments': segments,
+        'gate': gate,
+        'default': names[0],
+        'threshold': LUXURY_THRESHOLD if scheme == 'price' else None
+    }
+
+def compare_engines(X_train, y_train, X_test, y_test, params):
+    """
+    Fits the point model with each engine on the same split and thread count and
+    reports fit time, encode+predict time and holdout accuracy.
+    """
+    actual_yen = np.exp(y_test).to_numpy()
+    report = []
+    for engine in ENGINES:
+        start = time.perf_counter()
+        artifacts = fit_model(X_train, y_train, params, intervals=False, engine=engine, fast_tier=False)
+        fit_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        preds = score_interval(artifacts, X_test)['Prediction'].to_numpy()
+        predict_seconds = time.perf_counter() - start
+
+        metrics = error_metrics(actual_yen, preds)
+        report.append({
+            'engine': engine,
+            'fit_seconds': round(fit_seconds, 2),
+            'predict_ms_per_1k_rows': round(predict_seconds * 1000 / len(X_test) * 1000, 2),
+            'mae': round(metrics['mae'], 0),
+            'mape': round(metrics['mape'], 4),
+        })
+
+    logger.info(f"Engine comparison ({len(X_train)} train / {len(X_test)} holdout rows, {params['n_jobs']} threads):")
+    for row in report:
+        logger.info(
+            f"  {row['engine']:<7} fit {row['fit_seconds']:>7.2f}s | predict {row['predict_ms_per_1k_rows']:>7.2f} ms/1k rows "
+            f"| MAE ¥{row['mae']:,.0f} | MAPE {row['mape']:.2f}%"
+        )
+    return report
+
+def check_drift() -> bool:
+    """
+    Compares the latest clean-data profile with the one saved by the last successful
+    training run. Returns False if the data drifted past the limits in src/quality.py.
+    """
+    current = DataProfile.load(CLEAN_PROFILE_PATH)
+    if current is None:
+        logger.warning(f"No data profile at {CLEAN_PROFILE_PATH}; skipping drift check. Re-run scripts/clean.py.")
+        return True
+
+    baseline = DataProfile.load(TRAINING_PROFILE_PATH)
+    if baseline is None:
+        logger.info("No training baseline profile yet; this run will create one.")
+        return True
+
+    issues = compare_profiles(current, baseline)
+    for issue in issues:
+        logger.error(f"Drift: {issue}")
+    if not issues:
+        logger.info("Drift check passed.")
+    return not issues
+
+def score_champion(val_df, X_test_val, actual_yen, challenger_ape):
+    """
+    Scores the currently served model on the challenger's holdout.
+    The champion was fit on all data available at its time, so only holdout rows newer
+    than its training data are compared when there are enough of them; otherwise the
+    whole holdout is used, which favours the champion (a conservative gate).
+    Returns (champion_mape, challenger_mape, compared_rows) or None without a champion.
+    """
+    path = resolve_artifacts_path()
+    if not os.path.exists(path):
+        return None
+
+    try:
+        champion = load_artifacts(path)
+        champion_preds = score_interval(champion, X_test_val)['Prediction'].to_numpy()
+    except Exception as e:
+        logger.warning(f"Could not score champion at {path}: {e}")
+        return None
 
-# Columns to drop (Targets + Metadata not for training)
-DROP_COLS = [
-    'TradePriceYen', 
-    'LogTradePriceYen', 
-    'TransactionQuarterEndDate', 
-    'TransactionQuarter'
-]
-
-# Categorical Columns
-CAT_COLS = [
-    'Municipality', 'DistrictName', 'NearestStation', 
-    'Use', 'Structure', 'LandShape', 
-    'Renovation', 'Purpose', 'Type', 'Region', 'CityPlanning', 
-    'Classification', 'RoadDirection', 'Remarks'
-]
-
-def log_metrics_to_csv(metrics):
-    """Appends training run metrics to a CSV file for long-term tracking."""
-    file_exists = os.path.isfile(HISTORY_PATH)
-    
-    # Ensure directory exists
-    os.makedirs(os.path.dirname(HISTORY_PATH), exist_ok=True)
-    
-    with open(HISTORY_PATH, 'a', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=metrics.keys())
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow(metrics)
+    mask = np.ones(len(val_df), dtype=bool)
+    trained_through = champion.get('trained_through')
+    if trained_through is not None and 'TransactionQuarterEndDate' in val_df.columns:
+        fresh = (val_df['TransactionQuarterEndDate'] > trained_through).to_numpy()
+        if fresh.sum() >= MIN_COMPARISON_ROWS:
+            mask = fresh
+        else:
+            logger.info(f"Only {fresh.sum()} holdout rows are newer than the champion's data; comparing on all {len(mask)}.")
+
+    champion_ape = np.abs((actual_yen - champion_preds) / actual_yen) * 100
+    return champion_ape[mask].mean(), challenger_ape[mask].mean(), int(mask.sum())
+
+def incremental_update(df, n_jobs):
+    """
+    Brings the champion up to date with the rows newer than its training data instead
+    of refitting on the full history. The newest half of those rows (at most
+    VALIDATION_SIZE) is held out first: if the updated model does not beat the champion
+    there, or is still more than INCREMENTAL_MAX_DEGRADATION MAPE points worse than the
+    last full fit was at its health check (not the previous update's, so the allowance
+    does not compound across updates), the data has moved too far for a patch.
+    Returns the exit code, or None when a full retrain is needed instead.
+    """
+    path = resolve_artifacts_path()
+    if not os.path.exists(path) or 'TransactionQuarterEndDate' not in df.columns:
+        logger.warning("No champion (or no transaction dates) to update incrementally.")
+        return None
+    champion = load_artifacts(path)
+    encoder = champion.get('encoder')
+    if 'segments' in champion:
+        logger.warning("Routed segment bundles are not updated incrementally.")
+        return None
+    if encoder is not None and not isinstance(encoder, MergeableTargetEncoder):
+        logger.warning("The champion's encoder keeps no statistics to merge (trained before incremental updates).")
+        return None
+    if champion.get('incremental_updates', 0) >= INCREMENTAL_MAX_UPDATES:
+        logger.warning(f"The champion has had {INCREMENTAL_MAX_UPDATES} incremental updates since its last full fit.")
+        return None
+    trained_through = champion.get('trained_through')
+    if trained_through is None:
+        logger.warning("The champion does not record which data it was trained on.")
+        return None
+    full_fit_mape = champion.get('full_fit_mape')
+    if full_fit_mape is None and champion.get('incremental_updates', 0) == 0:
+        full_fit_mape = champion.get('latest_metrics', {}).get('mape')  # published before full_fit_mape was stored
+    if full_fit_mape is None:
+        logger.warning("The champion does not record the MAPE of its last full fit.")
+        return None
+
+    dates = df['TransactionQuarterEndDate']
+    new = (dates > trained_through).to_numpy()
+    if not new.any():
+        logger.info(f"No rows newer than the champion's data ({trained_through:%Y-%m-%d}); nothing to update.")
+        return 0
+    recent = (dates > dates.max() - pd.DateOffset(months=3 * INCREMENTAL_WINDOW_QUARTERS)).to_numpy()
+    X = df.drop(columns=DROP_COLS, errors='ignore')
+    y = df['LogTradePriceYen']
+    logger.info(
+        f"🔁 Incremental update: {new.sum()} new rows since {trained_through:%Y-%m-%d}, "
+        f"{INCREMENTAL_ROUNDS} rounds on {recent.sum()} rows of the last {INCREMENTAL_WINDOW_QUARTERS} quarters"
+    )
+
+    # Holdout: the newest of the new rows, unseen by both the champion and the candidate
+    n_hold = min(VALIDATION_SIZE, int(new.sum()) // 2)
+    if n_hold == 0:
+        logger.warning("A single new row cannot be split into update and holdout rows.")
+        return None
+    holdout = np.zeros(len(df), dtype=bool)
+    holdout[np.flatnonzero(new)[-n_hold:]] = True
+    actual_yen = np.exp(y[holdout]).to_numpy()
+    fit_new, fit_recent = new & ~holdout, recent & ~holdout
+    candidate = update_model(champion, X[fit_new], y[fit_new], X[fit_recent], y[fit_recent], n_jobs)
+    champion_mape = error_metrics(actual_yen, score_interval(champion, X[holdout])['Prediction'])['mape']
+    candidate_preds = score_interval(candidate, X[holdout])['Prediction'].to_numpy()
+    metrics = error_metrics(actual_yen, candidate_preds)
+    logger.info(
+        f"Holdout of {holdout.sum()} new rows -- champion MAPE: {champion_mape:.2f}% "
+        f"(last full fit: {full_fit_mape:.2f}%) | updated MAPE: {metrics['mape']:.2f}%"
+    )
+
+    if metrics['mape'] > champion_mape - PROMOTION_MIN_GAIN:
+        logger.warning("The incremental update did not improve on the champion.")
+        return None
+    if metrics['mape'] - full_fit_mape > INCREMENTAL_MAX_DEGRADATION:
+        logger.warning(
+            f"Even updated, the model is over {INCREMENTAL_MAX_DEGRADATION} MAPE points worse than at its last fit."
+        )
+        return None
+
+    # Final update on every new row
+    start = time.perf_counter()
+    artifacts = update_model(champion, X[new], y[new], X[recent], y[recent], n_jobs)
+    logger.info(f"Updated the champion in {time.perf_counter() - start:.1f}s")
+
+    version = new_version()
+    metrics_record = {
+        'run_id': version,
+        'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'scheme': 'none',
+        'engine': champion.get('engine', 'target'),
+        'mode': 'incremental',
+        'mae': round(metrics['mae'], 0),
+        'mape': round(metrics['mape'], 4),
+        'champion_run_id': champion_version(),
+        'champion_mape': round(champion_mape, 4),
+        'compared_rows': int(holdout.sum()),
+        'training_rows': artifacts['rows'],
+        'validation_rows': int(holdout.sum()),
+        'data_fingerprint': file_fingerprint(PROCESSED_DATA_PATH),
+        'decision': 'promoted (incremental)'
+    }
+    release(artifacts, version, metrics_record, df)
+    return 0
+
+def release(artifacts, version, metrics_record, df):
+    """
+    Publishes a new version and promotes it. The new version gets its own directory;
+    serving switches over with one atomic pointer swap, so the dashboard never sees
+    a half-written model.
+    """
+    logger.info("Packaging artifacts...")
+    artifacts['latest_metrics'] = metrics_record
+    if metrics_record.get('mode') == 'full':
+        # Baseline for INCREMENTAL_MAX_DEGRADATION; incremental updates carry it over unchanged
+        artifacts['full_fit_mape'] = metrics_record['mape']
+    if 'TransactionQuarterEndDate' in df.columns:
+        artifacts['trained_through'] = df['TransactionQuarterEndDate'].max()
+
+    output_path = publish(artifacts, version)
+    promote(version)
+    record_run({**metrics_record, 'artifact_path': os.path.relpath(output_path, project_root)})
+    prune_versions()
+    logger.info(f"✅ Model {version} saved to {output_path} and promoted to champion")
+
+    # The data this model was trained on becomes the next run's drift baseline
+    if os.path.exists(CLEAN_PROFILE_PATH):
+        shutil.copyfile(CLEAN_PROFILE_PATH, TRAINING_PROFILE_PATH)
+        logger.info(f"Saved drift baseline to {TRAINING_PROFILE_PATH}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Train the XGBoost valuation model.")
+    parser.add_argument(
+        '--segments', choices=['none'] + list(SEGMENT_SCHEMES), default='none',
+        help="Train one routed model per segment ('price': mass market/luxury, 'type': condo/land) instead of a single model."
+    )
+    parser.add_argument(
+        '--no-intervals', action='store_true',
+        help="Skip the P10/P90 quantile models (halves training time, disables price ranges)."
+    )
+    parser.add_argument(
+        '--allow-drift', action='store_true',
+        help="Train even if the data drifted from the last successful run (e.g. after an intended schema change)."
+    )
+    parser.add_argument(
+        '--force-promote', action='store_true',
+        help="Promote the new model even if it does not beat the current champion."
+    )
+    parser.add_argument(
+        '--engine', choices=ENGINES, default='target',
+        help="'target': TargetEncoder + XGBoost; 'native': XGBoost's own categorical splits (no encoding step)."
+    )
+    parser.add_argument(
+        '--compare-engines', action='store_true',
+        help=f"Time and score both engines on the holdout, write {ENGINE_REPORT_PATH} and exit without publishing."
+    )
+    parser.add_argument(
+        '--no-fast-tier', action='store_true',
+        help="Skip the distilled low-latency companion models served with tier='fast'."
+    )
+    parser.add_argument(
+        '--incremental', action='store_true',
+        help="Update the champion with rows newer than its data (encoder merge + extra boosting rounds); "
+             "falls back to a full retrain on drift (no --allow-drift needed) or holdout degradation."
+    )
+    args = parser.parse_args()
+
     logger.info("Starting Training Pipeline...")
 
+    # 0. DRIFT CHECK (seconds, before any fitting)
+    drifted = not check_drift()
+    if drifted:
+        if args.incremental:
+            # A patch is only trusted on data like the champion's; the full retrain is the fallback
+            logger.warning("Data drifted from the last training run; --incremental falls back to a full retrain.")
+        elif not args.allow_drift:
+            logger.error("Aborting: data drifted from the last training run. Inspect the pull or pass --allow-drift.")
+            return 1
+        else:
+            logger.warning("Continuing despite drift (--allow-drift).")
+
     # 1. Load Data
     if not os.path.exists(PROCESSED_DATA_PATH):
         logger.error(f"Data not found at {PROCESSED_DATA_PATH}. Run preprocessing first.")
-        return
-    
+        return 1
+
     logger.info(f"Loading data from {PROCESSED_DATA_PATH}...")
     df = pd.read_parquet(PROCESSED_DATA_PATH)
-    
+
     # --- CRITICAL: SORT DATA ---
     # We must sort by time so the validation set represents the "future"
     if 'TransactionQuarterEndDate' in df.columns:
@@ -92,19 +497,19 @@ def main():
 
     # 2. HEALTH CHECK (Validate before Commit)
     logger.info(f"🩺 Running Health Check (Holdout: Last {VALIDATION_SIZE} rows)...")
-    
+
     # Split Data for Validation
     train_df = df.iloc[:-VALIDATION_SIZE].copy()
     val_df = df.iloc[-VALIDATION_SIZE:].copy()
-    
+
     target_col = 'LogTradePriceYen'
     if target_col not in df.columns:
         logger.error(f"Target column '{target_col}' not found!")
-        return
+        return 1
 
     y_train_val = train_df[target_col]
     y_test_val = val_df[target_col]
-    
+
     # Prepare Features
     X_train_val = train_df.drop(columns=DROP_COLS, errors='ignore')
     X_test_val = val_df.drop(columns=DROP_COLS, errors='ignore')
@@ -112,85 +517,152 @@ def main():
     # Load Hyperparameters
     if not os.path.exists(XGB_PARAMS_PATH):
         logger.error(f"Hyperparameters not found at {XGB_PARAMS_PATH}.")
-        return
+        return 1
 
     with open(XGB_PARAMS_PATH, 'r') as f:
-        params = json.load(f)
-
-    # Encode for Health Check
-    valid_cat_cols = [c for c in CAT_COLS if c in X_train_val.columns]
-    encoder_check = ce.TargetEncoder(cols=valid_cat_cols, smoothing=10)
-    X_train_enc = encoder_check.fit_transform(X_train_val, y_train_val)
-    X_test_enc = encoder_check.transform(X_test_val)
+        params = pinned_params(json.load(f))
+    logger.info(
+        f"Engine: {args.engine} | tree_method: {params['tree_method']} | "
+        f"threads: {params['n_jobs']} | seed: {params['random_state']}"
+    )
 
     # Train Proxy Model
-    # We temporarily remove early_stopping from params if it exists, 
+    # We temporarily remove early_stopping from params if it exists,
     # OR we could add eval_set here. Let's just run full iterations for simplicity.
     proxy_params = params.copy()
     if 'early_stopping_rounds' in proxy_params:
         del proxy_params['early_stopping_rounds']
 
-    model_check = xgb.XGBRegressor(**proxy_params)
-    model_check.fit(X_train_enc, y_train_val)
+    # 1b. INCREMENTAL UPDATE (a quarterly refresh in minutes; a full retrain when it cannot be trusted)
+    if args.incremental:
+        status = None
+        if drifted:
+            logger.warning("The data drifted, so the champion is not patched.")
+        else:
+            status = incremental_update(df, params['n_jobs'])
+        if status is not None:
+            return status
+        logger.warning("Falling back to a full retrain.")
+
+    if args.compare_engines:
+        report = compare_engines(X_train_val, y_train_val, X_test_val, y_test_val, proxy_params)
+        with open(ENGINE_REPORT_PATH, 'w') as f:
+            json.dump({'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"), 'engines': report}, f, indent=2)
+        logger.info(f"Saved engine comparison to {ENGINE_REPORT_PATH}")
+        return 0
+
+    intervals = not args.no_intervals
+    fast_tier = not args.no_fast_tier
+    if args.segments == 'none':
+        check_artifacts = fit_model(X_train_val, y_train_val, proxy_params, intervals, args.engine, fast_tier)
+    else:
+        try:
+            check_artifacts = train_segments(
+                train_df, args.segments, proxy_params, target_col, intervals, args.engine, fast_tier
+            )
+        except ValueError as e:
+            logger.error(str(e))
+            return 1
 
     # Score Proxy Model
-    preds_log = model_check.predict(X_test_enc)
-    preds_yen = np.exp(preds_log)
+    preds = score_interval(check_artifacts, X_test_val)
+    preds_yen = preds['Prediction'].to_numpy()
     actual_yen = np.exp(y_test_val)
-    
-    mae = mean_absolute_error(actual_yen, preds_yen)
-    mape = np.mean(np.abs((actual_yen - preds_yen) / actual_yen)) * 100
-    
-    logger.info(f"Health Check Results -- MAE: ¥{mae:,.0f} | MAPE: {mape:.2f}%")
 
-    # Log History
+    metrics = error_metrics(actual_yen, preds_yen)
+    mae, mape = metrics['mae'], metrics['mape']
+    ape = np.abs((actual_yen - preds_yen) / actual_yen).to_numpy() * 100
+
+    logger.info(f"Health Check Results -- MAE: ¥{mae:,.0f} | MAPE: {mape:.2f}% | Bias: ¥{metrics['bias']:,.0f}")
+
+    if intervals:
+        # Share of holdout prices inside [P10, P90]; ~80% means the band is calibrated
+        inside = (actual_yen.to_numpy() >= preds['Lower']) & (actual_yen.to_numpy() <= preds['Upper'])
+        logger.info(f"Interval Coverage (P10-P90): {inside.mean() * 100:.1f}%")
+
+    fast_mape = None
+    if fast_tier:
+        # Accuracy given up by the distilled tier on the same holdout
+        fast_preds = score_interval(check_artifacts, X_test_val, tier='fast')['Prediction'].to_numpy()
+        fast_mape = error_metrics(actual_yen, fast_preds)['mape']
+        drift = np.median(np.abs(fast_preds / preds_yen - 1)) * 100
+        logger.info(
+            f"Fast tier -- MAPE: {fast_mape:.2f}% ({fast_mape - mape:+.2f} pts) | "
+            f"median deviation from full model: {drift:.2f}%"
+        )
+
+    if args.segments != 'none':
+        # Per-segment error on the true segment labels, to spot a weak segment model
+        true_segments = assign_segments(val_df, args.segments).to_numpy()
+        for name in SEGMENT_SCHEMES[args.segments]:
+            mask = true_segments == name
+            if mask.any():
+                logger.info(f"  Segment '{name}': {mask.sum()} rows | MAPE: {ape[mask].mean():.2f}%")
+
+    # 3. CHAMPION / CHALLENGER (same holdout, decided before the expensive final fit)
+    version = new_version()
+    incumbent = champion_version()
+    comparison = score_champion(val_df, X_test_val, actual_yen.to_numpy(), ape)
+    if comparison is None:
+        promoted, decision = True, 'promoted (no champion)'
+    else:
+        champion_mape, challenger_mape, compared_rows = comparison
+        logger.info(
+            f"Champion vs challenger on {compared_rows} holdout rows -- "
+            f"champion MAPE: {champion_mape:.2f}% | challenger MAPE: {challenger_mape:.2f}%"
+        )
+        wins = challenger_mape <= champion_mape - PROMOTION_MIN_GAIN
+        promoted = wins or args.force_promote
+        decision = 'promoted' if wins else ('promoted (forced)' if promoted else 'rejected')
+
+    # Log History (one row per run in the run registry)
     metrics_record = {
+        'run_id': version,
         'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        'scheme': args.segments,
+        'engine': args.engine,
+        'mode': 'full',
         'mae': round(mae, 0),
         'mape': round(mape, 4),
+        'fast_mape': round(fast_mape, 4) if fast_mape is not None else None,
+        'champion_run_id': incumbent,
+        'champion_mape': round(comparison[0], 4) if comparison else None,
+        'compared_rows': comparison[2] if comparison else None,
         'training_rows': len(df),
-        'validation_rows': VALIDATION_SIZE
+        'validation_rows': VALIDATION_SIZE,
+        'data_fingerprint': file_fingerprint(PROCESSED_DATA_PATH),
+        'decision': decision
     }
-    log_metrics_to_csv(metrics_record)
 
+    if not promoted:
+        record_run(metrics_record)
+        logger.warning("Challenger did not beat the champion; keeping the current model (--force-promote overrides).")
+        return 0
 
-    # 3. FINAL PRODUCTION TRAINING (100% Data)
+    # 4. FINAL PRODUCTION TRAINING (100% Data)
     logger.info("Health check passed. Training Final Model on 100% of data...")
-    
-    y_all = df[target_col]
-    X_all = df.drop(columns=DROP_COLS, errors='ignore')
-    
-    # Final Encoding
-    logger.info("Fitting Target Encoder on ALL data...")
-    final_encoder = ce.TargetEncoder(cols=valid_cat_cols, smoothing=10)
-    X_all_enc = final_encoder.fit_transform(X_all, y_all)
 
     # Final Params (ensure early stopping is gone)
     if 'early_stopping_rounds' in params:
         del params['early_stopping_rounds']
 
-    # Final Training
-    logger.info("Training XGBoost Model...")
-    final_model = xgb.XGBRegressor(**params)
-    final_model.fit(X_all_enc, y_all)
-    logger.info("Training Complete.")
+    if args.segments == 'none':
+        y_all = df[target_col]
+        X_all = df.drop(columns=DROP_COLS, errors='ignore')
 
-    # 4. SAVE ARTIFACTS
-    logger.info("Packaging artifacts...")
-    artifacts = {
-        'model': final_model,
-        'encoder': final_encoder,
-        'features': X_all.columns.tolist(),
-        'hyperparameters': params,
-        'threshold': 200000000,
-        'latest_metrics': metrics_record
-    }
+        # Final Encoding + Training
+        logger.info(f"Fitting '{args.engine}' engine on ALL data...")
+        artifacts = fit_model(X_all, y_all, params, intervals, args.engine, fast_tier)
+        artifacts['threshold'] = LUXURY_THRESHOLD
+    else:
+        logger.info(f"Training '{args.segments}' segment models on ALL data...")
+        artifacts = train_segments(df, args.segments, params, target_col, intervals, args.engine, fast_tier)
+        artifacts['hyperparameters'] = params
+    logger.info("Training Complete.")
 
-    # Create models dir if not exists
-    os.makedirs(os.path.dirname(MODEL_OUTPUT_PATH), exist_ok=True)
-    
-    joblib.dump(artifacts, MODEL_OUTPUT_PATH)
-    logger.info(f"✅ Model saved to {MODEL_OUTPUT_PATH}")
+    # 5. PUBLISH & PROMOTE
+    release(artifacts, version, metrics_record, df)
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
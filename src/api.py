@@ -1,14 +1,29 @@
 # src/api.py
 import os
+import json
+import codecs
 import logging
+import re
 import requests
-from typing import List, Dict, Any
+import pyarrow as pa
+from typing import List, Dict, Any, Iterable, Iterator
 from dotenv import load_dotenv
 
-from src.config import BASE_URL, PREF_CODE, TIMEOUT
+from src.config import BASE_URL, PREF_CODE, TIMEOUT, STREAM_CHUNK_BYTES, RECORD_BATCH_ROWS
 
 logger = logging.getLogger(__name__)
 
+# Fixed schema for raw MLIT records (the API returns every field as a string): the fields
+# XIT001 actually returns. Fields missing from a record become nulls; unexpected fields are dropped.
+RAW_FIELDS = [
+    'PriceCategory', 'Type', 'Region', 'MunicipalityCode', 'Prefecture', 'Municipality',
+    'DistrictName', 'DistrictCode', 'TradePrice', 'PricePerUnit', 'FloorPlan',
+    'Area', 'UnitPrice', 'LandShape', 'Frontage', 'TotalFloorArea', 'BuildingYear', 'Structure',
+    'Use', 'Purpose', 'Direction', 'Classification', 'Breadth', 'CityPlanning', 'CoverageRatio',
+    'FloorAreaRatio', 'Period', 'Renovation', 'Remarks'
+]
+RAW_SCHEMA = pa.schema([(name, pa.string()) for name in RAW_FIELDS])
+
 def get_api_key() -> str:
     """
     Loads and validates the API key.
@@ -19,7 +34,7 @@ def get_api_key() -> str:
         raise ValueError("Missing API Key. Please check your .env file.")
     return key
 
-def fetch_year_data(api_key: str, year: int) -> List[Dict[str, Any]]:
+def fetch_year_data(api_key: str, year: int, pref_code: str = PREF_CODE) -> List[Dict[str, Any]]:
     """
     Fetches a single year of data from the MLIT API.
     """
@@ -28,7 +43,7 @@ def fetch_year_data(api_key: str, year: int) -> List[Dict[str, Any]]:
     }
 
     params = {
-        "area": PREF_CODE,
+        "area": pref_code,
         "year": year,
         "language": "en"
     }
@@ -40,4 +55,81 @@ def fetch_year_data(api_key: str, year: int) -> List[Dict[str, Any]]:
         return response.json().get("data", [])
     except requests.exceptions.RequestException as e:
         logger.error(f"Failed to fetch data for year {year}: {e}")
-        return []
\ No newline at end of file
+        return []
+
+def iter_json_array(chunks: Iterable[bytes], key: str = "data") -> Iterator[Dict[str, Any]]:
+    """
+    Incrementally decodes the objects of the top-level `key` array of a JSON document
+    delivered as byte chunks, holding at most one chunk plus one partial object in memory.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    buf, pos, in_array = "", 0, False
+
+    for chunk in chunks:
+        buf = buf[pos:] + utf8.decode(chunk)
+        pos = 0
+
+        if not in_array:
+            match = start.search(buf)
+            if match is None:
+                # Keep a tail in case the key is split across chunks
+                pos = max(0, len(buf) - len(key) - 16)
+                continue
+            pos, in_array = match.end(), True
+
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(buf):
+                break
+            if buf[pos] == "]":
+                return
+            try:
+                record, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # object continues in the next chunk
+            yield record
+
+    if in_array:
+        raise ValueError("Truncated JSON response: array was not closed.")
+
+def records_to_batches(records: Iterable[Dict[str, Any]], schema: pa.Schema = RAW_SCHEMA,
+                       batch_rows: int = RECORD_BATCH_ROWS) -> Iterator[pa.RecordBatch]:
+    """Groups records into fixed-schema Arrow record batches of at most `batch_rows` rows."""
+    names = schema.names
+    columns = {name: [] for name in names}
+    rows = 0
+    for record in records:
+        for name in names:
+            value = record.get(name)
+            columns[name].append(None if value is None else str(value))
+        rows += 1
+        if rows == batch_rows:
+            yield pa.RecordBatch.from_pydict(columns, schema=schema)
+            columns = {name: [] for name in names}
+            rows = 0
+    if rows:
+        yield pa.RecordBatch.from_pydict(columns, schema=schema)
+
+def stream_year_data(api_key: str, year: int, pref_code: str = PREF_CODE) -> Iterator[pa.RecordBatch]:
+    """
+    Streams one prefecture-year from the MLIT API as RAW_SCHEMA record batches.
+    Memory stays bounded by STREAM_CHUNK_BYTES + RECORD_BATCH_ROWS regardless of response size.
+    Raises requests.exceptions.RequestException / ValueError on failure.
+    """
+    headers = {
+        "Ocp-Apim-Subscription-Key": api_key
+    }
+
+    params = {
+        "area": pref_code,
+        "year": year,
+        "language": "en"
+    }
+
+    with requests.get(BASE_URL, headers=headers, params=params, timeout=TIMEOUT, stream=True) as response:
+        response.raise_for_status()
+        chunks = response.iter_content(chunk_size=STREAM_CHUNK_BYTES)
+        yield from records_to_batches(iter_json_array(chunks))
@@ -0,0 +1,94 @@
+# src/background.py
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from src.config import BACKGROUND_WORKERS
+
+_executor: Optional[ThreadPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Process-wide thread pool shared by every dashboard session.
+    Model scoring, DuckDB and HTTP calls all release the GIL, so threads overlap well.
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix="advisor")
+        return _executor
+
+
+class TaskBoard:
+    """
+    Per-session registry of named background tasks.
+    Each task is tied to a key (e.g. a hash of the form inputs); asking for the same
+    name with a new key cancels the stale task and starts a fresh one.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, Tuple[str, Future]] = {}
+        self._lock = threading.Lock()
+
+    def ensure(self, name: str, key: str, fn: Callable, *args, **kwargs) -> Future:
+        """Returns the task for (name, key), submitting it if it is not already running."""
+        with self._lock:
+            current = self._tasks.get(name)
+            if current is not None:
+                current_key, future = current
+                if current_key == key:
+                    return future
+                # Not-yet-started work is dropped; running work finishes but is ignored
+                future.cancel()
+
+            future = get_executor().submit(fn, *args, **kwargs)
+            self._tasks[name] = (key, future)
+            return future
+
+    def get(self, name: str) -> Optional[Future]:
+        with self._lock:
+            current = self._tasks.get(name)
+            return current[1] if current else None
+
+    def key(self, name: str) -> Optional[str]:
+        with self._lock:
+            current = self._tasks.get(name)
+            return current[0] if current else None
+
+    def cancel(self, name: str):
+        with self._lock:
+            current = self._tasks.pop(name, None)
+        if current is not None:
+            current[1].cancel()
+
+    def pop(self, name: str):
+        with self._lock:
+            self._tasks.pop(name, None)
+
+    def value(self, name: str, default=None):
+        """Result of a finished task, or `default` if it is missing, pending or failed."""
+        future = self.get(name)
+        if future is None or not future.done() or future.cancelled() or future.exception() is not None:
+            return default
+        return future.result()
+
+    def completed(self, names, heartbeat: Optional[Callable] = None, interval: float = 0.25) -> Iterator[Tuple[str, Future]]:
+        """
+        Yields (name, future) for the given tasks in completion order.
+        `heartbeat` is called between polls; in Streamlit any element update is a point
+        where a rerun (e.g. a changed form) can interrupt the wait.
+        """
+        pending = {}
+        for name in names:
+            future = self.get(name)
+            if future is not None and not future.cancelled():
+                pending[future] = name
+
+        while pending:
+            done, _ = wait(list(pending), timeout=interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future
+            if pending and not done and heartbeat is not None:
+                heartbeat()
@@ -0,0 +1,247 @@
+# src/backtest.py
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from joblib import Parallel, delayed
+
+from src.inference import categorize
+from src.price_index import period_label, period_of
+from src.routing import LUXURY_THRESHOLD
+from src.training import DROP_COLS, TARGET_SMOOTHING, encode_for_training, engine_params
+
+TARGET_COL = 'LogTradePriceYen'
+
+# Metric slices, besides the overall and per-origin rows
+SLICES = ['Municipality', 'Type', 'FloorPlan', 'PriceBand']
+PRICE_BANDS = [0, 30_000_000, 60_000_000, 100_000_000, LUXURY_THRESHOLD, np.inf]
+PRICE_BAND_LABELS = ['<¥30M', '¥30-60M', '¥60-100M', '¥100-200M', '¥200M+']
+MIN_TRAIN_QUARTERS = 8  # origins need at least this much history before them
+
+_FOLD_MEMORY = 16  # encoded folds kept in-process across backtests
+_folds: "OrderedDict[str, dict]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def rolling_origins(periods: pd.Series, n_folds: int) -> List[int]:
+    """The last `n_folds` quarters that have at least MIN_TRAIN_QUARTERS of history."""
+    quarters = np.sort(periods.unique())
+    eligible = quarters[MIN_TRAIN_QUARTERS:]
+    return [int(q) for q in eligible[-n_folds:]]
+
+
+def floor_plan_labels(df: pd.DataFrame) -> pd.Series:
+    """
+    Rebuilds an 'nLDK+S' label from the parsed floor-plan features
+    (preprocessing drops the raw FloorPlan column).
+    """
+    if 'RoomCount' not in df.columns:
+        return pd.Series('Unknown', index=df.index)
+    label = df['RoomCount'].astype(int).astype(str)
+    for flag, letter in (('Has_L', 'L'), ('Has_D', 'D'), ('Has_K', 'K')):
+        label = label + np.where(df.get(flag, 0) == 1, letter, '')
+    label = label + np.where(df.get('Has_S', 0) == 1, '+S', '')
+    # Studios/open floors ('1R') and 'None' ('0R') carry no letters
+    return label.mask(label.isin(['0', '1']), label + 'R')
+
+
+def _fold_key(data_fingerprint: str, engine: str, origin: int, features: List[str]) -> str:
+    digest = hashlib.sha1(
+        f"{engine}|{origin}|{TARGET_SMOOTHING}|{','.join(features)}".encode()
+    ).hexdigest()[:16]
+    return f"{data_fingerprint[:12]}-{digest}"
+
+
+def encoded_fold(
+    df: pd.DataFrame,
+    periods: np.ndarray,
+    origin: int,
+    engine: str,
+    data_fingerprint: Optional[str] = None,
+    cache_dir: Optional[str] = None,
+) -> dict:
+    """
+    Encoded train (every quarter before `origin`) and test (the origin quarter) data.
+    Encoding depends only on the data, the engine and the fold, never on model
+    hyperparameters, so it is cached in memory and, with a data fingerprint and
+    cache_dir, on disk: later backtests of other variants skip it entirely.
+    """
+    X = df.drop(columns=DROP_COLS, errors='ignore')
+    key = _fold_key(data_fingerprint, engine, origin, X.columns.tolist()) if data_fingerprint else None
+
+    if key is not None:
+        with _lock:
+            if key in _folds:
+                _folds.move_to_end(key)
+                return _folds[key]
+        path = os.path.join(cache_dir, f"{key}.pkl") if cache_dir else None
+        if path and os.path.exists(path):
+            fold = joblib.load(path)
+            _remember(key, fold)
+            return fold
+
+    train, test = periods < origin, periods == origin
+    X_train, encoder, categories = encode_for_training(X[train], df.loc[train, TARGET_COL], engine)
+    if encoder is not None:
+        X_test = encoder.transform(X[test]).apply(pd.to_numeric, errors='coerce')
+    else:
+        X_test = categorize(X[test], categories)
+
+    fold = {
+        'origin': origin, 'engine': engine,
+        'X_train': X_train, 'y_train': df.loc[train, TARGET_COL].to_numpy(),
+        'X_test': X_test, 'test_rows': np.flatnonzero(test),
+    }
+    if key is not None:
+        _remember(key, fold)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = os.path.join(cache_dir, f".{key}.tmp")
+            joblib.dump(fold, tmp)
+            os.replace(tmp, os.path.join(cache_dir, f"{key}.pkl"))
+    return fold
+
+
+def _remember(key: str, fold: dict):
+    with _lock:
+        _folds[key] = fold
+        while len(_folds) > _FOLD_MEMORY:
+            _folds.popitem(last=False)
+
+
+def prune_fold_cache(cache_dir: str, data_fingerprint: str):
+    """Deletes cached folds of older data."""
+    if not os.path.isdir(cache_dir):
+        return
+    for name in os.listdir(cache_dir):
+        if not name.startswith(data_fingerprint[:12]):
+            os.remove(os.path.join(cache_dir, name))
+
+
+def _fit_predict(fold: dict, params: dict, n_jobs: int) -> np.ndarray:
+    model = xgb.XGBRegressor(**{**engine_params(params, fold['engine']), 'n_jobs': n_jobs})
+    model.fit(fold['X_train'], fold['y_train'])
+    return model.predict(fold['X_test'])
+
+
+def run_backtest(
+    df: pd.DataFrame,
+    variants: Dict[str, dict],
+    n_folds: int,
+    n_jobs: int,
+    data_fingerprint: Optional[str] = None,
+    cache_dir: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Rolling-origin backtest: for each of the last `n_folds` quarters, every variant
+    is fit on all earlier quarters and scored on that quarter. `variants` maps a
+    name to XGBoost params, with an optional 'engine' ('target' or 'native').
+    Folds are encoded once per engine, then all (variant, fold) fits run in
+    parallel threads sharing the cores. Returns one row per scored transaction.
+    """
+    df = df.reset_index(drop=True)
+    periods = period_of(df['TransactionYear'].to_numpy(), df['TransactionQuarter'].to_numpy())
+    origins = rolling_origins(pd.Series(periods), n_folds)
+    if not origins:
+        raise ValueError(f"Need more than {MIN_TRAIN_QUARTERS} quarters of data for a backtest.")
+
+    engines = sorted({spec.get('engine', 'target') for spec in variants.values()})
+    pairs = [(origin, engine) for origin in origins for engine in engines]
+    # XGBoost and pandas release the GIL for most of the work; threads avoid copying df
+    encoded = Parallel(n_jobs=min(len(pairs), n_jobs), prefer='threads')(
+        delayed(encoded_fold)(df, periods, origin, engine, data_fingerprint, cache_dir)
+        for origin, engine in pairs
+    )
+    folds = {(f['origin'], f['engine']): f for f in encoded}
+
+    tasks = [
+        (name, origin, {k: v for k, v in spec.items() if k != 'engine'}, spec.get('engine', 'target'))
+        for name, spec in variants.items() for origin in origins
+    ]
+    workers = min(len(tasks), n_jobs)
+    threads = max(1, n_jobs // workers)
+    preds = Parallel(n_jobs=workers, prefer='threads')(
+        delayed(_fit_predict)(folds[(origin, engine)], params, threads) for _, origin, params, engine in tasks
+    )
+
+    meta = pd.DataFrame({
+        'Municipality': df['Municipality'].astype(str) if 'Municipality' in df.columns else 'Unknown',
+        'Type': df['Type'].astype(str) if 'Type' in df.columns else 'Unknown',
+        'FloorPlan': floor_plan_labels(df),
+        'ActualYen': np.exp(df[TARGET_COL]),
+    })
+    frames = []
+    for (name, origin, _, engine), log_pred in zip(tasks, preds):
+        rows = folds[(origin, engine)]['test_rows']
+        part = meta.iloc[rows].reset_index(drop=True)
+        part.insert(0, 'Origin', period_label(origin))
+        part.insert(0, 'Variant', name)
+        part['PredictedYen'] = np.exp(log_pred)
+        frames.append(part)
+
+    out = pd.concat(frames, ignore_index=True)
+    out['PriceBand'] = pd.cut(out['ActualYen'], PRICE_BANDS, labels=PRICE_BAND_LABELS, right=False)
+    return out
+
+
+def sliced_metrics(predictions: pd.DataFrame, slices: List[str] = SLICES) -> pd.DataFrame:
+    """
+    MAE, MAPE, median APE, bias and share within 10% for every variant overall,
+    per origin quarter and per value of each slice column, in one groupby pass
+    over the slices stacked into long form.
+    """
+    residual = predictions['ActualYen'] - predictions['PredictedYen']
+    errors = pd.DataFrame({
+        'Variant': predictions['Variant'],
+        'AbsErr': residual.abs(),
+        'APE': (residual / predictions['ActualYen']).abs() * 100,
+        'Err': residual,
+        'PctErr': residual / predictions['ActualYen'] * 100,
+    })
+    errors['Within10'] = errors['APE'] <= 10
+
+    keys = {'Overall': pd.Series('all', index=predictions.index), 'Origin': predictions['Origin']}
+    keys.update({s: predictions[s].astype(str) for s in slices})
+    stacked = pd.concat(
+        [errors.assign(Slice=name, Value=values.to_numpy()) for name, values in keys.items()],
+        ignore_index=True
+    )
+
+    metrics = stacked.groupby(['Variant', 'Slice', 'Value'], sort=False, observed=True).agg(
+        Rows=('APE', 'size'), MAE=('AbsErr', 'mean'), MAPE=('APE', 'mean'), MedianAPE=('APE', 'median'),
+        Bias=('Err', 'mean'), BiasPct=('PctErr', 'mean'), Within10=('Within10', 'mean'),
+    ).reset_index()
+    return metrics.round({'MAE': 0, 'MAPE': 2, 'MedianAPE': 2, 'Bias': 0, 'BiasPct': 2, 'Within10': 3})
+
+
+def compact_report(metrics: pd.DataFrame, min_rows: int = 30, worst: int = 5) -> List[str]:
+    """
+    Human-readable summary: overall metrics and MAPE by origin per variant, then
+    the worst slices (by MAPE, at least `min_rows` rows) of each dimension.
+    """
+    lines = []
+    for variant, rows in metrics.groupby('Variant', sort=False):
+        overall = rows[rows['Slice'] == 'Overall'].iloc[0]
+        lines.append(
+            f"{variant}: {overall['Rows']} rows | MAE ¥{overall['MAE']:,.0f} | MAPE {overall['MAPE']:.2f}% "
+            f"| median APE {overall['MedianAPE']:.2f}% | bias {overall['BiasPct']:+.2f}% "
+            f"| within 10%: {overall['Within10'] * 100:.1f}%"
+        )
+        by_origin = rows[rows['Slice'] == 'Origin'].sort_values('Value')
+        lines.append("  MAPE by quarter: " + ", ".join(f"{v} {m:.1f}%" for v, m in zip(by_origin['Value'], by_origin['MAPE'])))
+        for name in SLICES:
+            part = rows[(rows['Slice'] == name) & (rows['Rows'] >= min_rows)]
+            if part.empty:
+                continue
+            top = part.nlargest(worst, 'MAPE')
+            lines.append(f"  Worst {name}: " + ", ".join(
+                f"{v} {m:.1f}% (n={n}, bias {b:+.1f}%)"
+                for v, m, n, b in zip(top['Value'], top['MAPE'], top['Rows'], top['BiasPct'])
+            ))
+    return lines
@@ -0,0 +1,119 @@
+# src/cache.py
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+# SQLite limits bound parameters per statement; look keys up in chunks of this size
+_SQL_CHUNK = 500
+
+
+class PredictionCache:
+    """
+    Two-level cache of per-row model outputs (float vectors).
+    Level 1 is an in-process LRU; level 2 is an optional SQLite file shared by every
+    process on the machine (dashboard workers, scripts). Entries live under a
+    namespace that embeds the model version, so promoting a new model simply makes
+    the old entries unreachable; the store drops them the first time it sees the
+    new version.
+    """
+
+    def __init__(self, capacity: int = 10000, db_path: Optional[str] = None):
+        self.capacity = capacity
+        self.db_path = db_path
+        self._memory: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._live_versions = set()
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self.db_path is None:
+            return None
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "namespace TEXT NOT NULL, version TEXT NOT NULL, key INTEGER NOT NULL, value BLOB NOT NULL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, namespace: str, version: str, keys: np.ndarray) -> List[Optional[np.ndarray]]:
+        """Cached vectors for `keys` (uint64 row hashes), None where missing."""
+        out: List[Optional[np.ndarray]] = [None] * len(keys)
+        with self._lock:
+            for i, key in enumerate(keys.tolist()):
+                value = self._memory.get((namespace, version, key))
+                if value is not None:
+                    self._memory.move_to_end((namespace, version, key))
+                    out[i] = value
+
+        conn = self._connection()
+        missing = [i for i, value in enumerate(out) if value is None]
+        if conn is None or not missing:
+            return out
+
+        # SQLite stores signed 64-bit integers
+        signed = keys.view(np.int64)
+        found = {}
+        for start in range(0, len(missing), _SQL_CHUNK):
+            chunk = [int(signed[i]) for i in missing[start:start + _SQL_CHUNK]]
+            rows = conn.execute(
+                f"SELECT key, value FROM predictions WHERE namespace = ? AND version = ? "
+                f"AND key IN ({','.join('?' * len(chunk))})",
+                [namespace, version, *chunk]
+            ).fetchall()
+            found.update((key, np.frombuffer(blob, dtype=np.float64)) for key, blob in rows)
+
+        promoted = []
+        for i in missing:
+            value = found.get(int(signed[i]))
+            if value is not None:
+                out[i] = value
+                promoted.append((keys[i], value))
+        if promoted:
+            self._remember(namespace, version, promoted)
+        return out
+
+    def put_many(self, namespace: str, version: str, keys: Sequence, values: np.ndarray):
+        values = np.asarray(values, dtype=np.float64).reshape(len(keys), -1)
+        self._remember(namespace, version, list(zip(keys, values)))
+
+        conn = self._connection()
+        if conn is None:
+            return
+        with conn:
+            if (namespace, version) not in self._live_versions:
+                # First write for this model version: drop entries of superseded versions
+                conn.execute("DELETE FROM predictions WHERE namespace = ? AND version != ?", (namespace, version))
+                self._live_versions.add((namespace, version))
+            conn.executemany(
+                "INSERT OR REPLACE INTO predictions (namespace, version, key, value) VALUES (?, ?, ?, ?)",
+                [
+                    (namespace, version, int(np.uint64(key).view(np.int64)), value.tobytes())
+                    for key, value in zip(keys, values)
+                ]
+            )
+
+    def _remember(self, namespace: str, version: str, items):
+        with self._lock:
+            for key, value in items:
+                self._memory[(namespace, version, int(key))] = value
+            while len(self._memory) > self.capacity:
+                self._memory.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        conn = self._connection()
+        if conn is not None:
+            with conn:
+                conn.execute("DELETE FROM predictions")
@@ -1,5 +1,5 @@
-import requests
-from typing import Dict, List, Optional
+import threading
+from typing import Any, Dict, List, Optional
 import sys
 import os
 from dotenv import load_dotenv
@@ -7,7 +7,9 @@ from dotenv import load_dotenv
 # --- SETUP PATHS ---
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from src.config import OPENROUTER_URL, DEFAULT_MODEL
+from src.config import OPENROUTER_URL, DEFAULT_MODEL, CHAT_MAX_TOOL_ROUNDS, LLM_FALLBACK_MODELS
+from src.features import MARKET_LEVEL_SOURCE
+from src.llm_client import LLMClient
 
 SYSTEM_PROMPT = (
     "You are a Tokyo residential real estate market advisor."
@@ -15,8 +17,28 @@ SYSTEM_PROMPT = (
     "note uncertainty when data is thin, and do not fabricate numbers."
 )
 
+TOOLS_PROMPT = (
+    "You can call tools to price other properties (estimate_prices), look up comparable sales "
+    "(find_comparables) and market statistics (price_statistics). When the user asks about a property, "
+    "area or layout you have no numbers for, call them instead of guessing; request everything you need "
+    "in one turn, since the calls run in parallel."
+)
+
 load_dotenv()
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
+OPENROUTER_URL = os.getenv('OPENROUTER_URL', OPENROUTER_URL)
+
+_client: Optional[LLMClient] = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client() -> LLMClient:
+    """The process-wide client: every session shares its limits, coalescing and circuit breakers."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = LLMClient(OPENROUTER_URL, OPENROUTER_API_KEY, fallback_models=LLM_FALLBACK_MODELS)
+        return _client
 
 def _format_property_context(property_context: Optional[Dict]) -> Optional[str]:
     if not property_context:
@@ -34,9 +56,27 @@ def _format_property_context(property_context: Optional[Dict]) -> Optional[str]:
     return "Property context to inform your answer:\n" + "\n".join(lines)
 
 
+def _format_attributions(attributions: Optional[Dict[str, float]]) -> Optional[str]:
+    if not attributions:
+        return None
+
+    lines = [f"- {name}: {effect:+.1f}%" for name, effect in attributions.items()]
+    if MARKET_LEVEL_SOURCE in attributions:
+        lines.append(
+            f"({MARKET_LEVEL_SOURCE} is the recent price level of this municipality and property type "
+            "from the price index, i.e. the local market, not the sale year.)"
+        )
+    return (
+        "Model attribution for the estimate (TreeSHAP; effect of each input on the price "
+        "relative to a typical property). Use these when explaining why the estimate is what it is:\n"
+        + "\n".join(lines)
+    )
+
+
 def _build_messages(
     history: List[Dict[str, str]],
     property_context: Optional[Dict],
+    attributions: Optional[Dict[str, float]] = None,
 ) -> List[Dict[str, str]]:
     messages: List[Dict[str, str]] = [{"role": "system", "content": SYSTEM_PROMPT}]
 
@@ -44,27 +84,43 @@ def _build_messages(
     if context_message:
         messages.append({"role": "system", "content": context_message})
 
+    attribution_message = _format_attributions(attributions)
+    if attribution_message:
+        messages.append({"role": "system", "content": attribution_message})
+
     messages.extend(history)
     return messages
 
 
+def _post_completion(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """One chat completions request through the shared client; returns the first choice's message."""
+    try:
+        return get_llm_client().complete(payload)
+    except RuntimeError as exc:
+        raise RuntimeError(f"OpenRouter request failed: {exc}") from exc
+
+
 def get_chat_completion(
     history: List[Dict[str, str]],
     property_context: Optional[Dict] = None,
     model: str = DEFAULT_MODEL,
     temperature: float = 0.4,
     max_tokens: int = 512,
+    attributions: Optional[Dict[str, float]] = None,
+    tools=None,
+    max_tool_rounds: int = CHAT_MAX_TOOL_ROUNDS,
 ) -> str:
     """
     Calls OpenRouter's chat completions endpoint with the given history and context.
+    `attributions` ({input: % effect}) lets the model explain the estimate from the model itself.
+    `tools` (a src.tools.AdvisorTools) lets the model call local valuation and market tools;
+    after `max_tool_rounds` round trips it has to answer with what it has.
     Raises an exception if the API call fails or returns no content.
     """
-    messages = _build_messages(history, property_context)
+    messages = _build_messages(history, property_context, attributions)
+    if tools is not None:
+        messages.insert(1, {"role": "system", "content": TOOLS_PROMPT})
 
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json",
-    }
     payload = {
         "model": model,
         "messages": messages,
@@ -72,23 +128,21 @@ def get_chat_completion(
         "max_tokens": max_tokens,
     }
 
-    try:
-        response = requests.post(
-            OPENROUTER_URL,
-            headers=headers,
-            json=payload,
-            timeout=30,
-        )
-        response.raise_for_status()
-        data = response.json()
-    except requests.RequestException as exc:
-        raise RuntimeError(f"OpenRouter request failed: {exc}") from exc
+    for round_trip in range(max_tool_rounds + 1 if tools is not None else 1):
+        if tools is not None:
+            payload["tools"] = tools.schemas
+            # Last round: tools stay declared (the history references them) but cannot be called
+            payload["tool_choice"] = "auto" if round_trip < max_tool_rounds else "none"
+
+        message = _post_completion(payload)
+        tool_calls = message.get("tool_calls") if tools is not None else None
+        if not tool_calls:
+            break
 
-    choices = data.get("choices", [])
-    if not choices:
-        raise RuntimeError("OpenRouter returned no choices.")
+        messages.append({"role": "assistant", "content": message.get("content") or "", "tool_calls": tool_calls})
+        messages.extend(tools.run(tool_calls))
 
-    content = choices[0].get("message", {}).get("content")
+    content = message.get("content")
     if not content:
         raise RuntimeError("OpenRouter returned an empty message.")
 
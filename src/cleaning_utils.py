@@ -65,6 +65,9 @@ MUNICIPALITY_MAPPING = {
     'Kozushima Village': '神津島村 (Kozushima Village)',
 }
 
+# Prefecture label of the MLIT data for the municipalities in MUNICIPALITY_MAPPING
+TOKYO_PREFECTURE = 'Tokyo'
+
 QUARTER_END_dates = {
     1: (3, 31),
     2: (6, 30),
@@ -78,7 +81,7 @@ def initial_clean(df: pd.DataFrame) -> pd.DataFrame:
     """Drops unused columns and renames key columns."""
     drop_cols = [
         'MunicipalityCode', 'DistrictCode', 'PriceCategory', 
-        'PricePerUnit', 'UnitPrice', 'Prefecture'
+        'PricePerUnit', 'UnitPrice'
     ]
     # Only drop columns that actually exist to avoid errors
     df = df.drop(columns=[c for c in drop_cols if c in df.columns])
@@ -96,8 +99,15 @@ def filter_residential(df: pd.DataFrame) -> pd.DataFrame:
     return df.reset_index(drop=True)
 
 def map_municipalities(df: pd.DataFrame) -> pd.DataFrame:
-    """Maps English municipality names to the Japanese/English combo format."""
-    df['Municipality'] = df['Municipality'].map(MUNICIPALITY_MAPPING)
+    """
+    Maps English municipality names to the Japanese/English combo format.
+    The mapping is Tokyo's, so only Tokyo rows are mapped; names in other prefectures
+    (multi-prefecture ingest) are kept as they are, e.g. Hiroshima's 'Fuchu City'.
+    """
+    mapped = df['Municipality'].map(MUNICIPALITY_MAPPING)
+    if 'Prefecture' in df.columns:
+        mapped = mapped.where(df['Prefecture'] == TOKYO_PREFECTURE)
+    df['Municipality'] = mapped.fillna(df['Municipality'])
     return df
 
 def convert_types(df: pd.DataFrame) -> pd.DataFrame:
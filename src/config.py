@@ -3,15 +3,78 @@
 # ingest.py
 BASE_URL = "https://www.reinfolib.mlit.go.jp/ex-api/external/XIT001"
 PREF_CODE = "13"  # Tokyo
+PREF_CODES = [PREF_CODE]  # prefectures ingested/cleaned by default
+ALL_PREF_CODES = [f"{code:02d}" for code in range(1, 48)]  # ingest.py --prefectures all
 START_YEAR = 2010
 TIMEOUT = 30
+RAW_DATASET_DIR = 'data/raw'  # hive-partitioned by prefecture/year
+STREAM_CHUNK_BYTES = 1 << 16  # HTTP read size for the streaming JSON decode
+RECORD_BATCH_ROWS = 10000  # rows per Arrow record batch written during ingest
+
+# clean.py / query.py
+CLEAN_DATA_PATH = 'data/tokyo-clean.parquet'
+CLEAN_DATASET_DIR = 'data/tokyo-clean'  # hive-partitioned by TransactionYear
+QUERY_THREADS = None  # None lets DuckDB use every core
+PROFILE_DIR = 'data/profiles'  # data-quality profiles written by ingest.py / clean.py
+
+# price_index.py
+PRICE_INDEX_PATH = 'data/price_index.parquet'  # municipality x type x quarter index, extended by clean.py
+PRICE_INDEX_CREDIBILITY = 20  # sales a quarter needs before a municipality's own move gets half weight
+PRICE_INDEX_REVISE_QUARTERS = 1  # latest stored quarters re-estimated on update (late-reported sales)
+
+# features.py / build_geo_index.py
+MUNICIPALITY_CENTROIDS_PATH = 'src/resources/municipality_centroids.csv'  # bundled source data
+GEO_INDEX_PATH = 'src/resources/geo_index.csv'  # bundled lookup index built by scripts/build_geo_index.py
+GEO_CENTRE = (35.6812, 139.7671)  # Tokyo Station (lat, lon)
 
 # train.py
 PROCESSED_DATA_PATH = 'data/tokyo-preprocessed.parquet'
 XGB_PARAMS_PATH = 'models/best_hyperparameters_xgb.json'
-MODEL_OUTPUT_PATH = 'models/tokyo_mass_market_xgb.pkl'
+MODEL_OUTPUT_PATH = 'models/tokyo_mass_market_xgb.pkl'  # legacy fallback when no registry champion exists
+SEGMENT_MODEL_PATH = 'models/tokyo_segments_xgb.pkl'  # legacy routed multi-model bundle
+TRAINING_PROFILE_PATH = 'models/training_profile.json'  # clean-data profile of the last successful run
+MODEL_REGISTRY_DIR = 'models/registry'  # versioned models + CHAMPION pointer
+RUN_HISTORY_PATH = 'models/model_history.csv'  # one row per training run
+PREDICTION_CACHE_SIZE = 30000  # in-process LRU entries (points, intervals and explanations)
+PREDICTION_CACHE_DB = None  # e.g. 'data/prediction_cache.sqlite' to share cached predictions across processes
+PROMOTION_MIN_GAIN = 0.0  # challenger must beat champion MAPE by at least this many points
+TRAIN_THREADS = None  # XGBoost threads per run; None pins to os.cpu_count()
+TRAIN_SEED = 42  # random_state used unless best_hyperparameters_xgb.json sets one
+INCREMENTAL_ROUNDS = 50  # boosting rounds added to each booster by train_xgb.py --incremental
+INCREMENTAL_WINDOW_QUARTERS = 4  # most recent quarters those rounds are fit on
+INCREMENTAL_MAX_UPDATES = 4  # consecutive incremental updates before a full retrain is forced
+INCREMENTAL_MAX_DEGRADATION = 1.0  # MAPE points an updated model may lose vs its last full fit before a full retrain
+
+# backtest.py
+BACKTEST_FOLDS = 8  # most recent quarters used as rolling origins
+BACKTEST_CACHE_DIR = 'data/backtest_cache'  # encoded fold data, reused across variants and runs
+BACKTEST_REPORT_PATH = 'models/backtest_metrics.csv'  # sliced metrics of the last backtest
+
+# report.py
+REPORT_CACHE_PATH = 'data/report_cache.jsonl'  # LLM summaries by request hash; reruns resume from it
+REPORT_CHUNK_SIZE = 32  # listings summarized concurrently and written per chunk
+REPORT_COMPARABLES = 10  # index-adjusted comparable sales summarized per listing
+REPORT_MARKET_YEARS = 3  # recent years behind the comparables and market statistics
+
+# pipeline.py
+PIPELINE_STATE_PATH = 'data/pipeline_state.json'  # input fingerprints of the last successful stage runs
+
 
+# dashboard.py
+BACKGROUND_WORKERS = 8  # shared thread pool for valuation, queries and LLM calls
 
 # chat.py
-OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
-DEFAULT_MODEL = "nex-agi/deepseek-v3.1-nex-n1:free"
\ No newline at end of file
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"  # OPENROUTER_URL in .env overrides (e.g. a local endpoint)
+DEFAULT_MODEL = "nex-agi/deepseek-v3.1-nex-n1:free"
+CHAT_MAX_TOOL_ROUNDS = 3  # model <-> tool round trips per answer before it must reply
+CHAT_TOOL_WORKERS = 4  # tool calls from one reply run concurrently
+CHAT_MAX_PROPERTIES = 10  # properties priced per estimate_prices call
+LLM_FALLBACK_MODELS = ["meta-llama/llama-3.3-70b-instruct:free"]  # tried in order when the requested model is slow or down
+LLM_MAX_CONCURRENCY = 8  # OpenRouter requests in flight across all sessions and models ...
+LLM_FALLBACK_RESERVE = 2  # ... of which one model may not take the last 2, so hedges and fallbacks can always start
+LLM_RATE_PER_SECOND = 2.0  # sustained request rate (token bucket) ...
+LLM_BURST = 5  # ... and the burst allowed on top of it
+LLM_TIMEOUT = 30  # seconds per request
+LLM_HEDGE_AFTER = 8.0  # seconds before a slow request is raced against the next model (None: only on failure)
+LLM_BREAKER_FAILURES = 3  # consecutive failures that open a model's circuit
+LLM_BREAKER_COOLDOWN = 60  # seconds an open circuit skips the model before one trial request
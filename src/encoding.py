@@ -0,0 +1,73 @@
+# src/encoding.py
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+# Key for missing values in the per-category statistics
+_MISSING = '__missing__'
+
+
+class MergeableTargetEncoder:
+    """
+    Target encoder giving the same values as category_encoders.TargetEncoder
+    (sigmoid blend of category mean and prior), but keeping its sufficient
+    statistics: target sum and row count per category, plus the global totals.
+    partial_fit merges new rows into them, so a new quarter updates the encoding
+    without revisiting history; fit on all rows at once gives the same result.
+
+    Unknown categories get the prior; missing values get their own statistics
+    when they occurred in training, the prior otherwise (as category_encoders).
+    """
+
+    def __init__(self, cols: List[str], smoothing: float = 10.0, min_samples_leaf: int = 20):
+        self.cols = list(cols)
+        self.smoothing = smoothing
+        self.min_samples_leaf = min_samples_leaf
+        self.stats_: Dict[str, pd.DataFrame] = {}
+        self.total_ = 0.0
+        self.count_ = 0
+        self.mapping_: Dict[str, pd.Series] = {}
+
+    @property
+    def prior(self) -> float:
+        return self.total_ / self.count_ if self.count_ else np.nan
+
+    def fit(self, X: pd.DataFrame, y) -> "MergeableTargetEncoder":
+        self.stats_, self.total_, self.count_ = {}, 0.0, 0
+        return self.partial_fit(X, y)
+
+    def partial_fit(self, X: pd.DataFrame, y) -> "MergeableTargetEncoder":
+        """Adds rows to the statistics and rebuilds the encodings."""
+        y = np.asarray(y, dtype=float)
+        self.total_ += float(y.sum())
+        self.count_ += len(y)
+        for col in self.cols:
+            if col not in X.columns:
+                continue
+            new = pd.DataFrame({'sum': y, 'count': 1}).groupby(_keys(X[col]).to_numpy()).sum()
+            old = self.stats_.get(col)
+            self.stats_[col] = new if old is None else old.add(new, fill_value=0)
+
+        # Encodings of every category move with the prior, so all are rebuilt (cheap: one row per category)
+        prior = self.prior
+        for col, stats in self.stats_.items():
+            weight = 1 / (1 + np.exp(-(stats['count'] - self.min_samples_leaf) / self.smoothing))
+            self.mapping_[col] = prior * (1 - weight) + stats['sum'] / stats['count'] * weight
+        return self
+
+    def transform(self, X: pd.DataFrame) -> pd.DataFrame:
+        X = X.copy()
+        prior = self.prior
+        for col, mapping in self.mapping_.items():
+            if col in X.columns:
+                X[col] = _keys(X[col]).map(mapping).astype(float).fillna(prior)
+        return X
+
+    def fit_transform(self, X: pd.DataFrame, y) -> pd.DataFrame:
+        return self.fit(X, y).transform(X)
+
+
+def _keys(values: pd.Series) -> pd.Series:
+    values = values.astype(object)
+    return values.where(values.notna(), _MISSING)
@@ -0,0 +1,85 @@
+import hashlib
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+
+from src.features import FEATURE_SOURCES
+from src.inference import (
+    cached_score, load_artifacts, model_columns, prepare_features, resolve_artifacts_path, score_segments
+)
+
+BASELINE_COL = 'Baseline'
+
+
+def explanation_sources(artifacts) -> List[str]:
+    """
+    Raw input names attributions are reported against, in first-seen feature order.
+    """
+    return list(dict.fromkeys(FEATURE_SOURCES.get(f, f) for f in model_columns(artifacts)))
+
+
+@lru_cache(maxsize=16)
+def _source_matrix(features: tuple, sources: tuple) -> np.ndarray:
+    """
+    0/1 matrix summing encoded-column contributions into their raw input.
+    """
+    matrix = np.zeros((len(features), len(sources)))
+    index = {s: i for i, s in enumerate(sources)}
+    for row, feature in enumerate(features):
+        matrix[row, index[FEATURE_SOURCES.get(feature, feature)]] = 1.0
+    return matrix
+
+
+def _contributions(artifacts, X_encoded, sources: tuple) -> np.ndarray:
+    """
+    TreeSHAP contributions (log-price space) from one booster pass,
+    collapsed onto raw inputs, with the bias term as the last column.
+    """
+    booster = artifacts['model'].get_booster()
+    contribs = booster.predict(xgb.DMatrix(X_encoded, enable_categorical=True), pred_contribs=True)
+    matrix = _source_matrix(tuple(X_encoded.columns), sources)
+    return np.column_stack([contribs[:, :-1] @ matrix, contribs[:, -1]])
+
+
+def explain_batch(records, artifacts_path: Optional[str] = None, use_cache: bool = True) -> pd.DataFrame:
+    """
+    Per-row feature attributions for a batch of raw inputs.
+    Returns one column per raw input plus 'Baseline' (log-price units; they sum to the
+    log prediction). Rows already explained by this model version come from the
+    prediction cache; only misses hit the booster.
+    """
+    path = resolve_artifacts_path(artifacts_path)
+    artifacts = load_artifacts(path)
+    sources = tuple(explanation_sources(artifacts))
+    df_processed = prepare_features(records)
+
+    contributions = lambda a, X: _contributions(a, X, sources)
+    if use_cache:
+        # Rows are cached already grouped, so a change to FEATURE_SOURCES needs a new namespace
+        kind = 'explain:' + hashlib.sha1('|'.join(sources).encode()).hexdigest()[:12]
+        out = cached_score(artifacts, path, df_processed, kind, contributions)
+    else:
+        out = score_segments(artifacts, df_processed, contributions)
+
+    return pd.DataFrame(out, columns=list(sources) + [BASELINE_COL])
+
+
+def top_drivers(attribution: pd.Series, k: int = 6) -> Dict[str, float]:
+    """
+    The k inputs that moved the estimate most, as percentage effects vs. the baseline price.
+    """
+    effects = attribution.drop(BASELINE_COL)
+    effects = effects[effects.abs() > 1e-6]
+    top = effects.reindex(effects.abs().sort_values(ascending=False).index[:k])
+    return {name: float(np.expm1(value) * 100) for name, value in top.items()}
+
+
+def explain_prediction(user_input_dict: Dict, artifacts_path: Optional[str] = None, k: int = 6) -> Dict[str, float]:
+    """
+    Top price drivers for a single property, e.g. {'Area': 18.2, 'BuildingYear': -7.5}.
+    """
+    attribution = explain_batch([user_input_dict], artifacts_path).iloc[0]
+    return top_drivers(attribution, k)
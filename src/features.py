@@ -1,5 +1,15 @@
+import os
+from functools import lru_cache
+
+import numpy as np
 import pandas as pd
 
+from src.cleaning_utils import MUNICIPALITY_MAPPING, TOKYO_PREFECTURE
+from src.config import GEO_INDEX_PATH
+from src.price_index import log_levels, period_of
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
 # Define lists here so they are accessible to both Training and Inference
 CAT_COLS_TO_FILL = [
     'Municipality', 'DistrictName', 'Use', 'Structure', 'LandShape', 
@@ -7,6 +17,38 @@ CAT_COLS_TO_FILL = [
     'Classification', 'RoadDirection', 'Remarks'
 ]
 
+# Labels of the municipalities in MUNICIPALITY_MAPPING (all in TOKYO_PREFECTURE)
+TOKYO_MUNICIPALITIES = set(MUNICIPALITY_MAPPING.values())
+
+# Attribution name of PriceIndexLevel: the municipality x type market level, which is
+# neither the sale year nor the place alone, so it is reported as a driver of its own
+MARKET_LEVEL_SOURCE = 'LocalMarketLevel'
+
+# Derived model columns -> the raw input they were computed from.
+# Used to report model attributions in terms of what the user actually entered.
+FEATURE_SOURCES = {
+    'Is_Ward': 'Municipality',
+    'Prefecture': 'Municipality',
+    'BuildingAge': 'BuildingYear',
+    'RoomCount': 'FloorPlan',
+    'Has_L': 'FloorPlan',
+    'Has_D': 'FloorPlan',
+    'Has_K': 'FloorPlan',
+    'Has_S': 'FloorPlan',
+    'Latitude': 'Municipality',
+    'Longitude': 'Municipality',
+    'DistanceToCentreKm': 'Municipality',
+    'StationDistanceToCentreKm': 'NearestStation',
+    'StationAccessibility': 'NearestStation',
+    'PriceIndexLevel': MARKET_LEVEL_SOURCE,
+}
+
+# Numeric location features joined from the bundled geo index (the station ones need station entries)
+GEO_FEATURES = [
+    'Latitude', 'Longitude', 'DistanceToCentreKm',
+    'StationDistanceToCentreKm', 'StationAccessibility'
+]
+
 def add_basic_features(df: pd.DataFrame) -> pd.DataFrame:
     """
     Adds derived features like Ward flags and Building Age.
@@ -23,7 +65,15 @@ def add_basic_features(df: pd.DataFrame) -> pd.DataFrame:
     # In live inference, you might calculate this against the current year.
     if 'TransactionYear' in df.columns and 'BuildingYear' in df.columns:
         df['BuildingAge'] = df['TransactionYear'] - df['BuildingYear']
-        
+
+    # 3. Prefecture
+    # Training rows carry the MLIT label; inference inputs only have a Municipality,
+    # so Tokyo municipalities are labelled here the same way (others stay as given).
+    if 'Municipality' in df.columns:
+        prefecture = df['Prefecture'] if 'Prefecture' in df.columns else pd.Series(np.nan, index=df.index, dtype=object)
+        is_tokyo = df['Municipality'].isin(TOKYO_MUNICIPALITIES)
+        df['Prefecture'] = prefecture.where(prefecture.notna() | ~is_tokyo, TOKYO_PREFECTURE)
+
     return df
 
 def parse_floor_plan(df: pd.DataFrame, col_name: str = 'FloorPlan') -> pd.DataFrame:
@@ -72,4 +122,78 @@ def impute_missing_categoricals(df: pd.DataFrame, cols: list = None) -> pd.DataF
     
     df = df.copy()
     df[target_cols] = df[target_cols].fillna('Unknown')
-    return df
\ No newline at end of file
+    return df
+
+@lru_cache(maxsize=1)
+def load_geo_index(path: str = GEO_INDEX_PATH) -> dict:
+    """
+    Loads the precomputed geo lookup index once per process.
+    Returns {level: DataFrame indexed by key} for 'municipality', 'district' and 'station'.
+    """
+    full_path = path if os.path.isabs(path) else os.path.join(project_root, path)
+    index = pd.read_csv(full_path)
+    return {
+        level: rows.drop(columns='level').set_index('key')
+        for level, rows in index.groupby('level')
+    }
+
+def add_geo_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Joins precomputed coordinates, distance to central Tokyo and station
+    accessibility onto the frame by (Prefecture, Municipality[, DistrictName]).
+    District coordinates are used where the index has them, falling back to the
+    municipality centroid. Unknown places get NaN.
+    The station columns are only added when the index has station entries (the
+    shipped one has municipalities only) and the rows carry a NearestStation, which
+    the current MLIT API does not return; models trained without them ignore them.
+    """
+    index = load_geo_index()
+    df = df.copy()
+    n = len(df)
+    empty = pd.DataFrame(index=range(n), columns=['latitude', 'longitude', 'distance_km', 'accessibility'], dtype=float)
+
+    def lookup(level, keys):
+        table = index.get(level)
+        if table is None or keys is None:
+            return empty
+        return table.reindex(keys.to_numpy()).reset_index(drop=True)
+
+    # Municipality names repeat across prefectures (Tokyo's and Osaka's 'Kita Ward'), so keys carry both
+    muni_keys = None
+    if {'Prefecture', 'Municipality'}.issubset(df.columns):
+        muni_keys = df['Prefecture'].astype(str) + '|' + df['Municipality'].astype(str)
+    muni = lookup('municipality', muni_keys)
+
+    district_keys = None
+    if muni_keys is not None and 'DistrictName' in df.columns:
+        district_keys = muni_keys.astype(str) + '|' + df['DistrictName'].astype(str)
+    district = lookup('district', district_keys)
+
+    station_keys = df['NearestStation'] if 'NearestStation' in df.columns else None
+    station = lookup('station', station_keys)
+
+    df['Latitude'] = district['latitude'].fillna(muni['latitude']).to_numpy(dtype=float)
+    df['Longitude'] = district['longitude'].fillna(muni['longitude']).to_numpy(dtype=float)
+    df['DistanceToCentreKm'] = district['distance_km'].fillna(muni['distance_km']).to_numpy(dtype=float)
+    # Only with stations to look up: all-NaN columns would just be dead model features
+    if 'station' in index and station_keys is not None:
+        df['StationDistanceToCentreKm'] = station['distance_km'].to_numpy(dtype=float)
+        df['StationAccessibility'] = station['accessibility'].to_numpy(dtype=float)
+    return df
+
+def add_price_index_feature(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds PriceIndexLevel: the (prefecture, municipality) x type price index (log price per m²)
+    in the quarter before the transaction, so a row never sees its own quarter's sales.
+    Rows without a TransactionQuarter (live inputs) are treated as Q4, which resolves
+    to the latest indexed quarter for the current year. NaN when no index is built.
+    """
+    df = df.copy()
+    if not {'Prefecture', 'Municipality', 'Type', 'TransactionYear'}.issubset(df.columns):
+        df['PriceIndexLevel'] = np.nan
+        return df
+
+    quarter = df['TransactionQuarter'] if 'TransactionQuarter' in df.columns else pd.Series(4, index=df.index)
+    periods = period_of(df['TransactionYear'].to_numpy(dtype=float), quarter.fillna(4).to_numpy(dtype=float)) - 1
+    df['PriceIndexLevel'] = log_levels(df['Prefecture'], df['Municipality'], df['Type'], periods)
+    return df
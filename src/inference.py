@@ -4,62 +4,188 @@ import joblib
 import os
 import sys
 import logging
+import json
+import hashlib
+from functools import lru_cache
 
 # --- PATH SETUP ---
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if project_root not in sys.path:
     sys.path.append(project_root)
 
-from src.features import add_basic_features, parse_floor_plan, impute_missing_categoricals
+from src.config import MODEL_OUTPUT_PATH, SEGMENT_MODEL_PATH, PREDICTION_CACHE_SIZE, PREDICTION_CACHE_DB
+from src.cache import PredictionCache
+from src.features import (
+    add_basic_features, add_geo_features, add_price_index_feature, parse_floor_plan, impute_missing_categoricals
+)
+from src.routing import route, split_by_segment
+from src.registry import champion_path
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def make_prediction(user_input_dict, artifacts_path='models/tokyo_mass_market_xgb.pkl'):
+_prediction_cache = PredictionCache(
+    PREDICTION_CACHE_SIZE,
+    os.path.join(project_root, PREDICTION_CACHE_DB) if PREDICTION_CACHE_DB else None
+)
+
+def resolve_artifacts_path(artifacts_path=None):
     """
-    Takes a dictionary of raw inputs, processes them, and returns a price prediction.
+    Returns the artifact file to serve: the explicit path if given, else the
+    promoted champion from the model registry, else the segment-routed bundle
+    when it exists, else the single mass market model.
+    """
+    if artifacts_path:
+        return artifacts_path
+
+    champion = champion_path()
+    if champion is not None:
+        return champion
+
+    for candidate in (SEGMENT_MODEL_PATH, MODEL_OUTPUT_PATH):
+        path = os.path.join(project_root, candidate)
+        if os.path.exists(path):
+            return path
+    return os.path.join(project_root, MODEL_OUTPUT_PATH)
+
+@lru_cache(maxsize=4)
+def _load_cached(path, mtime):
+    # mtime is part of the key so a retrained artifact is picked up without a restart
+    return joblib.load(path)
+
+def load_artifacts(artifacts_path=None):
+    """
+    Loads (and memoizes) a model artifact bundle.
+    """
+    path = resolve_artifacts_path(artifacts_path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Model artifacts not found at {path}")
+    return _load_cached(path, os.path.getmtime(path))
+
+_HASH_PRIME = 0x100000001B3  # FNV-1a 64-bit prime
+
+# Latency tiers: 'accurate' serves the tuned model, 'fast' its distilled companion
+TIERS = ('accurate', 'fast')
+
+def input_hash(record):
+    """
+    Stable hash of a raw input dict. Numbers are compared by value (40 == 40.0),
+    so equivalent form submissions share cache entries.
+    """
+    canonical = {
+        k: float(v) if isinstance(v, (int, float, np.number)) and not isinstance(v, bool) else v
+        for k, v in record.items()
+    }
+    payload = json.dumps(canonical, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def row_hashes(df_raw):
+    """
+    Vectorized per-row hashes of a raw input frame (uint64), independent of column
+    order and int/float dtype. Used as batch cache keys.
+    """
+    columns = sorted(df_raw.columns)
+    # Seed with the column set so frames with different inputs never collide
+    salt = int(hashlib.sha1('|'.join(columns).encode('utf-8')).hexdigest()[:16], 16)
+    hashes = np.full(len(df_raw), salt, dtype=np.uint64)
+
+    # Hash column arrays directly (hash_array is seeded, so keys are stable across
+    # processes) and fold them together; NaN/None/pd.NA all hash as missing
+    for col in columns:
+        series = df_raw[col]
+        if pd.api.types.is_numeric_dtype(series):
+            values = series.to_numpy(dtype='float64', na_value=np.nan)
+        else:
+            values = series.to_numpy(dtype=object)
+        hashes = hashes * np.uint64(_HASH_PRIME) ^ pd.util.hash_array(values)
+    return hashes
+
+def model_version(path):
+    """Identifies an artifact file on disk; changes whenever a new model is written or promoted."""
+    return f"{os.path.abspath(path)}:{os.path.getmtime(path)}"
+
+def model_columns(artifacts):
+    """Processed input columns a (possibly routed) artifact bundle reads."""
+    if 'segments' in artifacts:
+        features = [f for seg in artifacts['segments'].values() for f in seg['features']]
+    else:
+        features = list(artifacts['features'])
+    return list(dict.fromkeys(features))
+
+def feature_keys(df_processed, artifacts):
+    """
+    Cache keys from the canonical feature vector the model actually sees: inputs it
+    ignores, key order, int/float and '60'/60 differences all map to the same key.
+    """
+    return row_hashes(align_features(df_processed, model_columns(artifacts)))
+
+def cached_score(artifacts, path, df_processed, kind, score_fn):
+    """
+    score_segments() behind the prediction cache: rows already scored by this model
+    version are served from the cache and only the misses are run through the model.
+    """
+    if not len(df_processed):
+        return np.asarray(score_segments(artifacts, df_processed, score_fn), dtype=float).reshape(0, -1)
+
+    keys = feature_keys(df_processed, artifacts)
+    version = model_version(path)
+    cached = _prediction_cache.get_many(kind, version, keys)
+
+    misses = [i for i, value in enumerate(cached) if value is None]
+    fresh = None
+    if misses:
+        fresh = np.asarray(score_segments(artifacts, df_processed.iloc[misses], score_fn), dtype=float)
+        fresh = fresh.reshape(len(misses), -1)
+        _prediction_cache.put_many(kind, version, keys[misses], fresh)
+
+    width = fresh.shape[1] if fresh is not None else len(cached[0])
+    out = np.empty((len(df_processed), width))
+    for i, value in enumerate(cached):
+        if value is not None:
+            out[i] = value
+    if misses:
+        out[misses] = fresh
+    return out
+
+def prepare_features(records):
+    """
+    Applies the training-time feature engineering to raw inputs
+    (a dict, a list of dicts, or a DataFrame).
     """
-    
-    # 1. Load Artifacts
-    if not os.path.exists(artifacts_path):
-        raise FileNotFoundError(f"Model artifacts not found at {artifacts_path}")
-    
-    artifacts = joblib.load(artifacts_path)
-    model = artifacts['model']
-    encoder = artifacts['encoder']
-    feature_order = artifacts['features']
-    
-    # 2. Convert raw input to DataFrame
-    df_raw = pd.DataFrame([user_input_dict])
-    
-    # 3. Apply Feature Engineering Logic
+    if isinstance(records, pd.DataFrame):
+        df_raw = records.reset_index(drop=True)
+    elif isinstance(records, dict):
+        df_raw = pd.DataFrame([records])
+    else:
+        df_raw = pd.DataFrame(list(records))
+
     try:
         df_processed = add_basic_features(df_raw)
-        
+        df_processed = add_geo_features(df_processed)
+        df_processed = add_price_index_feature(df_processed)
+
         if 'FloorPlan' in df_processed.columns:
             df_processed = parse_floor_plan(df_processed, col_name='FloorPlan')
             df_processed = df_processed.drop(columns=['FloorPlan'], errors='ignore')
-            
+
         df_processed = impute_missing_categoricals(df_processed)
-        
+
     except Exception as e:
         logger.error(f"Error during feature processing: {e}")
         raise
 
-    # 4. ALIGN COLUMNS (Refactored to avoid Dtype Warning)
-    # Initialize with None to force 'object' dtype, avoiding float64 vs string conflicts
-    X_full = pd.DataFrame(index=[0], columns=feature_order).astype(object)
-    
-    # Fill in the columns we have from processing
-    for col in df_processed.columns:
-        if col in X_full.columns:
-            X_full.at[0, col] = df_processed.at[0, col]
-    
-    # Ensure order is exactly as expected by the model
-    X_full = X_full[feature_order]
-
-    # 5. FIX DATA TYPES
+    return df_processed
+
+def align_features(df_processed, feature_order):
+    """
+    Reorders columns to the model's feature list, adding any missing ones as NaN,
+    and converts numeric-like object columns to numbers.
+    """
+    X_full = df_processed.reindex(columns=feature_order)
+
     for col in X_full.columns:
+        if X_full[col].dtype != object:
+            continue
         try:
             # Attempt to convert numeric-like strings/objects to actual floats/ints
             X_full[col] = pd.to_numeric(X_full[col], errors='raise')
@@ -67,22 +193,149 @@ def make_prediction(user_input_dict, artifacts_path='models/tokyo_mass_market_xg
             # Keep as object/string if it's categorical (e.g., Municipality)
             continue
 
-    # 6. Encode Categorical Features
+    return X_full
+
+def categorize(X, categories):
+    """
+    Casts categorical columns to pandas categoricals with the category lists seen at
+    training (unseen values become missing) and every other column to numbers.
+    This is the whole encoding step for models trained with --engine native.
+    """
+    X = X.copy()
+    for col, cats in categories.items():
+        if col in X.columns:
+            X[col] = pd.Categorical(X[col], categories=cats)
+    numeric = [c for c in X.columns if c not in categories]
+    X[numeric] = X[numeric].apply(pd.to_numeric, errors='coerce')
+    return X
+
+def encode_features(df_processed, artifacts):
+    """
+    Aligns and encodes a processed frame for one model's artifacts: target encoding,
+    or categorical dtypes for natively categorical models (no encoder).
+    """
+    X_full = align_features(df_processed, artifacts['features'])
+    if artifacts.get('encoder') is None:
+        return categorize(X_full, artifacts.get('categories', {}))
+
     try:
-        X_encoded = encoder.transform(X_full)
+        X_encoded = artifacts['encoder'].transform(X_full)
     except Exception as e:
         logger.error(f"Error during encoding: {e}")
         raise
 
-    # 7. Final numeric enforcement for XGBoost
     # The encoder outputs numeric values, but we ensure the DataFrame reflects this
-    X_encoded = X_encoded.apply(pd.to_numeric, errors='coerce')
+    return X_encoded.apply(pd.to_numeric, errors='coerce')
+
+def score_segments(artifacts, df_processed, score_fn):
+    """
+    Runs score_fn(model_artifacts, X_encoded) over a processed batch.
+    For segment bundles, rows are routed by the gate and each segment is scored
+    as one vectorized batch; results come back in the original row order.
+    """
+    if 'segments' not in artifacts:
+        return score_fn(artifacts, encode_features(df_processed, artifacts))
+
+    labels = route(df_processed, artifacts['gate'], encode=encode_features)
+    segments = artifacts['segments']
+
+    out = None
+    for name, rows in split_by_segment(labels).items():
+        seg_artifacts = segments.get(name, segments[artifacts['default']])
+        subset = df_processed.iloc[rows]
+        part = np.asarray(score_fn(seg_artifacts, encode_features(subset, seg_artifacts)))
+        if out is None:
+            out = np.empty((len(df_processed),) + part.shape[1:], dtype=float)
+        out[rows] = part
+    return out
+
+def predict_segments(records, artifacts_path=None):
+    """
+    Returns the segment each row would be routed to (None for single-model artifacts).
+    """
+    artifacts = load_artifacts(artifacts_path)
+    df_processed = prepare_features(records)
+    if 'segments' not in artifacts:
+        return np.full(len(df_processed), None, dtype=object)
+    return route(df_processed, artifacts['gate'], encode=encode_features)
 
-    # 8. Predict and Reverse Log Transform
-    log_pred = model.predict(X_encoded)
-    prediction_yen = np.exp(log_pred)[0]
+def tier_models(artifacts, tier='accurate'):
+    """
+    (point model, interval model or None) of one model's artifacts for a latency tier.
+    Artifacts trained before the fast tier existed serve the accurate models.
+    """
+    if tier not in TIERS:
+        raise ValueError(f"Unknown tier '{tier}'; expected one of {TIERS}")
+    if tier == 'fast' and 'fast_model' in artifacts:
+        return artifacts['fast_model'], artifacts.get('fast_interval_model')
+    return artifacts['model'], artifacts.get('interval_model')
 
-    return prediction_yen
+def _cache_kind(kind, tier):
+    return kind if tier == 'accurate' else f"{kind}:{tier}"
+
+def predict_batch(records, artifacts_path=None, use_cache=True, tier='accurate'):
+    """
+    Vectorized price prediction for many properties. Returns an array of yen values.
+    tier='fast' uses the distilled model: a fraction of the cost per row, slightly less accurate.
+    """
+    path = resolve_artifacts_path(artifacts_path)
+    artifacts = load_artifacts(path)
+    df_processed = prepare_features(records)
+
+    # Predict and Reverse Log Transform
+    point = lambda a, X: tier_models(a, tier)[0].predict(X)
+    if use_cache:
+        log_pred = cached_score(artifacts, path, df_processed, _cache_kind('point', tier), point)[:, 0]
+    else:
+        log_pred = score_segments(artifacts, df_processed, point)
+    return np.exp(log_pred)
+
+def _point_and_interval(artifacts, X_encoded, tier='accurate'):
+    """
+    Log-space [point, lower, upper] for one model. Bounds are NaN when the
+    artifact was trained without the quantile booster.
+    """
+    point_model, interval_model = tier_models(artifacts, tier)
+    point = point_model.predict(X_encoded)
+    if interval_model is None:
+        nan = np.full(len(point), np.nan)
+        return np.column_stack([point, nan, nan])
+
+    bounds = interval_model.predict(X_encoded).reshape(len(point), -1)
+    # Quantile boosters are fit independently, so keep the band ordered around the point
+    lower = np.minimum(bounds[:, 0], point)
+    upper = np.maximum(bounds[:, -1], point)
+    return np.column_stack([point, lower, upper])
+
+def score_interval(artifacts, df_processed, tier='accurate'):
+    """
+    Point estimate and P10/P90 range for an already processed frame, in yen.
+    The encoding is shared, so the interval costs one extra booster pass per segment.
+    """
+    log_out = score_segments(artifacts, df_processed, lambda a, X: _point_and_interval(a, X, tier))
+    return pd.DataFrame(np.exp(log_out), columns=['Prediction', 'Lower', 'Upper'])
+
+def predict_with_interval(records, artifacts_path=None, use_cache=True, tier='accurate'):
+    """
+    Vectorized price prediction with a P10-P90 range.
+    Returns a DataFrame with 'Prediction', 'Lower' and 'Upper' columns (yen).
+    """
+    path = resolve_artifacts_path(artifacts_path)
+    artifacts = load_artifacts(path)
+    df_processed = prepare_features(records)
+    if not use_cache:
+        return score_interval(artifacts, df_processed, tier)
+
+    log_out = cached_score(
+        artifacts, path, df_processed, _cache_kind('interval', tier), lambda a, X: _point_and_interval(a, X, tier)
+    )
+    return pd.DataFrame(np.exp(log_out), columns=['Prediction', 'Lower', 'Upper'])
+
+def make_prediction(user_input_dict, artifacts_path=None, tier='accurate'):
+    """
+    Takes a dictionary of raw inputs, processes them, and returns a price prediction.
+    """
+    return float(predict_batch([user_input_dict], artifacts_path, tier=tier)[0])
 
 if __name__ == "__main__":
     # Test Case
@@ -98,10 +351,13 @@ if __name__ == "__main__":
         'Renovation': None,
         'TransactionYear': 2025
     }
-    
+
     try:
         price = make_prediction(test_input)
         print(f"\n✅ Prediction Successful!")
         print(f"Predicted Price: ¥{price:,.0f}")
+
+        band = predict_with_interval(test_input).iloc[0]
+        print(f"P10-P90 Range: ¥{band['Lower']:,.0f} - ¥{band['Upper']:,.0f}")
     except Exception as e:
-        print(f"\n❌ Prediction failed: {e}")
\ No newline at end of file
+        print(f"\n❌ Prediction failed: {e}")
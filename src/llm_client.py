@@ -0,0 +1,278 @@
+# src/llm_client.py
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence
+
+import httpx
+
+from src.config import (
+    LLM_MAX_CONCURRENCY, LLM_FALLBACK_RESERVE, LLM_RATE_PER_SECOND, LLM_BURST, LLM_TIMEOUT, LLM_HEDGE_AFTER,
+    LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN
+)
+
+# Responses that say "this model is unwell right now", as opposed to a bad request
+RETRYABLE_STATUS = {408, 425, 429, 500, 502, 503, 504}
+
+
+class LLMUnavailable(RuntimeError):
+    """Every model failed or has an open circuit."""
+
+
+class RateLimiter:
+    """Token bucket: `rate` requests per second on average, bursts of up to `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class CircuitBreaker:
+    """
+    Per-model breaker. Opens after `failures` consecutive failures, so callers skip
+    the model instead of waiting for its timeout; after `cooldown` seconds one trial
+    request is let through (half-open) and its outcome closes or re-opens it.
+    Only used from the client's event loop thread, so it needs no lock.
+    """
+
+    def __init__(self, failures: int, cooldown: float):
+        self.failures = failures
+        self.cooldown = cooldown
+        self._consecutive = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        return 'half-open' if time.monotonic() - self._opened_at >= self.cooldown else 'open'
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == 'closed':
+            return True
+        if state == 'half-open' and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def cancel_trial(self):
+        """A request that was cancelled (lost a hedge race) says nothing about the model."""
+        self._trial = False
+
+    def record(self, ok: bool):
+        self._trial = False
+        if ok:
+            self._consecutive, self._opened_at = 0, None
+            return
+        self._consecutive += 1
+        if self._opened_at is not None or self._consecutive >= self.failures:
+            self._opened_at = time.monotonic()
+
+
+class LLMClient:
+    """
+    Shared chat-completions client for every dashboard session and batch job.
+
+    Requests run on one background event loop over a pooled httpx.AsyncClient:
+    - at most `max_concurrency` in flight overall and `rate` per second (token bucket);
+      with fallback models, one model may only take `max_concurrency - reserve` of
+      the slots, so a slow model cannot starve its fallback. A request abandoned
+      for a faster model keeps its slot until the upstream call ends, since the
+      upstream is still working on it
+    - identical in-flight payloads are coalesced into one upstream request
+    - a model that has not answered within `hedge_after` seconds, or fails,
+      is raced against / replaced by the next model in `fallback_models`
+    - models that keep failing are skipped by their circuit breaker
+
+    Blocking callers use `complete`; `complete_many` fans a list of payloads out
+    concurrently under the same limits.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        api_key: Optional[str],
+        fallback_models: Sequence[str] = (),
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        reserve: int = LLM_FALLBACK_RESERVE,
+        rate: float = LLM_RATE_PER_SECOND,
+        burst: int = LLM_BURST,
+        timeout: float = LLM_TIMEOUT,
+        hedge_after: Optional[float] = LLM_HEDGE_AFTER,
+    ):
+        self.url = url
+        self.api_key = api_key
+        self.fallback_models = list(fallback_models)
+        self.max_concurrency = max_concurrency
+        self.model_concurrency = max(1, max_concurrency - reserve) if self.fallback_models else max_concurrency
+        self.rate = rate
+        self.burst = burst
+        self.timeout = timeout
+        self.hedge_after = hedge_after
+        self.stats: Counter = Counter()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._slots: Dict[str, asyncio.Semaphore] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._draining: set = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_lock = threading.Lock()
+
+    # --- Event loop ---
+
+    def _get_loop(self) -> asyncio.AbstractEventLoop:
+        with self._loop_lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-client", daemon=True).start()
+                # Loop-bound primitives are created on the loop itself
+                asyncio.run_coroutine_threadsafe(self._setup(), loop).result()
+                self._loop = loop
+            return self._loop
+
+    async def _setup(self):
+        self._limiter = RateLimiter(self.rate, self.burst)
+        self._global_slots = asyncio.Semaphore(self.max_concurrency)
+        self._http = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=self.max_concurrency),
+        )
+
+    def complete(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Blocking: returns the first choice's message for one request."""
+        return asyncio.run_coroutine_threadsafe(self.acomplete(payload), self._get_loop()).result()
+
+    def complete_many(self, payloads: List[Dict[str, Any]]) -> List[Any]:
+        """Blocking: one result per payload, in order; a failed request's entry is its exception."""
+
+        async def gather():
+            return await asyncio.gather(*(self.acomplete(p) for p in payloads), return_exceptions=True)
+
+        return asyncio.run_coroutine_threadsafe(gather(), self._get_loop()).result()
+
+    # --- Request path (event loop thread) ---
+
+    async def acomplete(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Single flight: concurrent identical payloads share one upstream request."""
+        self.stats['calls'] += 1
+        key = hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats['coalesced'] += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._hedged(payload)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._inflight[key]
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        if model not in self._breakers:
+            self._breakers[model] = CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_COOLDOWN)
+        return self._breakers[model]
+
+    async def _hedged(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Primary model first; the next model is started when the running ones pass the
+        hedge deadline or all fail. The first success wins and the others are cancelled.
+        """
+        queue = list(dict.fromkeys([payload['model'], *self.fallback_models]))
+        pending, errors = set(), []
+
+        def launch() -> bool:
+            if not queue:
+                return False
+            pending.add(asyncio.ensure_future(self._request({**payload, 'model': queue.pop(0)})))
+            return True
+
+        launch()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, timeout=self.hedge_after if queue else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    self.stats['hedged'] += launch()
+                    continue
+                for task in done:
+                    pending.discard(task)
+                    if task.exception() is None:
+                        return task.result()
+                    errors.append(str(task.exception()))
+                if not pending:
+                    self.stats['fallback'] += launch()
+        finally:
+            for task in pending:
+                task.cancel()
+                # Referenced until it has drained its upstream call and released its slots
+                self._draining.add(task)
+                task.add_done_callback(self._draining.discard)
+        raise LLMUnavailable("LLM request failed: " + "; ".join(errors))
+
+    async def _request(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        model = payload['model']
+        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+        breaker = self.breaker(model)
+        slots = self._slots.setdefault(model, asyncio.Semaphore(self.model_concurrency))
+        try:
+            async with slots, self._global_slots:
+                # Checked once a slot is free: requests queued behind a dying model skip it
+                if not breaker.allow():
+                    self.stats['skipped_open'] += 1
+                    raise LLMUnavailable(f"{model}: circuit open")
+                await self._limiter.acquire()
+                self.stats['upstream'] += 1
+                post = asyncio.ensure_future(self._http.post(self.url, headers=headers, json=payload))
+                try:
+                    response = await asyncio.shield(post)
+                except asyncio.CancelledError:
+                    # Lost a hedge race: the upstream keeps working on it, so the slots stay taken until it ends
+                    await asyncio.wait([post])
+                    if not post.cancelled():
+                        post.exception()  # retrieved; the outcome no longer matters
+                    raise
+        except httpx.HTTPError as exc:
+            breaker.record(False)
+            raise RuntimeError(f"{model}: {type(exc).__name__} {exc}") from exc
+        except asyncio.CancelledError:
+            breaker.cancel_trial()
+            raise
+
+        if response.status_code >= 400:
+            breaker.record(response.status_code not in RETRYABLE_STATUS)
+            raise RuntimeError(f"{model}: HTTP {response.status_code} {response.text[:200]}")
+        breaker.record(True)
+
+        choices = response.json().get("choices", [])
+        if not choices:
+            raise RuntimeError(f"{model}: no choices returned")
+        return choices[0].get("message", {})
@@ -0,0 +1,302 @@
+# src/price_index.py
+import os
+import threading
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.cleaning_utils import TOKYO_PREFECTURE
+from src.config import PRICE_INDEX_PATH, PRICE_INDEX_CREDIBILITY, PRICE_INDEX_REVISE_QUARTERS
+from src.query import TABLE, find_comparables, query
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Municipality key of the prefecture-wide level per Type (fallback for thin or unknown cells)
+MARKET_KEY = '(all)'
+# Municipality names repeat across prefectures, so cells are keyed by both
+CELL_KEYS = ['Prefecture', 'Municipality', 'Type']
+INDEX_COLUMNS = CELL_KEYS + ['Period', 'Transactions', 'MarketLevel', 'Offset', 'LogLevel']
+
+_cache: Dict[str, Tuple[float, pd.Series, Dict[Tuple[str, str], int]]] = {}
+_lock = threading.Lock()
+
+
+def period_of(year, quarter):
+    """Quarter number (year * 4 + quarter - 1); works on scalars and arrays."""
+    return np.asarray(year) * 4 + np.asarray(quarter) - 1
+
+
+def period_label(period: int) -> str:
+    return f"{period // 4}Q{period % 4 + 1}"
+
+
+def _index_path(path: Optional[str] = None) -> str:
+    path = path or PRICE_INDEX_PATH
+    return path if os.path.isabs(path) else os.path.join(project_root, path)
+
+
+def _quarter_observations(first_period: int, source: Optional[str] = None) -> pd.DataFrame:
+    """
+    Log price per m² of every transaction from `first_period` on. The year filter
+    lets DuckDB skip older TransactionYear partitions entirely.
+    """
+    sql = f"""
+        SELECT "Prefecture", "Municipality", "Type",
+               "TransactionYear" * 4 + "TransactionQuarter" - 1 AS Period,
+               ln("TradePriceYen" / "Area") AS LogPricePerSqm
+        FROM {TABLE}
+        WHERE "TransactionYear" >= ? AND "Area" > 0 AND "TradePriceYen" > 0
+          AND "Prefecture" IS NOT NULL AND "Municipality" IS NOT NULL AND "Type" IS NOT NULL
+    """
+    obs = query(sql, [int(first_period // 4)], source=source)
+    return obs[obs['Period'] >= first_period]
+
+
+def _step(obs: pd.DataFrame, period: int, market: pd.Series, offsets: pd.Series) -> pd.DataFrame:
+    """
+    Index rows for one quarter from that quarter's transactions and the previous state.
+
+    MarketLevel is the median log price per m² per prefecture and Type (carried
+    forward when they have no sales). Each municipality keeps an Offset from it, moved
+    towards the quarter's median deviation with credibility weight
+    n / (n + PRICE_INDEX_CREDIBILITY), so thin cells follow the market instead of
+    jumping with a handful of sales.
+    """
+    by_market = [obs['Prefecture'], obs['Type']]
+    if not obs.empty:
+        market = obs.groupby(by_market)['LogPricePerSqm'].median().combine_first(market)
+    deviation = obs['LogPricePerSqm'] - market.reindex(pd.MultiIndex.from_arrays(by_market)).to_numpy()
+    cells = deviation.groupby([obs[k] for k in CELL_KEYS]).agg(['median', 'size'])
+
+    keys = offsets.index.union(cells.index)
+    previous = offsets.reindex(keys, fill_value=0.0)
+    counts = cells['size'].reindex(keys, fill_value=0)
+    weight = counts / (counts + PRICE_INDEX_CREDIBILITY)
+    offsets = previous + weight * (cells['median'].reindex(keys).fillna(previous) - previous)
+
+    prefectures, types = keys.get_level_values('Prefecture'), keys.get_level_values('Type')
+    rows = pd.DataFrame({
+        'Prefecture': prefectures,
+        'Municipality': keys.get_level_values('Municipality'),
+        'Type': types,
+        'Period': period,
+        'Transactions': counts.to_numpy(),
+        'MarketLevel': market.reindex(pd.MultiIndex.from_arrays([prefectures, types])).to_numpy(),
+        'Offset': offsets.to_numpy(),
+    })
+    market_rows = pd.DataFrame({
+        'Prefecture': market.index.get_level_values('Prefecture'),
+        'Municipality': MARKET_KEY,
+        'Type': market.index.get_level_values('Type'),
+        'Period': period,
+        'Transactions': obs.groupby(by_market).size().reindex(market.index, fill_value=0).to_numpy(),
+        'MarketLevel': market.to_numpy(),
+        'Offset': 0.0,
+    })
+    rows = pd.concat([rows, market_rows], ignore_index=True)
+    rows['LogLevel'] = rows['MarketLevel'] + rows['Offset']
+    return rows
+
+
+def _state(rows: pd.DataFrame) -> Tuple[pd.Series, pd.Series]:
+    """(market levels by (Prefecture, Type), offsets by cell) of one quarter's index rows."""
+    is_market = rows['Municipality'] == MARKET_KEY
+    market = rows[is_market].set_index(['Prefecture', 'Type'])['MarketLevel']
+    offsets = rows[~is_market].set_index(CELL_KEYS)['Offset']
+    return market, offsets
+
+
+def update_price_index(
+    path: Optional[str] = None,
+    source: Optional[str] = None,
+    rebuild: bool = False,
+) -> Tuple[pd.DataFrame, list]:
+    """
+    Extends the stored index with quarters it has not seen yet.
+
+    Only transactions from the first new quarter on are read, and each quarter
+    starts from the stored state of the one before it, so history is never
+    recomputed. The last PRICE_INDEX_REVISE_QUARTERS stored quarters are re-estimated
+    because MLIT keeps adding late-reported sales to the most recent quarter.
+    An index stored before cells were keyed by prefecture is rebuilt.
+    Returns (full index, list of periods written).
+    """
+    path = _index_path(path)
+    index = pd.DataFrame(columns=INDEX_COLUMNS)
+    if not rebuild and os.path.exists(path):
+        stored = pd.read_parquet(path)
+        if 'Prefecture' in stored.columns:
+            index = stored
+
+    if index.empty:
+        first = query(
+            f'SELECT min("TransactionYear" * 4 + "TransactionQuarter" - 1) AS p FROM {TABLE}', source=source
+        )['p'].iloc[0]
+        if pd.isna(first):
+            return index, []
+        start = int(first)
+    else:
+        periods = np.sort(index['Period'].unique())
+        start = int(periods[max(len(periods) - PRICE_INDEX_REVISE_QUARTERS, 0)])
+        index = index[index['Period'] < start]
+
+    obs = _quarter_observations(start, source=source)
+    if obs.empty:
+        return index, []
+
+    # Previous state: last kept quarter's market levels and municipality offsets
+    if index.empty:
+        market = pd.Series(dtype=float, index=pd.MultiIndex.from_arrays([[], []], names=['Prefecture', 'Type']))
+        offsets = pd.Series(dtype=float, index=pd.MultiIndex.from_arrays([[], [], []], names=CELL_KEYS))
+    else:
+        market, offsets = _state(index[index['Period'] == index['Period'].max()])
+
+    by_period = dict(tuple(obs.groupby('Period')))
+    new_rows = []
+    for period in range(start, int(obs['Period'].max()) + 1):
+        rows = _step(by_period.get(period, obs.iloc[:0]), period, market, offsets)
+        market, offsets = _state(rows)
+        new_rows.append(rows)
+
+    new_rows = pd.concat(new_rows, ignore_index=True)
+    index = pd.concat([index, new_rows], ignore_index=True) if not index.empty else new_rows
+    index = index[INDEX_COLUMNS]
+    index['Period'] = index['Period'].astype('int64')
+    index['Transactions'] = index['Transactions'].astype('int64')
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    index.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+    return index, sorted(new_rows['Period'].unique().tolist())
+
+
+def load_price_index(path: Optional[str] = None):
+    """
+    (log levels keyed by (Prefecture, Municipality, Type, Period), latest period keyed
+    by (Prefecture, Municipality, Type)). Reloaded only when the file changes, so a
+    running dashboard picks up new quarters. Returns None when no index has been
+    built, or only one from before cells were keyed by prefecture (rebuilt by clean.py).
+    """
+    path = _index_path(path)
+    try:
+        mtime = os.path.getmtime(path)
+    except FileNotFoundError:
+        return None
+    with _lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1], cached[2]
+    index = pd.read_parquet(path)
+    if 'Prefecture' not in index.columns:
+        return None
+    levels = index.set_index(CELL_KEYS + ['Period'])['LogLevel'].sort_index()
+    latest = index.groupby(CELL_KEYS)['Period'].max()
+    with _lock:
+        _cache[path] = (mtime, levels, latest)
+    return levels, latest
+
+
+def log_levels(
+    prefecture: Sequence,
+    municipality: Sequence,
+    prop_type: Sequence,
+    period: Sequence,
+    path: Optional[str] = None,
+) -> np.ndarray:
+    """
+    Vectorized hash lookup of index levels. Municipalities without their own index
+    use the prefecture-wide level for the Type, and periods past the last indexed
+    quarter use that quarter. NaN where nothing applies (e.g. an unknown prefecture).
+    """
+    loaded = load_price_index(path)
+    n = len(period)
+    if loaded is None or n == 0:
+        return np.full(n, np.nan)
+    levels, latest = loaded
+
+    pref = pd.Series(prefecture, dtype=object).reset_index(drop=True)
+    muni = pd.Series(municipality, dtype=object).reset_index(drop=True)
+    types = pd.Series(prop_type, dtype=object).reset_index(drop=True)
+    has_cell = pd.MultiIndex.from_arrays([pref, muni, types]).isin(latest.index)
+    muni = muni.where(has_cell, MARKET_KEY)
+
+    last = pd.Series(latest.reindex(pd.MultiIndex.from_arrays([pref, muni, types])).fillna(-1).to_numpy())
+    period = pd.Series(np.asarray(period, dtype=float)).clip(upper=last.where(last >= 0))
+    period = period.where(np.isfinite(period))
+
+    keys = pd.MultiIndex.from_arrays([pref, muni, types, period.fillna(-1).astype('int64')])
+    values = levels.reindex(keys).to_numpy(dtype=float)
+    values[period.isna().to_numpy()] = np.nan
+    return values
+
+
+def adjust_comparables(comps: pd.DataFrame, to_period: Optional[int] = None, path: Optional[str] = None) -> pd.DataFrame:
+    """
+    Adds IndexFactor and AdjustedPriceYen: each comparable's price moved from its
+    transaction quarter to `to_period` (default: the latest indexed quarter) along
+    its municipality × type index. Two lookups per row, independent of history length.
+    """
+    comps = comps.copy()
+    periods = period_of(comps['TransactionYear'].to_numpy(), comps['TransactionQuarter'].to_numpy())
+    target = np.full(len(comps), np.inf if to_period is None else to_period)
+    cell = comps['Prefecture'], comps['Municipality'], comps['Type']
+    then = log_levels(*cell, periods, path)
+    now = log_levels(*cell, target, path)
+    comps['IndexFactor'] = np.exp(now - then)
+    comps['AdjustedPriceYen'] = comps['TradePriceYen'] * comps['IndexFactor'].fillna(1.0)
+    return comps
+
+
+def time_adjusted_comparables(
+    municipality: str,
+    floor_plan: Optional[str] = None,
+    prop_type: Optional[str] = None,
+    area: Optional[float] = None,
+    min_year: Optional[int] = None,
+    limit: int = 20,
+    source: Optional[str] = None,
+) -> pd.DataFrame:
+    """src.query.find_comparables with prices projected to the latest indexed quarter."""
+    comps = find_comparables(municipality, floor_plan, prop_type, area, min_year, limit, source)
+    return adjust_comparables(comps)
+
+
+def index_overlay(
+    history: pd.DataFrame, municipality: str, prop_type: Optional[str] = None, prefecture: str = TOKYO_PREFECTURE
+) -> pd.DataFrame:
+    """
+    Adds IndexPriceYen to a yearly median price history (dashboard chart): the
+    municipality's index, averaged per year and scaled to the latest year's median,
+    i.e. what that median would have been worth in each year at market prices.
+    Without a Type the Types' levels are averaged.
+    """
+    history = history.copy()
+    history['IndexPriceYen'] = np.nan
+    loaded = load_price_index()
+    if loaded is None or history.empty:
+        return history
+    levels = loaded[0].reset_index()
+    levels = levels[levels['Prefecture'] == prefecture]
+
+    cells = levels[levels['Municipality'] == municipality]
+    if cells.empty:
+        cells = levels[levels['Municipality'] == MARKET_KEY]
+    if prop_type is not None:
+        cells = cells[cells['Type'] == prop_type]
+    if cells.empty:
+        return history
+
+    yearly = (
+        cells.assign(TransactionYear=cells['Period'] // 4)
+        .groupby(['TransactionYear', 'Period'])['LogLevel'].mean()
+        .groupby('TransactionYear').mean()
+    )
+    years = history['TransactionYear'].astype(int)
+    anchor_year = years.max()
+    if anchor_year not in yearly.index:
+        return history
+    anchor = history.loc[years == anchor_year, 'TradePriceYen'].iloc[0]
+    history['IndexPriceYen'] = anchor * np.exp(yearly.reindex(years).to_numpy() - yearly[anchor_year])
+    return history
@@ -0,0 +1,265 @@
+# src/quality.py
+import json
+import math
+import os
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Columns whose category sets are tracked (only those present are used)
+PROFILE_CATEGORICALS = [
+    'Prefecture', 'Municipality', 'DistrictName', 'NearestStation', 'Type', 'FloorPlan',
+    'Structure', 'Region', 'CityPlanning'
+]
+# Columns where never-seen-before values are a drift signal
+NEW_VALUE_COLS = ['Municipality', 'DistrictName', 'NearestStation']
+PRICE_QUANTILES = [0.1, 0.5, 0.9]
+
+# Drift limits checked before training
+MAX_NULL_RATE_INCREASE = 0.10      # absolute increase in a column's null rate
+MAX_UNSEEN_ROW_SHARE = 0.05        # share of rows carrying a value unseen in the baseline
+MAX_CARDINALITY_CHANGE = 0.5       # relative change in distinct values
+MAX_PRICE_LOG_SHIFT = 0.25         # |log(q_now / q_baseline)| for P10/P50/P90
+MIN_ROW_RATIO = 0.5                # current rows / baseline rows
+
+
+class KLLSketch:
+    """
+    Mergeable streaming quantile sketch (KLL). Memory stays O(k log(n/k))
+    regardless of how many values are added.
+    """
+
+    def __init__(self, k: int = 200, seed: int = 42):
+        self.k = k
+        self.n = 0
+        self.levels: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) >= self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # Keep one item back if odd so weights stay exact
+                keep = items[:1] if len(items) % 2 else items[:0]
+                pairs = items[len(keep):]
+                promoted = pairs[self._rng.integers(0, 2)::2]
+                self.levels[level] = keep
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.n += len(values)
+        # Feed in capacity-sized chunks so level 0 never grows unbounded
+        step = self._capacity(0)
+        for start in range(0, len(values), step):
+            self.levels[0] = np.concatenate([self.levels[0], values[start:start + step]])
+            self._compress()
+
+    def merge(self, other: "KLLSketch"):
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.n += other.n
+        self._compress()
+
+    def quantiles(self, qs) -> List[Optional[float]]:
+        if self.n == 0:
+            return [None for _ in qs]
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(lvl), 2.0 ** i) for i, lvl in enumerate(self.levels)])
+        order = np.argsort(items)
+        items, cum = items[order], np.cumsum(weights[order])
+        return [float(items[min(np.searchsorted(cum, q * cum[-1]), len(items) - 1)]) for q in qs]
+
+    def to_dict(self) -> Dict:
+        return {'k': self.k, 'n': self.n, 'levels': [lvl.tolist() for lvl in self.levels]}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "KLLSketch":
+        sketch = cls(k=data['k'])
+        sketch.n = data['n']
+        sketch.levels = [np.asarray(lvl, dtype=float) for lvl in data['levels']] or [np.empty(0)]
+        return sketch
+
+
+def _as_arrow(batch) -> pa.Table:
+    if isinstance(batch, pd.DataFrame):
+        return pa.Table.from_pandas(batch, preserve_index=False)
+    if isinstance(batch, pa.RecordBatch):
+        return pa.Table.from_batches([batch])
+    return batch
+
+
+class DataProfile:
+    """
+    Streaming data-quality profile: rows, null rates, category counts and a price
+    quantile sketch, accumulated batch by batch and broken down per partition.
+    Empty strings count as nulls (the raw MLIT feed uses '' for missing).
+    """
+
+    def __init__(self, stage: str, price_col: str):
+        self.stage = stage
+        self.price_col = price_col
+        self.rows = 0
+        self.nulls: Counter = Counter()
+        self.categories: Dict[str, Counter] = {}
+        self.price = KLLSketch()
+        self.partitions: Dict[str, Dict] = {}
+
+    def update(self, batch, partition: Optional[str] = None):
+        table = _as_arrow(batch)
+        n = table.num_rows
+        if n == 0:
+            return
+        self.rows += n
+
+        part_nulls = {}
+        for name in table.column_names:
+            col = table.column(name)
+            nulls = col.null_count
+            if pa.types.is_string(col.type) or pa.types.is_large_string(col.type):
+                nulls += pc.sum(pc.equal(col, '')).as_py() or 0
+            self.nulls[name] += nulls
+            part_nulls[name] = nulls
+
+            if name in PROFILE_CATEGORICALS:
+                counts = pc.value_counts(pc.drop_null(col).cast(pa.string()))
+                counter = self.categories.setdefault(name, Counter())
+                for value, count in zip(counts.field('values').to_pylist(), counts.field('counts').to_pylist()):
+                    if value != '':
+                        counter[value] += count
+
+        if self.price_col in table.column_names:
+            prices = pd.to_numeric(table.column(self.price_col).to_pandas(), errors='coerce').to_numpy(dtype=float)
+            self.price.update(prices)
+
+        if partition is not None:
+            part = self.partitions.setdefault(str(partition), {'rows': 0, 'nulls': Counter()})
+            part['rows'] += n
+            part['nulls'].update(part_nulls)
+
+    def merge(self, other: "DataProfile"):
+        """Folds another profile (e.g. one finished partition) into this one."""
+        self.rows += other.rows
+        self.nulls.update(other.nulls)
+        for name, counts in other.categories.items():
+            self.categories.setdefault(name, Counter()).update(counts)
+        self.price.merge(other.price)
+        for key, part in other.partitions.items():
+            mine = self.partitions.setdefault(key, {'rows': 0, 'nulls': Counter()})
+            mine['rows'] += part['rows']
+            mine['nulls'].update(part['nulls'])
+
+    def null_rates(self) -> Dict[str, float]:
+        return {name: count / self.rows for name, count in self.nulls.items()} if self.rows else {}
+
+    def summary(self) -> Dict:
+        """Human-readable headline numbers for logs."""
+        quantiles = self.price.quantiles(PRICE_QUANTILES)
+        return {
+            'rows': self.rows,
+            'cardinality': {name: len(c) for name, c in self.categories.items()},
+            'price_quantiles': dict(zip([f"P{int(q * 100)}" for q in PRICE_QUANTILES], quantiles)),
+        }
+
+    def to_dict(self) -> Dict:
+        return {
+            'stage': self.stage,
+            'price_col': self.price_col,
+            'rows': self.rows,
+            'nulls': dict(self.nulls),
+            'categories': {name: dict(c) for name, c in self.categories.items()},
+            'price_sketch': self.price.to_dict(),
+            'partitions': {k: {'rows': v['rows'], 'nulls': dict(v['nulls'])} for k, v in self.partitions.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "DataProfile":
+        profile = cls(data['stage'], data['price_col'])
+        profile.rows = data['rows']
+        profile.nulls = Counter(data['nulls'])
+        profile.categories = {name: Counter(c) for name, c in data['categories'].items()}
+        profile.price = KLLSketch.from_dict(data['price_sketch'])
+        profile.partitions = {
+            k: {'rows': v['rows'], 'nulls': Counter(v['nulls'])} for k, v in data['partitions'].items()
+        }
+        return profile
+
+    def save(self, path: str):
+        """Writes the profile atomically; an existing file is kept as <name>.prev.json."""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        if os.path.exists(path):
+            os.replace(path, previous_path(path))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["DataProfile"]:
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+def previous_path(path: str) -> str:
+    root, ext = os.path.splitext(path)
+    return f"{root}.prev{ext}"
+
+
+def compare_profiles(current: DataProfile, baseline: DataProfile) -> List[str]:
+    """
+    Returns a list of drift/data-quality problems of `current` relative to `baseline`.
+    An empty list means the data looks consistent with the baseline.
+    """
+    issues = []
+
+    if baseline.rows and current.rows < MIN_ROW_RATIO * baseline.rows:
+        issues.append(f"Row count dropped to {current.rows:,} from {baseline.rows:,}.")
+
+    base_nulls = baseline.null_rates()
+    for name, rate in current.null_rates().items():
+        if name in base_nulls and rate - base_nulls[name] > MAX_NULL_RATE_INCREASE:
+            issues.append(f"Null rate of '{name}' rose to {rate:.1%} from {base_nulls[name]:.1%}.")
+
+    for name, counts in current.categories.items():
+        base_counts = baseline.categories.get(name)
+        if not base_counts:
+            continue
+
+        change = abs(len(counts) - len(base_counts)) / len(base_counts)
+        if change > MAX_CARDINALITY_CHANGE:
+            issues.append(f"Cardinality of '{name}' changed to {len(counts):,} from {len(base_counts):,}.")
+
+        if name in NEW_VALUE_COLS and current.rows:
+            unseen = {v: c for v, c in counts.items() if v not in base_counts}
+            share = sum(unseen.values()) / current.rows
+            if share > MAX_UNSEEN_ROW_SHARE:
+                examples = ", ".join(sorted(unseen, key=unseen.get, reverse=True)[:5])
+                issues.append(f"{share:.1%} of rows have unseen '{name}' values (e.g. {examples}).")
+
+    now_q = current.price.quantiles(PRICE_QUANTILES)
+    base_q = baseline.price.quantiles(PRICE_QUANTILES)
+    for q, now, base in zip(PRICE_QUANTILES, now_q, base_q):
+        if now and base and now > 0 and base > 0 and abs(math.log(now / base)) > MAX_PRICE_LOG_SHIFT:
+            issues.append(f"Price P{int(q * 100)} moved to ¥{now:,.0f} from ¥{base:,.0f}.")
+
+    return issues
@@ -0,0 +1,287 @@
+# src/query.py
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import duckdb
+import pandas as pd
+
+from src.config import CLEAN_DATA_PATH, CLEAN_DATASET_DIR, QUERY_THREADS
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Name of the view every query runs against
+TABLE = "transactions"
+
+_conn: Optional[duckdb.DuckDBPyConnection] = None
+_views: Dict[str, str] = {}  # scan -> view over it, one per source
+_lock = threading.Lock()
+
+
+def _resolve_source(source: Optional[str] = None) -> str:
+    """
+    Picks the Parquet source to scan: an explicit path, else the partitioned
+    store written by scripts/clean.py, else the single cleaned file.
+    """
+    if source is not None:
+        path = Path(source)
+        if not path.is_absolute():
+            path = PROJECT_ROOT / path
+    else:
+        path = PROJECT_ROOT / CLEAN_DATASET_DIR
+        if not path.is_dir():
+            path = PROJECT_ROOT / CLEAN_DATA_PATH
+
+    if not path.exists():
+        raise FileNotFoundError(f"Transaction data not found at {path}. Run scripts/clean.py first.")
+
+    if path.is_dir():
+        # Hive partitions (TransactionYear=2024/...) are pruned by DuckDB on filters
+        return f"read_parquet('{path.as_posix()}/**/*.parquet', hive_partitioning = true)"
+    return f"read_parquet('{path.as_posix()}')"
+
+
+def get_connection(source: Optional[str] = None) -> duckdb.DuckDBPyConnection:
+    """
+    Returns a cursor on the shared in-process DuckDB database with the
+    `transactions` view registered. Cursors are cheap and safe to use per thread.
+
+    Each source gets its own shared view, and `transactions` is a temporary view
+    over it that only this cursor sees, so concurrent queries on different
+    sources cannot read each other's data.
+    """
+    global _conn
+
+    scan = _resolve_source(source)
+    with _lock:
+        if _conn is None:
+            _conn = duckdb.connect(database=":memory:")
+            if QUERY_THREADS:
+                _conn.execute(f"SET threads = {int(QUERY_THREADS)}")
+        view = _views.get(scan)
+        if view is None:
+            # A view only stores the scan, so nothing is loaded into memory here
+            view = f"{TABLE}_{hashlib.sha1(scan.encode()).hexdigest()[:12]}"
+            _conn.execute(f"CREATE OR REPLACE VIEW {view} AS SELECT * FROM {scan}")
+            _views[scan] = view
+        con = _conn.cursor()
+    con.execute(f"CREATE TEMP VIEW {TABLE} AS SELECT * FROM {view}")
+    return con
+
+
+def _quote(col: str) -> str:
+    if not col.isidentifier():
+        raise ValueError(f"Invalid column name: {col!r}")
+    return f'"{col}"'
+
+
+def _build_where(filters: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+    """
+    Turns {'col': value} filters into a parameterized WHERE clause.
+    Lists/tuples become IN (...), None becomes IS NULL.
+    """
+    if not filters:
+        return "", []
+
+    clauses, params = [], []
+    for col, value in filters.items():
+        if value is None:
+            clauses.append(f"{_quote(col)} IS NULL")
+        elif isinstance(value, (list, tuple, set)):
+            values = list(value)
+            if not values:
+                clauses.append("FALSE")
+                continue
+            clauses.append(f"{_quote(col)} IN ({', '.join('?' for _ in values)})")
+            params.extend(values)
+        else:
+            clauses.append(f"{_quote(col)} = ?")
+            params.append(value)
+
+    return "WHERE " + " AND ".join(clauses), params
+
+
+def query(sql: str, params: Optional[Sequence[Any]] = None, source: Optional[str] = None) -> pd.DataFrame:
+    """
+    Runs arbitrary SQL against the `transactions` view and returns a DataFrame.
+    Example: query("SELECT Municipality, median(TradePriceYen) FROM transactions GROUP BY 1")
+    """
+    con = get_connection(source)
+    try:
+        return con.execute(sql, list(params or [])).df()
+    finally:
+        con.close()
+
+
+def price_stats(
+    group_by: Sequence[str],
+    filters: Optional[Dict[str, Any]] = None,
+    min_year: Optional[int] = None,
+    source: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Aggregates transaction counts, price quartiles and median price per m² for each group.
+    Only the grouped/filtered columns are read from disk.
+    """
+    filters = dict(filters or {})
+    where, params = _build_where(filters)
+    if min_year is not None:
+        where = (where + " AND " if where else "WHERE ") + '"TransactionYear" >= ?'
+        params.append(int(min_year))
+
+    keys = ", ".join(_quote(c) for c in group_by)
+    select_keys = f"{keys}, " if keys else ""
+    group_clause = f"GROUP BY {keys} ORDER BY {keys}" if keys else ""
+
+    sql = f"""
+        SELECT {select_keys}
+            count(*) AS Transactions,
+            median("TradePriceYen") AS MedianPriceYen,
+            quantile_cont("TradePriceYen", 0.25) AS P25PriceYen,
+            quantile_cont("TradePriceYen", 0.75) AS P75PriceYen,
+            median("TradePriceYen" / NULLIF("Area", 0)) AS MedianPricePerSqmYen
+        FROM {TABLE}
+        {where}
+        {group_clause}
+    """
+    return query(sql, params, source=source)
+
+
+def median_price_history(municipality: str, floor_plan: Optional[str], source: Optional[str] = None) -> pd.DataFrame:
+    """
+    Median trade price per TransactionYear for one municipality and floor plan (dashboard chart).
+    """
+    stats = price_stats(
+        ["TransactionYear"],
+        filters={"Municipality": municipality, "FloorPlan": floor_plan},
+        source=source,
+    )
+    return stats.rename(columns={"MedianPriceYen": "TradePriceYen"})[["TransactionYear", "TradePriceYen"]]
+
+
+def market_snapshot(
+    municipality: str,
+    floor_plan: Optional[str] = None,
+    years: int = 3,
+    source: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Recent market statistics for a municipality (and floor plan if given), shaped for the chat context.
+    """
+    latest = query(f'SELECT max("TransactionYear") AS y FROM {TABLE}', source=source)["y"].iloc[0]
+    if pd.isna(latest):
+        return {}
+    since = int(latest) - years + 1
+
+    filters: Dict[str, Any] = {"Municipality": municipality}
+    if floor_plan is not None:
+        filters["FloorPlan"] = floor_plan
+
+    stats = price_stats([], filters=filters, min_year=since, source=source)
+    if stats.empty or not stats["Transactions"].iloc[0]:
+        return {}
+
+    row = stats.iloc[0]
+    period = f"{since}-{int(latest)}"
+    return {
+        f"Transactions ({period})": int(row["Transactions"]),
+        f"Median Price ({period})": f"¥{row['MedianPriceYen']:,.0f}",
+        f"Median Price per m² ({period})": f"¥{row['MedianPricePerSqmYen']:,.0f}",
+    }
+
+
+def find_comparables(
+    municipality: str,
+    floor_plan: Optional[str] = None,
+    prop_type: Optional[str] = None,
+    area: Optional[float] = None,
+    min_year: Optional[int] = None,
+    limit: int = 20,
+    source: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Most recent transactions similar to a property, closest in area first within each year.
+    """
+    filters: Dict[str, Any] = {"Municipality": municipality}
+    if floor_plan is not None:
+        filters["FloorPlan"] = floor_plan
+    if prop_type is not None:
+        filters["Type"] = prop_type
+
+    where, params = _build_where(filters)
+    if min_year is not None:
+        where += ' AND "TransactionYear" >= ?'
+        params.append(int(min_year))
+
+    order = '"TransactionYear" DESC, "TransactionQuarter" DESC'
+    if area is not None:
+        order += ', abs("Area" - ?)'
+        params.append(float(area))
+    params.append(int(limit))
+
+    sql = f"""
+        SELECT "Prefecture", "Municipality", "DistrictName", "Type", "FloorPlan", "Area", "BuildingYear",
+               "TransactionYear", "TransactionQuarter", "TradePriceYen"
+        FROM {TABLE}
+        {where}
+        ORDER BY {order}
+        LIMIT ?
+    """
+    return query(sql, params, source=source)
+
+
+def batch_comparables(
+    properties: pd.DataFrame,
+    min_year: Optional[int] = None,
+    limit: int = 20,
+    source: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    find_comparables for many properties in one scan: `properties` is joined to the
+    transactions and ranked per property with a window function. Returns the
+    comparables with a 'Row' column holding the position of their property;
+    properties sharing a place, floor plan, type and area are looked up once.
+    Missing Prefecture/FloorPlan/Type match any, missing Area leaves the order by recency only.
+    """
+    cols = ["Prefecture", "Municipality", "FloorPlan", "Type", "Area"]
+    props = properties.reindex(columns=cols).reset_index(drop=True)
+    props["Area"] = pd.to_numeric(props["Area"], errors="coerce")
+    props["Row"] = range(len(props))
+    keys = props.drop_duplicates(cols).rename(columns={"Row": "Key"})
+
+    where, params = "", []
+    if min_year is not None:
+        where, params = 'WHERE t."TransactionYear" >= ?', [int(min_year)]
+    params.append(int(limit))
+
+    sql = f"""
+        SELECT * FROM (
+            SELECT k."Key", t."Prefecture", t."Municipality", t."DistrictName", t."Type", t."FloorPlan", t."Area",
+                   t."BuildingYear", t."TransactionYear", t."TransactionQuarter", t."TradePriceYen",
+                   row_number() OVER (
+                       PARTITION BY k."Key"
+                       ORDER BY t."TransactionYear" DESC, t."TransactionQuarter" DESC,
+                                abs(t."Area" - k."Area") NULLS LAST
+                   ) AS "Rank"
+            FROM {TABLE} t
+            JOIN _property_keys k
+              ON t."Municipality" = k."Municipality"
+             AND (k."Prefecture" IS NULL OR t."Prefecture" = k."Prefecture")
+             AND (k."FloorPlan" IS NULL OR t."FloorPlan" = k."FloorPlan")
+             AND (k."Type" IS NULL OR t."Type" = k."Type")
+            {where}
+        )
+        WHERE "Rank" <= ?
+    """
+    con = get_connection(source)
+    try:
+        con.register("_property_keys", keys)
+        comps = con.execute(sql, params).df()
+    finally:
+        con.close()
+
+    # Fan the per-key results back out to every property with that key
+    rows = props.merge(keys, on=cols)[["Row", "Key"]]
+    comps = rows.merge(comps, on="Key").drop(columns="Key")
+    return comps.sort_values(["Row", "Rank"]).drop(columns="Rank").reset_index(drop=True)
@@ -0,0 +1,138 @@
+# src/registry.py
+import csv
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from typing import Dict, Optional
+
+import joblib
+import pandas as pd
+
+from src.config import MODEL_REGISTRY_DIR, RUN_HISTORY_PATH
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+CHAMPION_POINTER = 'CHAMPION'   # file inside the registry holding the served version name
+ARTIFACT_NAME = 'model.pkl'
+KEEP_VERSIONS = 5               # non-champion versions kept on disk
+
+
+def registry_dir() -> str:
+    return os.path.join(project_root, MODEL_REGISTRY_DIR)
+
+
+def _atomic_write_text(path: str, text: str):
+    """Write-then-rename so readers see either the old or the new content, never a mix."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def file_fingerprint(path: str, chunk_size: int = 1 << 20) -> Optional[str]:
+    """sha1 of a file's content (None if missing); directories hash every file inside."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha1()
+    files = [path]
+    if os.path.isdir(path):
+        files = sorted(os.path.join(d, f) for d, _, names in os.walk(path) for f in names)
+    for name in files:
+        digest.update(os.path.relpath(name, path).encode())
+        with open(name, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def new_version() -> str:
+    return datetime.now().strftime('%Y%m%d-%H%M%S')
+
+
+def version_path(version: str) -> str:
+    return os.path.join(registry_dir(), version, ARTIFACT_NAME)
+
+
+def publish(artifacts: Dict, version: str) -> str:
+    """
+    Writes a model into its own version directory. Versions are never rewritten,
+    so a dashboard holding an older path keeps reading a complete file.
+    """
+    path = version_path(version)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    joblib.dump(artifacts, tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def champion_version() -> Optional[str]:
+    pointer = os.path.join(registry_dir(), CHAMPION_POINTER)
+    try:
+        with open(pointer, 'r', encoding='utf-8') as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    return version or None
+
+
+def champion_path() -> Optional[str]:
+    """Artifact file of the promoted model, or None before the first promotion."""
+    version = champion_version()
+    if version is None:
+        return None
+    path = version_path(version)
+    return path if os.path.exists(path) else None
+
+
+def promote(version: str):
+    """Points serving at `version` with a single atomic rename of the pointer file."""
+    if not os.path.exists(version_path(version)):
+        raise FileNotFoundError(f"No published model for version {version}")
+    _atomic_write_text(os.path.join(registry_dir(), CHAMPION_POINTER), version + '\n')
+
+
+def prune_versions(keep: int = KEEP_VERSIONS):
+    """Deletes old non-champion versions, keeping the `keep` most recent."""
+    root = registry_dir()
+    if not os.path.isdir(root):
+        return
+    champion = champion_version()
+    versions = sorted(
+        (v for v in os.listdir(root) if os.path.isdir(os.path.join(root, v)) and v != champion),
+        reverse=True
+    )
+    for version in versions[keep:]:
+        shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+
+
+def record_run(row: Dict, path: Optional[str] = None):
+    """
+    Appends one training run to the run registry CSV. If the row brings new columns
+    (e.g. an older history file), the file is rewritten with the union of columns.
+    """
+    path = path or os.path.join(project_root, RUN_HISTORY_PATH)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    header = None
+    if os.path.isfile(path) and os.path.getsize(path) > 0:
+        with open(path, 'r', newline='') as f:
+            header = next(csv.reader(f), None)
+
+    if header is None or set(row) - set(header):
+        history = pd.read_csv(path, dtype=str) if header is not None else pd.DataFrame()
+        history = pd.concat([history, pd.DataFrame([row])], ignore_index=True)
+        tmp = path + '.tmp'
+        history.to_csv(tmp, index=False)
+        os.replace(tmp, path)
+        return
+
+    with open(path, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=header)
+        writer.writerow(row)
+
@@ -0,0 +1,313 @@
+# src/report.py
+import hashlib
+import json
+import os
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.chat import _build_messages
+from src.inference import predict_with_interval
+from src.price_index import adjust_comparables
+from src.query import TABLE, batch_comparables, price_stats, query
+from src.tools import resolve_municipality
+
+# Raw inputs a listing may carry (the dashboard form); all but Municipality are optional
+LISTING_FIELDS = [
+    'Type', 'Region', 'Municipality', 'FloorPlan', 'Area', 'LandShape', 'Frontage', 'TotalFloorArea',
+    'BuildingYear', 'Structure', 'RoadDirection', 'Classification', 'Breadth', 'CoverageRatio',
+    'FloorAreaRatio', 'TransactionYear',
+]
+ID_COLUMN = 'ListingId'
+ERROR_COLUMN = 'ListingError'  # why a listing could not be scored (None when it was)
+
+SUMMARY_PROMPT = (
+    "Write a short valuation note (3-5 sentences) on this listing for an analyst: how the model estimate "
+    "and its P10-P90 range compare with the index-adjusted comparable sales and recent local market prices, "
+    "what is likely driving the difference, and how much confidence the numbers support. Plain prose, no headings."
+)
+
+
+def load_listings(path) -> pd.DataFrame:
+    """
+    Reads listings from Parquet or CSV. Municipality names are resolved to the
+    dataset's labels ('Meguro' -> '目黒区 (Meguro Ward)'), a missing TransactionYear
+    defaults to this year and a missing ListingId to the row number. A listing whose
+    municipality is missing or cannot be resolved gets a ListingError instead of
+    stopping the batch; it stays in the report but is not scored or summarized.
+    """
+    path = Path(path)
+    if path.suffix == '.parquet':
+        listings = pd.read_parquet(path)
+    elif path.suffix == '.csv':
+        listings = pd.read_csv(path)
+    else:
+        raise ValueError(f"Unsupported listings file {path}: use .parquet or .csv")
+    if 'Municipality' not in listings.columns:
+        raise ValueError(f"{path} has no Municipality column")
+
+    listings = listings.reset_index(drop=True)
+    names, errors = {}, {}
+    for name in listings['Municipality'].dropna().unique():
+        try:
+            names[name] = resolve_municipality(name)
+        except ValueError as e:
+            errors[name] = str(e)
+    listings[ERROR_COLUMN] = [
+        'No municipality given' if pd.isna(name) else errors.get(name) for name in listings['Municipality']
+    ]
+    listings['Municipality'] = listings['Municipality'].map(names)
+    if 'TransactionYear' not in listings.columns:
+        listings['TransactionYear'] = date.today().year
+    listings['TransactionYear'] = listings['TransactionYear'].fillna(date.today().year).astype(int)
+    if ID_COLUMN not in listings.columns:
+        listings.insert(0, ID_COLUMN, np.arange(1, len(listings) + 1))
+    return listings
+
+
+def _loaded(listings: pd.DataFrame) -> pd.Series:
+    """Listings without a ListingError."""
+    if ERROR_COLUMN not in listings.columns:
+        return pd.Series(True, index=listings.index)
+    return listings[ERROR_COLUMN].isna()
+
+
+def score_listings(listings: pd.DataFrame, tier: str = 'accurate') -> pd.DataFrame:
+    """Point estimate and P10-P90 range for every loaded listing in one vectorized call (NaN for the rest)."""
+    scores = pd.DataFrame(np.nan, index=listings.index, columns=['EstimateYen', 'P10Yen', 'P90Yen'])
+    loaded = _loaded(listings)
+    if not loaded.any():
+        return scores
+    fields = [c for c in LISTING_FIELDS if c in listings.columns]
+    bands = predict_with_interval(listings.loc[loaded, fields], tier=tier)
+    scores.loc[loaded, 'EstimateYen'] = bands['Prediction'].round(-4).to_numpy()
+    scores.loc[loaded, 'P10Yen'] = bands['Lower'].round(-4).to_numpy()
+    scores.loc[loaded, 'P90Yen'] = bands['Upper'].round(-4).to_numpy()
+    return scores
+
+
+def market_context(
+    listings: pd.DataFrame, comparables: int = 20, years: int = 3, source: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    Per listing: its index-adjusted comparable sales summarized (count, median and
+    quartiles of AdjustedPriceYen) and the municipality's recent market statistics
+    for its floor plan (the dashboard's market snapshot), falling back to the whole
+    municipality. Three queries for the whole batch, however many listings.
+    """
+    out = pd.DataFrame(index=listings.index)
+    latest = query(f'SELECT max("TransactionYear") AS y FROM {TABLE}', source=source)['y'].iloc[0]
+    if pd.isna(latest):
+        return out
+    since = int(latest) - years + 1
+
+    comps = batch_comparables(listings, min_year=since, limit=comparables, source=source)
+    comps = adjust_comparables(comps)
+    adjusted = comps.groupby('Row')['AdjustedPriceYen']
+    out['Comparables'] = adjusted.size().reindex(out.index, fill_value=0)
+    out['CompMedianYen'] = adjusted.median().reindex(out.index).round(-4)
+    out['CompP25Yen'] = adjusted.quantile(0.25).reindex(out.index).round(-4)
+    out['CompP75Yen'] = adjusted.quantile(0.75).reindex(out.index).round(-4)
+
+    municipalities = {'Municipality': list(listings['Municipality'].dropna().unique())}
+    by_plan = price_stats(['Municipality', 'FloorPlan'], filters=municipalities, min_year=since, source=source)
+    by_ward = price_stats(['Municipality'], filters=municipalities, min_year=since, source=source)
+    # Object keys: a missing or all-empty FloorPlan column would otherwise be float64
+    keys = listings.reindex(columns=['Municipality', 'FloorPlan']).astype(object)
+    # Without a floor plan a listing gets the whole municipality, not the sales that have none
+    by_plan = by_plan.dropna(subset=['FloorPlan'])
+    stats = keys.merge(by_plan, on=['Municipality', 'FloorPlan'], how='left')
+    stats = stats.fillna(keys[['Municipality']].merge(by_ward, on='Municipality', how='left'))
+
+    out['MarketPeriod'] = f"{since}-{int(latest)}"
+    out['MarketTransactions'] = stats['Transactions'].fillna(0).astype(int).to_numpy()
+    out['MarketMedianYen'] = stats['MedianPriceYen'].round(-4).to_numpy()
+    out['MarketMedianPerSqmYen'] = stats['MedianPricePerSqmYen'].round(-2).to_numpy()
+    return out
+
+
+def _yen(value) -> Optional[str]:
+    return None if value is None or pd.isna(value) else f"¥{value:,.0f}"
+
+
+def listing_context(row: pd.Series) -> Dict[str, Any]:
+    """The property context sent to the model: listing inputs plus the numbers to comment on."""
+    context = {k: row[k] for k in LISTING_FIELDS if k in row.index and not pd.isna(row[k])}
+    context['Model estimate'] = _yen(row['EstimateYen'])
+    if not pd.isna(row['P10Yen']):
+        context['Estimate range (P10-P90)'] = f"{_yen(row['P10Yen'])} - {_yen(row['P90Yen'])}"
+    if row.get('Comparables'):
+        context['Comparable sales (adjusted to today)'] = (
+            f"{int(row['Comparables'])} sales, median {_yen(row['CompMedianYen'])}, "
+            f"P25-P75 {_yen(row['CompP25Yen'])} - {_yen(row['CompP75Yen'])}"
+        )
+    if row.get('MarketTransactions'):
+        period = row['MarketPeriod']
+        context[f"Transactions ({period})"] = int(row['MarketTransactions'])
+        context[f"Median Price ({period})"] = _yen(row['MarketMedianYen'])
+        context[f"Median Price per m² ({period})"] = _yen(row['MarketMedianPerSqmYen'])
+    return context
+
+
+def summary_payload(row: pd.Series, model: str, max_tokens: int = 300) -> Dict[str, Any]:
+    messages = _build_messages([{'role': 'user', 'content': SUMMARY_PROMPT}], listing_context(row))
+    return {'model': model, 'messages': messages, 'temperature': 0.2, 'max_tokens': max_tokens}
+
+
+def payload_key(payload: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class SummaryCache:
+    """
+    Append-only JSONL of {key: payload hash, summary}. Every answer is written as
+    soon as its chunk finishes, so an interrupted run resumes where it stopped, and
+    a rerun only calls the model for listings whose inputs or numbers changed.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._summaries: Dict[str, str] = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # a line cut short by an interrupted run
+                    self._summaries[entry['key']] = entry['summary']
+
+    def __len__(self):
+        return len(self._summaries)
+
+    def get(self, key: str) -> Optional[str]:
+        return self._summaries.get(key)
+
+    def put_many(self, entries: Dict[str, str]):
+        self._summaries.update(entries)
+        if not self.path or not entries:
+            return
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for key, summary in entries.items():
+                f.write(json.dumps({'key': key, 'summary': summary}, ensure_ascii=False) + '\n')
+
+
+def summarize(
+    chunk: pd.DataFrame, client, cache: SummaryCache, model: str, max_tokens: int = 300
+) -> Tuple[pd.DataFrame, int]:
+    """
+    Adds Summary / SummaryError to a chunk of scored listings. Cached summaries are
+    reused; the rest go to `client.complete_many` together, so they run concurrently
+    under the client's limits. Failures are recorded, not cached, and retried on the
+    next run. Returns the chunk and the number of model calls made.
+    """
+    # Listings that could not be scored have nothing to summarize
+    requests = [
+        summary_payload(row, model, max_tokens) if loaded else None
+        for (_, row), loaded in zip(chunk.iterrows(), _loaded(chunk))
+    ]
+    keys = [None if p is None else payload_key(p) for p in requests]
+    # Duplicate listings in a chunk share one call
+    payloads = {k: p for k, p in zip(keys, requests) if k is not None and cache.get(k) is None}
+
+    errors: Dict[str, str] = {}
+    fresh: Dict[str, str] = {}
+    if payloads:
+        for key, result in zip(payloads, client.complete_many(list(payloads.values()))):
+            content = None if isinstance(result, Exception) else (result.get('content') or '').strip()
+            if content:
+                fresh[key] = content
+            else:
+                errors[key] = str(result) if isinstance(result, Exception) else 'empty response'
+        cache.put_many(fresh)
+
+    chunk = chunk.copy()
+    chunk['Summary'] = [cache.get(k) for k in keys]
+    chunk['SummaryError'] = [errors.get(k) for k in keys]
+    return chunk, len(payloads)
+
+
+def to_markdown(chunk: pd.DataFrame) -> str:
+    """One section per listing: headline numbers, then the note."""
+    sections = []
+    for _, row in chunk.iterrows():
+        title = ', '.join(str(row[k]) for k in ('Municipality', 'FloorPlan', 'Type') if k in row.index and not pd.isna(row[k]))
+        area = f", {row['Area']:g} m²" if 'Area' in row.index and not pd.isna(row['Area']) else ''
+        lines = [f"## {row[ID_COLUMN]}: {title}{area}", ""]
+        if row.get(ERROR_COLUMN):
+            sections.append("\n".join(lines + [f"_Not scored: {row[ERROR_COLUMN]}_"]) + "\n")
+            continue
+        lines.append(f"- Estimate: {_yen(row['EstimateYen'])}")
+        if not pd.isna(row['P10Yen']):
+            lines.append(f"- Range (P10-P90): {_yen(row['P10Yen'])} - {_yen(row['P90Yen'])}")
+        if row.get('Comparables'):
+            lines.append(f"- Comparables: {int(row['Comparables'])}, adjusted median {_yen(row['CompMedianYen'])}")
+        if row.get('MarketTransactions'):
+            lines.append(
+                f"- Market {row['MarketPeriod']}: {int(row['MarketTransactions'])} sales, "
+                f"median {_yen(row['MarketMedianYen'])}"
+            )
+        lines.append("")
+        if row.get('Summary'):
+            lines.append(row['Summary'])
+        elif row.get('SummaryError'):
+            lines.append(f"_No summary: {row['SummaryError']}_")
+        sections.append("\n".join(lines) + "\n")
+    return "\n".join(sections)
+
+
+class ReportWriter:
+    """Streams report chunks to Parquet (one row group each) or Markdown as they complete."""
+
+    def __init__(self, path, template: pd.DataFrame, title: Optional[str] = None):
+        self.path = Path(path)
+        if self.path.suffix not in ('.parquet', '.md'):
+            raise ValueError(f"Unsupported report file {self.path}: use .parquet or .md")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp = self.path.with_name(self.path.name + '.tmp')
+        self._writer: Optional[pq.ParquetWriter] = None
+        self._md = None
+        if self.path.suffix == '.md':
+            self._md = open(self._tmp, 'w', encoding='utf-8')
+            if title:
+                self._md.write(f"# {title}\n\n")
+        else:
+            # Typed from the whole report, so a chunk whose text columns are all empty cannot narrow them
+            self._schema = pa.Table.from_pandas(
+                template.assign(Summary='', SummaryError=''), preserve_index=False
+            ).schema
+            self._writer = pq.ParquetWriter(self._tmp, self._schema)
+
+    def write(self, chunk: pd.DataFrame):
+        if self._md is not None:
+            self._md.write(to_markdown(chunk) + "\n")
+            self._md.flush()
+        else:
+            self._writer.write_table(pa.Table.from_pandas(chunk, schema=self._schema, preserve_index=False))
+
+    def close(self):
+        """Moves the finished report into place; an interrupted run leaves the previous report untouched."""
+        if self._md is not None:
+            self._md.close()
+        else:
+            self._writer.close()
+        os.replace(self._tmp, self.path)
+
+    def __enter__(self) -> "ReportWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+            return
+        if self._md is not None:
+            self._md.close()
+        else:
+            self._writer.close()
+        self._tmp.unlink(missing_ok=True)
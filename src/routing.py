@@ -0,0 +1,79 @@
+import pandas as pd
+import numpy as np
+
+# Price split used by the mass market / luxury scheme (matches the notebook's ¥200M cut)
+LUXURY_THRESHOLD = 200000000
+
+# Segment names per scheme. The first entry is the fallback route.
+SEGMENT_SCHEMES = {
+    'price': ['mass_market', 'luxury'],
+    'type': ['condo', 'land_building'],
+}
+
+TYPE_ROUTES = {
+    'Pre-owned Condominiums, etc.': 'condo',
+    'Residential Land(Land and Building)': 'land_building',
+}
+
+def assign_segments(df: pd.DataFrame, scheme: str, threshold: int = LUXURY_THRESHOLD) -> pd.Series:
+    """
+    Labels training rows with their segment. Uses the observed price for the
+    'price' scheme, so it is only valid where TradePriceYen is known.
+    """
+    if scheme == 'price':
+        labels = np.where(df['TradePriceYen'] >= threshold, 'luxury', 'mass_market')
+    elif scheme == 'type':
+        labels = df['Type'].map(TYPE_ROUTES).fillna(SEGMENT_SCHEMES['type'][0]).to_numpy()
+    else:
+        raise ValueError(f"Unknown segment scheme: {scheme}")
+    return pd.Series(labels, index=df.index, name='Segment')
+
+def build_column_gate(column: str, routes: dict, default: str) -> dict:
+    """
+    Gate that routes on a raw input column (e.g. 'Type'). Costs a single dict lookup per row.
+    """
+    return {'type': 'column', 'column': column, 'routes': routes, 'default': default}
+
+def build_classifier_gate(
+    model, encoder, features: list, labels: tuple, cutoff: float = 0.5, categories: dict = None
+) -> dict:
+    """
+    Gate backed by a small binary classifier (labels = (negative, positive)).
+    Used when the routing key (e.g. price band) is not an input feature.
+    `categories` replaces the encoder for natively categorical classifiers.
+    """
+    gate = {
+        'type': 'classifier', 'model': model, 'encoder': encoder,
+        'features': features, 'labels': labels, 'cutoff': cutoff
+    }
+    if categories is not None:
+        gate['categories'] = categories
+    return gate
+
+def route(df_processed: pd.DataFrame, gate: dict, encode=None) -> np.ndarray:
+    """
+    Returns the segment name for every row of an already feature-engineered frame.
+    `encode(X, artifacts)` is supplied by the caller for classifier gates.
+    """
+    if gate['type'] == 'column':
+        col = gate['column']
+        if col not in df_processed.columns:
+            return np.full(len(df_processed), gate['default'], dtype=object)
+        return df_processed[col].map(gate['routes']).fillna(gate['default']).to_numpy(dtype=object)
+
+    if gate['type'] == 'classifier':
+        X = encode(df_processed, gate)
+        proba = gate['model'].predict_proba(X)[:, 1]
+        negative, positive = gate['labels']
+        return np.where(proba >= gate['cutoff'], positive, negative).astype(object)
+
+    raise ValueError(f"Unknown gate type: {gate['type']}")
+
+def split_by_segment(labels: np.ndarray) -> dict:
+    """
+    Groups row positions by segment so each segment is scored in one vectorized call.
+    """
+    codes, uniques = pd.factorize(labels)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+    return {uniques[i]: order[bounds[i]:bounds[i + 1]] for i in range(len(uniques))}
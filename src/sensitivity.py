@@ -0,0 +1,140 @@
+import os
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.inference import input_hash, load_artifacts, prepare_features, resolve_artifacts_path, score_interval
+
+# Variations evaluated around the current property
+AREA_STEPS = [-0.3, -0.2, -0.1, 0.0, 0.1, 0.2, 0.3]  # relative to the input area
+BUILDING_YEAR_STEPS = [-20, -15, -10, -5, 0, 5, 10]  # years, clipped to [MIN_BUILDING_YEAR, TransactionYear]
+FLOOR_PLAN_NEIGHBOURS = 2  # plans on each side in the ordered floor plan list
+YEARS_AHEAD = 3  # extra transaction years after the input one
+
+MIN_BUILDING_YEAR = 1945
+GRID_AXES = ['Area', 'BuildingYear', 'FloorPlan', 'TransactionYear']
+
+_CACHE_SIZE = 128
+_cache: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _axis_values(user_input: Dict, floor_plan_order: Optional[List]) -> Dict[str, list]:
+    """
+    Builds the values of each grid axis around the input property.
+    """
+    area = float(user_input['Area'])
+    areas = sorted({round(area * (1 + step), 1) for step in AREA_STEPS if area * (1 + step) > 0})
+
+    year = int(user_input['TransactionYear'])
+    years = list(range(year, year + YEARS_AHEAD + 1))
+
+    building_year = int(user_input['BuildingYear'])
+    building_years = sorted({
+        int(np.clip(building_year + step, MIN_BUILDING_YEAR, year)) for step in BUILDING_YEAR_STEPS
+    })
+
+    floor_plan = user_input.get('FloorPlan')
+    plans = [floor_plan]
+    if floor_plan_order and floor_plan in floor_plan_order:
+        candidates = [p for p in floor_plan_order if p is not None]
+        if floor_plan in candidates:
+            i = candidates.index(floor_plan)
+            plans = candidates[max(0, i - FLOOR_PLAN_NEIGHBOURS): i + FLOOR_PLAN_NEIGHBOURS + 1]
+
+    return {'Area': areas, 'BuildingYear': building_years, 'FloorPlan': plans, 'TransactionYear': years}
+
+
+def build_grid(user_input: Dict, floor_plan_order: Optional[List] = None) -> pd.DataFrame:
+    """
+    Cartesian product of the axis values, one raw input row per combination.
+    """
+    axes = _axis_values(user_input, floor_plan_order)
+    combos = pd.DataFrame(list(itertools.product(*axes.values())), columns=list(axes))
+
+    base = {k: v for k, v in user_input.items() if k not in GRID_AXES}
+    for key, value in base.items():
+        combos[key] = value
+    return combos
+
+
+def valuation_grid(
+    user_input: Dict,
+    floor_plan_order: Optional[List] = None,
+    artifacts_path: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    Prices every variation of the property in one vectorized batch and caches the
+    surface per input hash and model file, so slider moves are pure lookups.
+    Returns the grid axes plus 'Prediction', 'Lower' and 'Upper' (yen).
+    """
+    path = resolve_artifacts_path(artifacts_path)
+    key = input_hash({
+        **user_input,
+        '__plans__': list(floor_plan_order or []),
+        '__model__': f"{path}:{os.path.getmtime(path) if os.path.exists(path) else 0}",
+    })
+
+    with _lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    grid = build_grid(user_input, floor_plan_order)
+    artifacts = load_artifacts(path)
+    prices = score_interval(artifacts, prepare_features(grid))
+    surface = pd.concat([grid[GRID_AXES].reset_index(drop=True), prices], axis=1)
+
+    with _lock:
+        _cache[key] = surface
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+    return surface
+
+
+def nearest_value(values, target):
+    """
+    Snaps a requested value to the closest grid value (floor plans must match exactly).
+    """
+    values = list(values)
+    if not values or target in values:
+        return target
+    try:
+        return min(values, key=lambda v: abs(v - target))
+    except TypeError:
+        return target
+
+
+def _match(column: pd.Series, value) -> np.ndarray:
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return column.isna().to_numpy()
+    value = nearest_value(column.dropna().unique(), value)
+    return (column == value).to_numpy()
+
+
+def slice_grid(surface: pd.DataFrame, vary: str, **fixed) -> pd.DataFrame:
+    """
+    One curve through the surface, e.g. price vs. Area with the other axes held at `fixed`.
+    """
+    mask = np.ones(len(surface), dtype=bool)
+    for axis, value in fixed.items():
+        if axis == vary:
+            continue
+        mask &= _match(surface[axis], value)
+    return surface[mask].sort_values(vary).reset_index(drop=True)
+
+
+def lookup(surface: pd.DataFrame, **selection) -> Optional[pd.Series]:
+    """
+    The grid point for one combination of axis values, or None if it is not on the grid.
+    """
+    mask = np.ones(len(surface), dtype=bool)
+    for axis, value in selection.items():
+        mask &= _match(surface[axis], value)
+    if not mask.any():
+        return None
+    return surface[mask].iloc[0]
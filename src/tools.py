@@ -0,0 +1,240 @@
+# src/tools.py
+import copy
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.config import CHAT_TOOL_WORKERS, CHAT_MAX_PROPERTIES
+from src.cleaning_utils import MUNICIPALITY_MAPPING
+from src.inference import predict_with_interval
+from src.price_index import time_adjusted_comparables
+from src.query import price_stats
+
+# Inputs the advisor may change when pricing a variation of the current property
+PROPERTY_FIELDS = {
+    'Municipality': {'type': 'string', 'description': "Ward/city, e.g. 'Meguro' or '目黒区 (Meguro Ward)'."},
+    'FloorPlan': {'type': 'string', 'description': "Layout such as '1LDK', '2LDK+S', '3DK'."},
+    'Area': {'type': 'number', 'description': 'Area in m².'},
+    'BuildingYear': {'type': 'integer', 'description': 'Construction year.'},
+    'Type': {
+        'type': 'string',
+        'enum': ['Pre-owned Condominiums, etc.', 'Residential Land(Land and Building)'],
+    },
+    'TransactionYear': {'type': 'integer', 'description': 'Sale year (defaults to the current one).'},
+}
+STAT_GROUPS = ['TransactionYear', 'FloorPlan', 'Type', 'Municipality']
+
+# OpenAI-style function schemas sent to OpenRouter
+TOOL_SCHEMAS = [
+    {
+        'type': 'function',
+        'function': {
+            'name': 'estimate_prices',
+            'description': (
+                "Model price estimates (with P10-P90 range) for one or more properties. Any field left out "
+                "is taken from the property the user is currently looking at."
+            ),
+            'parameters': {
+                'type': 'object',
+                'properties': {
+                    'properties': {
+                        'type': 'array', 'maxItems': CHAT_MAX_PROPERTIES,
+                        'items': {'type': 'object', 'properties': PROPERTY_FIELDS},
+                    },
+                },
+                'required': ['properties'],
+            },
+        },
+    },
+    {
+        'type': 'function',
+        'function': {
+            'name': 'find_comparables',
+            'description': (
+                "Most recent similar transactions in a municipality, with prices also adjusted to today "
+                "by the local price index."
+            ),
+            'parameters': {
+                'type': 'object',
+                'properties': {
+                    'municipality': PROPERTY_FIELDS['Municipality'],
+                    'floor_plan': PROPERTY_FIELDS['FloorPlan'],
+                    'type': PROPERTY_FIELDS['Type'],
+                    'area': PROPERTY_FIELDS['Area'],
+                    'limit': {'type': 'integer', 'minimum': 1, 'maximum': 20},
+                },
+                'required': ['municipality'],
+            },
+        },
+    },
+    {
+        'type': 'function',
+        'function': {
+            'name': 'price_statistics',
+            'description': "Transaction counts, median/quartile prices and median price per m², optionally grouped.",
+            'parameters': {
+                'type': 'object',
+                'properties': {
+                    'municipality': PROPERTY_FIELDS['Municipality'],
+                    'floor_plan': PROPERTY_FIELDS['FloorPlan'],
+                    'type': PROPERTY_FIELDS['Type'],
+                    'group_by': {'type': 'string', 'enum': STAT_GROUPS},
+                    'min_year': {'type': 'integer'},
+                },
+            },
+        },
+    },
+]
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    Separate from src.background's pool: chat completions run on that pool and
+    wait for their tool calls, so sharing it could starve them.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=CHAT_TOOL_WORKERS, thread_name_prefix="advisor-tool")
+        return _executor
+
+
+def resolve_municipality(name: Optional[str]) -> Optional[str]:
+    """Maps 'meguro', 'Meguro Ward' or '目黒区' to the dataset's '目黒区 (Meguro Ward)'."""
+    if not name:
+        return None
+    name = name.strip()
+    names = list(MUNICIPALITY_MAPPING.values())
+    if name in names:
+        return name
+    needle = name.lower()
+    for english, display in MUNICIPALITY_MAPPING.items():
+        if english.lower() == needle or english.lower().split()[0] == needle.split()[0] or display.startswith(name):
+            return display
+    raise ValueError(f"Unknown municipality '{name}'. Use a Tokyo ward or city name such as 'Meguro'.")
+
+
+def _records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """JSON-safe rows with NaN as null and numbers rounded for the prompt."""
+    df = df.round(2).astype(object).where(df.notna(), None)
+    return df.to_dict(orient='records')
+
+
+class AdvisorTools:
+    """
+    Local tools the advisor model can call, bound to one conversation.
+    Results are cached per conversation by tool name and normalized arguments,
+    so repeated questions ("and the 2LDK again?") cost nothing.
+    """
+
+    def __init__(self, base_property: Optional[Dict] = None):
+        self.base_property = dict(base_property or {})
+        self._results: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._handlers: Dict[str, Callable[[Dict], Any]] = {
+            'estimate_prices': self.estimate_prices,
+            'find_comparables': self.find_comparables,
+            'price_statistics': self.price_statistics,
+        }
+
+    @property
+    def schemas(self) -> List[Dict]:
+        return TOOL_SCHEMAS
+
+    def bound_to(self, base_property: Dict) -> "AdvisorTools":
+        """Same conversation cache, with missing property fields taken from `base_property`."""
+        tools = copy.copy(self)
+        tools.base_property = dict(base_property)
+        tools._handlers = {name: getattr(tools, name) for name in self._handlers}
+        return tools
+
+    # --- Tools ---
+
+    def _property(self, overrides: Dict) -> Dict:
+        prop = {**self.base_property, **{k: v for k, v in overrides.items() if k in PROPERTY_FIELDS}}
+        if 'Municipality' in overrides:
+            prop['Municipality'] = resolve_municipality(overrides['Municipality'])
+        return prop
+
+    def estimate_prices(self, args: Dict) -> Any:
+        properties = [self._property(p) for p in args.get('properties', [])[:CHAT_MAX_PROPERTIES]]
+        if not properties:
+            return {'error': 'No properties given.'}
+        # One vectorized call for every requested variation
+        bands = predict_with_interval(properties)
+        out = []
+        for prop, (_, band) in zip(properties, bands.iterrows()):
+            row = {k: prop.get(k) for k in PROPERTY_FIELDS}
+            row['EstimateYen'] = round(float(band['Prediction']), -4)
+            if not np.isnan(band['Lower']):
+                row['P10Yen'] = round(float(band['Lower']), -4)
+                row['P90Yen'] = round(float(band['Upper']), -4)
+            out.append(row)
+        return out
+
+    def find_comparables(self, args: Dict) -> Any:
+        comps = time_adjusted_comparables(
+            resolve_municipality(args['municipality']),
+            floor_plan=args.get('floor_plan'),
+            prop_type=args.get('type'),
+            area=args.get('area'),
+            limit=min(int(args.get('limit', 10)), 20),
+        )
+        return _records(comps.drop(columns=['Prefecture', 'Municipality'], errors='ignore'))
+
+    def price_statistics(self, args: Dict) -> Any:
+        filters = {
+            'Municipality': resolve_municipality(args.get('municipality')),
+            'FloorPlan': args.get('floor_plan'),
+            'Type': args.get('type'),
+        }
+        group_by = [args['group_by']] if args.get('group_by') in STAT_GROUPS else []
+        stats = price_stats(
+            group_by, filters={k: v for k, v in filters.items() if v is not None}, min_year=args.get('min_year')
+        )
+        return _records(stats)
+
+    # --- Dispatch ---
+
+    def call(self, name: str, arguments: str) -> str:
+        """Runs one tool call and returns its JSON result; errors are returned to the model, not raised."""
+        try:
+            args = json.loads(arguments or '{}')
+            handler = self._handlers[name]
+        except (ValueError, KeyError) as exc:
+            return json.dumps({'error': f"Invalid tool call {name}: {exc}"})
+
+        # Normalized key: the same question in a different key order is still a hit
+        key = json.dumps([name, args, self.base_property if name == 'estimate_prices' else None],
+                         sort_keys=True, default=str)
+        with self._lock:
+            cached = self._results.get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            result = json.dumps(handler(args), ensure_ascii=False, default=str)
+        except Exception as exc:
+            return json.dumps({'error': str(exc)})
+
+        with self._lock:
+            self._results[key] = result
+        return result
+
+    def run(self, tool_calls: List[Dict]) -> List[Dict[str, str]]:
+        """Executes one assistant turn's tool calls concurrently; returns the 'tool' messages in order."""
+        futures = [
+            _get_executor().submit(self.call, c['function']['name'], c['function'].get('arguments'))
+            for c in tool_calls
+        ]
+        return [
+            {'role': 'tool', 'tool_call_id': c['id'], 'content': f.result()}
+            for c, f in zip(tool_calls, futures)
+        ]
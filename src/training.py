@@ -0,0 +1,89 @@
+# src/training.py
+import os
+
+import numpy as np
+import xgboost as xgb
+
+from src.config import TRAIN_THREADS, TRAIN_SEED
+from src.encoding import MergeableTargetEncoder
+from src.inference import categorize
+
+# Columns to drop (Targets + Metadata not for training)
+DROP_COLS = [
+    'TradePriceYen',
+    'LogTradePriceYen',
+    'TransactionQuarterEndDate',
+    'TransactionQuarter'
+]
+
+# Categorical Columns
+CAT_COLS = [
+    'Municipality', 'DistrictName', 'NearestStation',
+    'Use', 'Structure', 'LandShape',
+    'Renovation', 'Purpose', 'Type', 'Region', 'CityPlanning',
+    'Classification', 'RoadDirection', 'Remarks', 'Prefecture'
+]
+
+# How categoricals reach XGBoost: 'target' target-encodes them (keeping the statistics,
+# so incremental updates can merge new rows), 'native' passes pandas categoricals with enable_categorical (no encoder at inference)
+ENGINES = ('target', 'native')
+TARGET_SMOOTHING = 10
+
+# Distilled 'fast' serving tier: far fewer, shallower trees than the tuned model
+FAST_TIER_PARAMS = {'n_estimators': 150, 'max_depth': 6, 'learning_rate': 0.1}
+
+
+def pinned_params(params):
+    """
+    Makes threads, seed and tree method explicit so a run is reproducible:
+    'hist' on a fixed thread count is deterministic for a given seed.
+    Values set in best_hyperparameters_xgb.json win, except a -1/None n_jobs.
+    """
+    pinned = {'tree_method': 'hist', 'random_state': TRAIN_SEED, **params}
+    if not pinned.get('n_jobs') or pinned['n_jobs'] < 0:
+        pinned['n_jobs'] = TRAIN_THREADS or os.cpu_count() or 1
+    return pinned
+
+
+def encode_for_training(X, y, engine):
+    """
+    Returns (X_encoded, encoder, categories) for the chosen engine.
+    Native categories are the sorted training values, stored with the model so
+    inference builds identical category codes.
+    """
+    valid_cat_cols = [c for c in CAT_COLS if c in X.columns]
+    if engine == 'native':
+        categories = {c: sorted(X[c].dropna().astype(str).unique()) for c in valid_cat_cols}
+        return categorize(X, categories), None, categories
+
+    encoder = MergeableTargetEncoder(valid_cat_cols, smoothing=TARGET_SMOOTHING)
+    return encoder.fit_transform(X, y), encoder, None
+
+
+def engine_params(params, engine):
+    if engine == 'native':
+        return {**params, 'tree_method': 'hist', 'enable_categorical': True}
+    return params
+
+
+def fit_fast_tier(X_enc, teacher, params):
+    """
+    Distills a small booster from a full one: it learns the teacher's log-price
+    outputs on the training rows (one column for the point, two for P10/P90).
+    Those targets are already smooth, so a fraction of the trees and depth suffices.
+    """
+    student_params = {k: v for k, v in params.items() if k not in ('objective', 'quantile_alpha')}
+    student = xgb.XGBRegressor(**{**student_params, **FAST_TIER_PARAMS})
+    student.fit(X_enc, teacher)
+    return student
+
+
+def error_metrics(actual_yen, pred_yen) -> dict:
+    """MAE, MAPE and signed bias (yen, actual - predicted) as in the modeling notebook."""
+    actual_yen = np.asarray(actual_yen, dtype=float)
+    residuals = actual_yen - np.asarray(pred_yen, dtype=float)
+    return {
+        'mae': float(np.mean(np.abs(residuals))),
+        'mape': float(np.mean(np.abs(residuals / actual_yen)) * 100),
+        'bias': float(np.mean(residuals)),
+    }
@@ -0,0 +1,88 @@
+import sys
+import json
+import threading
+from pathlib import Path
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# --- Path Setup ---
+project_root = Path(__file__).resolve().parent.parent
+sys.path.append(str(project_root))
+
+
+class FakeOpenRouter:
+    """
+    Local chat completions endpoint. `respond(payload)` returns (status, message):
+    the assistant message on 200, an error text otherwise. Records every request
+    and the peak number in flight.
+    """
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.payloads = []
+        self.requests = Counter()
+        self.in_flight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_port}/chat/completions"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub.lock:
+                    stub.payloads.append(payload)
+                    stub.requests[payload['model']] += 1
+                    stub.in_flight += 1
+                    stub.peak = max(stub.peak, stub.in_flight)
+                try:
+                    status, message = stub.respond(payload)
+                finally:
+                    with stub.lock:
+                        stub.in_flight -= 1
+                if status == 200:
+                    body = {'choices': [{'message': {'role': 'assistant', **message}}]}
+                else:
+                    body = {'error': {'message': message}}
+                data = json.dumps(body).encode()
+                try:
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'application/json')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the client cancelled it (a lost hedge race)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def fake_openrouter():
+    """Factory: `stub = fake_openrouter(respond)` serves `respond` until the test ends."""
+    stubs = []
+
+    def start(respond):
+        stub = FakeOpenRouter(respond).__enter__()
+        stubs.append(stub)
+        return stub
+
+    yield start
+    for stub in stubs:
+        stub.__exit__(None, None, None)
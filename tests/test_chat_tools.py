@@ -0,0 +1,120 @@
+import json
+import threading
+
+import pytest
+
+from src import chat
+from src.llm_client import LLMClient
+from src.tools import AdvisorTools
+
+
+def tool_call(call_id, name, args):
+    return {'id': call_id, 'type': 'function', 'function': {'name': name, 'arguments': json.dumps(args)}}
+
+
+def scripted(*turns):
+    """Replies in order: a list of tool calls, or a final answer string."""
+    replies = iter(turns)
+
+    def respond(payload):
+        turn = next(replies)
+        if isinstance(turn, str):
+            return 200, {'content': turn}
+        return 200, {'content': '', 'tool_calls': turn}
+
+    return respond
+
+
+@pytest.fixture
+def use_endpoint(monkeypatch):
+    """Points the shared chat client at a fake endpoint."""
+
+    def use(stub):
+        client = LLMClient(stub.url, 'test-key', fallback_models=[], rate=1000, burst=100, hedge_after=None)
+        monkeypatch.setattr(chat, '_client', client)
+
+    return use
+
+
+@pytest.fixture
+def tools():
+    """AdvisorTools with the data-backed handlers swapped for recording fakes."""
+    tools = AdvisorTools({'Municipality': '目黒区 (Meguro Ward)', 'FloorPlan': '1LDK'})
+    tools.calls = []
+    tools.barrier = threading.Barrier(3, timeout=5)
+
+    def handler(name):
+        def run(args):
+            tools.calls.append((name, args))
+            if args.get('wait'):
+                tools.barrier.wait()  # only returns once all three calls are running at the same time
+            return {'tool': name, 'args': args}
+        return run
+
+    tools._handlers = {name: handler(name) for name in tools._handlers}
+    return tools
+
+
+def tool_messages(payload):
+    return {m['tool_call_id']: json.loads(m['content']) for m in payload['messages'] if m['role'] == 'tool'}
+
+
+def test_tool_calls_from_one_reply_run_in_parallel(fake_openrouter, use_endpoint, tools):
+    stub = fake_openrouter(scripted(
+        [
+            tool_call('a', 'estimate_prices', {'properties': [{'Area': 40}], 'wait': True}),
+            tool_call('b', 'find_comparables', {'municipality': 'Meguro', 'wait': True}),
+            tool_call('c', 'price_statistics', {'group_by': 'Type', 'wait': True}),
+        ],
+        "Done.",
+    ))
+    use_endpoint(stub)
+
+    assert chat.get_chat_completion([{'role': 'user', 'content': 'Compare?'}], tools=tools) == "Done."
+    results = tool_messages(stub.payloads[1])
+    # Sequential dispatch would leave the first call waiting at the barrier until it times out
+    assert [results[i]['tool'] for i in 'abc'] == ['estimate_prices', 'find_comparables', 'price_statistics']
+    assert not tools.barrier.broken
+
+
+def test_unknown_tool_returns_error_payload(fake_openrouter, use_endpoint, tools):
+    stub = fake_openrouter(scripted([tool_call('a', 'delete_everything', {})], "Sorry."))
+    use_endpoint(stub)
+
+    assert chat.get_chat_completion([{'role': 'user', 'content': 'Hi'}], tools=tools) == "Sorry."
+    result = tool_messages(stub.payloads[1])['a']
+    assert 'delete_everything' in result['error']
+    assert tools.calls == []
+
+
+def test_repeated_tool_call_is_served_from_cache(fake_openrouter, use_endpoint, tools):
+    args = {'municipality': 'Meguro', 'floor_plan': '2LDK'}
+    stub = fake_openrouter(scripted(
+        [tool_call('a', 'find_comparables', args)],
+        # Same arguments in another key order: still a hit
+        [tool_call('b', 'find_comparables', dict(reversed(list(args.items()))))],
+        "Here they are.",
+    ))
+    use_endpoint(stub)
+
+    assert chat.get_chat_completion([{'role': 'user', 'content': 'Comps?'}], tools=tools) == "Here they are."
+    assert tools.calls == [('find_comparables', args)]
+    assert tool_messages(stub.payloads[2])['b'] == tool_messages(stub.payloads[2])['a']
+
+
+def test_last_round_forbids_tool_calls(fake_openrouter, use_endpoint, tools):
+    def respond(payload):
+        if payload['tool_choice'] == 'none':
+            return 200, {'content': 'Final answer.'}
+        n = len(stub.payloads)
+        return 200, {'content': '', 'tool_calls': [tool_call(f'c{n}', 'price_statistics', {'min_year': 2000 + n})]}
+
+    stub = fake_openrouter(respond)
+    use_endpoint(stub)
+
+    answer = chat.get_chat_completion([{'role': 'user', 'content': 'Stats?'}], tools=tools, max_tool_rounds=2)
+    assert answer == 'Final answer.'
+    assert [p['tool_choice'] for p in stub.payloads] == ['auto', 'auto', 'none']
+    # Tools stay declared on the last round: the history references them
+    assert all(p['tools'] == tools.schemas for p in stub.payloads)
+    assert len(tools.calls) == 2
@@ -0,0 +1,101 @@
+import time
+
+import pytest
+
+from src import llm_client
+from src.llm_client import LLMClient, LLMUnavailable
+
+PRIMARY, SECONDARY = 'stub/primary', 'stub/secondary'
+
+
+def models(**behaviour):
+    """Stub responder from {model: (latency s, fails)}; unknown models fail."""
+    behaviour = {k.replace('_', '/'): v for k, v in behaviour.items()}
+
+    def respond(payload):
+        latency, fails = behaviour.get(payload['model'], (0.0, True))
+        time.sleep(latency)
+        if fails:
+            return 503, f"{payload['model']} is overloaded"
+        return 200, {'content': f"answer from {payload['model']}"}
+
+    return respond
+
+
+def payloads(n, identical=False):
+    return [
+        {'model': PRIMARY, 'messages': [{'role': 'user', 'content': 'price?' if identical else f'price {i}?'}]}
+        for i in range(n)
+    ]
+
+
+def client_for(stub, **kwargs):
+    return LLMClient(stub.url, 'test-key', **{'rate': 1000, 'burst': 100, 'hedge_after': None, **kwargs})
+
+
+def test_in_flight_requests_stay_within_the_cap(fake_openrouter):
+    stub = fake_openrouter(models(stub_primary=(0.1, False)))
+    client = client_for(stub, max_concurrency=4)
+
+    results = client.complete_many(payloads(20))
+    assert all(r['content'] == f'answer from {PRIMARY}' for r in results)
+    assert stub.peak == 4
+
+
+def test_one_model_leaves_the_reserve_to_its_fallback(fake_openrouter):
+    stub = fake_openrouter(models(stub_primary=(0.1, False), stub_secondary=(0.0, False)))
+    client = client_for(stub, fallback_models=[SECONDARY], max_concurrency=4, reserve=1)
+
+    client.complete_many(payloads(20))
+    assert stub.peak == 3
+
+
+def test_identical_concurrent_payloads_share_one_request(fake_openrouter):
+    stub = fake_openrouter(models(stub_primary=(0.3, False)))
+    client = client_for(stub)
+
+    results = client.complete_many(payloads(30, identical=True))
+    assert len(results) == 30 and all(r['content'] == f'answer from {PRIMARY}' for r in results)
+    assert sum(stub.requests.values()) == 1
+    assert client.stats['coalesced'] == 29
+
+
+def test_slow_primary_is_hedged_to_the_secondary(fake_openrouter):
+    stub = fake_openrouter(models(stub_primary=(2.0, False), stub_secondary=(0.05, False)))
+    client = client_for(stub, fallback_models=[SECONDARY], max_concurrency=8, hedge_after=0.3)
+
+    start = time.perf_counter()
+    results = client.complete_many(payloads(10))
+    assert time.perf_counter() - start < 1.5
+    assert all(r['content'] == f'answer from {SECONDARY}' for r in results)
+    assert client.stats['hedged'] == 10
+    # Abandoned primary requests still count against the cap until they end upstream
+    assert stub.peak <= 8
+
+
+def test_circuit_opens_after_failures_and_lets_one_trial_through(fake_openrouter, monkeypatch):
+    monkeypatch.setattr(llm_client, 'LLM_BREAKER_COOLDOWN', 0.5)
+    stub = fake_openrouter(models(stub_primary=(0.0, True)))
+    client = client_for(stub)
+
+    for payload in payloads(llm_client.LLM_BREAKER_FAILURES):
+        with pytest.raises(LLMUnavailable):
+            client.complete(payload)
+    assert client.breaker(PRIMARY).state == 'open'
+
+    # Open: skipped without a request
+    with pytest.raises(LLMUnavailable, match='circuit open'):
+        client.complete(payloads(1)[0] | {'temperature': 0})
+    assert stub.requests[PRIMARY] == llm_client.LLM_BREAKER_FAILURES
+
+    # Half-open after the cooldown: one of several concurrent requests goes through
+    time.sleep(0.6)
+    assert client.breaker(PRIMARY).state == 'half-open'
+    stub.respond = models(stub_primary=(0.2, False))
+    results = client.complete_many([p | {'temperature': 1} for p in payloads(5)])
+    assert sum(isinstance(r, LLMUnavailable) for r in results) == 4
+    assert stub.requests[PRIMARY] == llm_client.LLM_BREAKER_FAILURES + 1
+
+    # The trial succeeded, so the circuit is closed again
+    assert client.breaker(PRIMARY).state == 'closed'
+    assert client.complete(payloads(1)[0])['content'] == f'answer from {PRIMARY}'